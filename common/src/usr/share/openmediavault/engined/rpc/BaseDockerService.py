@@ -3,28 +3,37 @@
 
 import logging
 import subprocess
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-from openmediavault import rpc
-from openmediavault.procenv import ProcessEnvironment
+from ComposeEvents import WATCHER
+from ComposeHealth import (
+    inspect_project,
+    project_status,
+    project_summary,
+    summarize_health,
+)
+from ComposeStatusCache import STATUS_CACHE
+from ContainerStats import SAMPLER
+from DockerEngineClient import (
+    ENGINE,
+    DockerEngineError,
+    LogEntry,
+    format_log_entries,
+    log_cursor,
+    log_entry_key,
+    numbered_log_entry,
+    parse_log_cursor,
+)
+from ImagePuller import DEFAULT_CONCURRENCY, PullProgress, pull_images
+from JobManager import JOBS, Job, JobFailed, Step
+from openmediavault import config, rpc
+from ProcessRunner import process_env, watchdog
+from RpcMetrics import RPC_METRICS, timed
 
 LOGGER = logging.getLogger(__name__)
 
-
-def _run_command(command: Any) -> subprocess.CompletedProcess:
-    """Execute a shell command and log its output."""
-    LOGGER.debug("Executing command: %s", command)
-    env = ProcessEnvironment().get_env()
-    completed = subprocess.run(
-        command,
-        check=True,
-        capture_output=True,
-        text=True,
-        env=env,
-    )
-    LOGGER.debug("Command stdout: %s", completed.stdout.strip())
-    LOGGER.debug("Command stderr: %s", completed.stderr.strip())
-    return completed
+LOG_PAGE_SIZE = 200  # Default number of lines returned by getLogsSince
+LOG_LINE_CAP = 1000  # Upper bound of getLogsSince's limit
 
 
 class BaseDockerService(rpc.Service):
@@ -34,78 +43,343 @@ class BaseDockerService(rpc.Service):
     name = None  # Service name (e.g., "Drone", "Gitea", "Immich")
     mkconf_script = None  # Path to mkconf script (e.g., "/usr/share/openmediavault/mkconf/drone")
     compose_name = None  # Docker compose project name (e.g., "drone", "gitea", "immich")
+    pull_concurrency = DEFAULT_CONCURRENCY  # Images pulled in parallel on install
 
     @rpc.export
+    @timed
     def getStatus(self) -> Dict[str, Any]:
-        """Return the running status of the Docker stack."""
+        """Return the running status of the Docker stack.
+
+        ``health`` holds the compact state from :meth:`getStatusSummary`, so a
+        stack with one exited or unhealthy service reports ``degraded`` even
+        though ``running`` is true.
+        """
+        return self._status()
+
+    def _status(self) -> Dict[str, Any]:
+        """Build the ``getStatus`` result; subclasses may add fields."""
+        return project_status(STATUS_CACHE.snapshot(), self.compose_name)
+
+    def _summary(self) -> Dict[str, Any]:
+        return project_summary(STATUS_CACHE.snapshot(), self.compose_name)
+
+    @rpc.export
+    @timed
+    def getStatusSummary(self) -> Dict[str, Any]:
+        """Return a compact health summary of the stack for cheap polling.
+
+        Served from the shared status snapshot, so polling it costs no extra
+        docker calls. ``state`` is one of ``healthy``, ``starting``,
+        ``degraded``, ``stopped`` or ``not-installed`` (``running`` when only
+        the compose CLI listing is available and healthchecks are unknown).
+        """
+        return self._summary()
+
+    @rpc.export
+    @timed
+    def getServiceStatus(self) -> Dict[str, Any]:
+        """Return state, healthcheck, restart count and uptime per service."""
         try:
-            result = subprocess.run(
-                [
-                    "docker",
-                    "compose",
-                    "ls",
-                    "--all",
-                    "--format",
-                    "{{.Name}}\t{{.Status}}",
-                ],
-                check=False,
-                capture_output=True,
-                text=True,
-            )
-        except FileNotFoundError as exc:
-            LOGGER.error("Docker not found: %s", exc)
-            return {"running": False, "status": "docker-not-found"}
-
-        running = False
-        status_text = "not-installed"
-        for line in result.stdout.splitlines():
-            if not line:
-                continue
-            name, _, status = line.partition("\t")
-            if name.strip() == self.compose_name:
-                status_text = status.strip() or "unknown"
-                running = "running" in status_text.lower()
-                break
-
-        if result.returncode != 0 and not running:
-            status_text = "error"
-
-        return {"running": running, "status": status_text}
+            services = inspect_project(self.compose_name)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.error("Failed to inspect %s: %s", self.compose_name, exc)
+            return {"summary": self._summary(), "services": [], "error": str(exc)}
+        return {
+            "summary": summarize_health(services),
+            "services": services,
+            "error": "",
+        }
 
     @rpc.export
+    @timed
+    def waitForStatusChange(
+        self, sinceVersion: int = -1, timeout: float = 25
+    ) -> Dict[str, Any]:
+        """Block until the stack's containers change, then return its status.
+
+        A Docker events watcher keeps the state of all compose containers up
+        to date, so waiting costs no docker calls. Pass the returned
+        ``version`` back as ``sinceVersion``; ``-1`` returns immediately.
+        Without the Engine API socket ``watching`` is false and the call
+        returns at once, leaving the caller to fall back to polling.
+        """
+        if not WATCHER.start():
+            return dict(self.getStatus(), version=-1, changed=False, watching=False)
+        version, changed = WATCHER.wait(
+            self.compose_name, int(sinceVersion), float(timeout)
+        )
+        return dict(
+            self.getStatus(),
+            version=version,
+            changed=changed,
+            watching=WATCHER.watching,
+        )
+
+    @rpc.export
+    @timed
+    def getResourceUsage(self, buckets: int = 30) -> Dict[str, Any]:
+        """Return CPU, memory, block I/O and network usage per container.
+
+        Containers of the stack are sampled concurrently. While the stack is
+        being watched, a background sampler keeps a fixed-size history, which
+        is folded into at most ``buckets`` ``[time, min, avg, max]`` rows per
+        metric.
+        """
+        try:
+            return SAMPLER.usage(self.compose_name, int(buckets or 30))
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.error("Failed to sample resource usage: %s", exc)
+            return {"interval": SAMPLER.interval, "containers": [], "error": str(exc)}
+
+    @rpc.export
+    def getMetrics(self, allServices: bool = False) -> Dict[str, Any]:
+        """Return RPC and subprocess latency histograms of this service.
+
+        Series of every service in engined are returned with ``allServices``;
+        the same data is written for Prometheus' textfile collector.
+        """
+        metrics = RPC_METRICS.snapshot()
+        if not allServices:
+            for key in ("histograms", "counters"):
+                metrics[key] = [
+                    row
+                    for row in metrics[key]
+                    if row["labels"].get("service") == self.name
+                ]
+        return metrics
+
+    def _compose_dir(self) -> str:
+        """Return the configured compose directory of the stack."""
+        try:
+            db = config.Database()
+            path = db.get("conf.service.%s" % self.compose_name).get("composepath")
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.debug("Unable to read composepath: %s", exc)
+            path = ""
+        return path or f"/srv/dev-disk-by-label-data/{self.compose_name}"
+
+    def _stack_images(self, env: Dict[str, str]) -> List[str]:
+        """Return the images referenced by the rendered compose file."""
+        result = RPC_METRICS.run(
+            ["docker", "compose", "-f", "docker-compose.yml", "config", "--images"],
+            check=False,
+            capture_output=True,
+            text=True,
+            cwd=self._compose_dir(),
+            env=dict(env, COMPOSE_PROJECT_NAME=self.compose_name),
+        )
+        if result.returncode != 0:
+            raise JobFailed(result.stderr.strip() or "docker compose config failed")
+        images = (line.strip() for line in result.stdout.splitlines())
+        return list(dict.fromkeys(image for image in images if image))
+
+    def _pull_step(self, job: Job) -> None:
+        """Job step pulling all stack images in parallel with layer progress."""
+        images = self._stack_images(job.env)
+        job.progress = PullProgress(images)
+        job.append("Pulling %d images" % len(images))
+        pull_images(
+            images,
+            job.progress,
+            concurrency=self.pull_concurrency,
+            env=job.env,
+            report=job.append,
+        )
+
+    def _mkconf(self, action: str) -> List[str]:
+        return ["/bin/bash", self.mkconf_script, action]
+
+    def _submit_job(
+        self, action: str, steps: Optional[List[Step]] = None
+    ) -> Dict[str, str]:
+        """Queue an mkconf action (or explicit steps) on the shared job engine."""
+        job = JOBS.submit(
+            self.compose_name,
+            action,
+            steps or [self._mkconf(action)],
+            env=process_env(),
+            on_complete=lambda _job: STATUS_CACHE.invalidate(),
+        )
+        return {"status": job.state, "jobId": job.id}
+
+    def _get_job(self, job_id: str) -> Job:
+        try:
+            job = JOBS.get(str(job_id))
+        except KeyError:
+            raise rpc.Error("Unknown job: %s" % job_id)
+        if job.project != self.compose_name:
+            raise rpc.Error("Unknown job: %s" % job_id)
+        return job
+
+    @rpc.export
+    @timed
     def install(self) -> Dict[str, str]:
-        """Install and start the Docker stack."""
-        _run_command(["/bin/bash", self.mkconf_script, "install"])
-        return {"status": "installed"}
+        """Queue installation of the Docker stack and return the job ID.
+
+        Images are pre-pulled in parallel between rendering the stack and
+        starting it, so progress is reported per image and layer.
+        """
+        return self._submit_job(
+            "install",
+            [self._mkconf("prepare"), self._pull_step, self._mkconf("up")],
+        )
 
     @rpc.export
+    @timed
     def remove(self) -> Dict[str, str]:
-        """Remove the Docker stack."""
-        _run_command(["/bin/bash", self.mkconf_script, "remove"])
-        return {"status": "removed"}
+        """Queue removal of the Docker stack and return the job ID."""
+        return self._submit_job("remove")
 
     @rpc.export
+    @timed
     def restart(self) -> Dict[str, str]:
-        """Restart the Docker stack."""
-        _run_command(["/bin/bash", self.mkconf_script, "restart"])
-        return {"status": "restarted"}
+        """Queue a restart of the Docker stack and return the job ID."""
+        return self._submit_job("restart")
+
+    @rpc.export
+    @timed
+    def getJobStatus(self, jobId: str) -> Dict[str, Any]:
+        """Return the state and progress of a queued or finished job."""
+        return self._get_job(jobId).status()
 
     @rpc.export
+    @timed
+    def getJobOutput(self, jobId: str, offset: int = 0) -> Dict[str, Any]:
+        """Return buffered job output starting at line ``offset``."""
+        return self._get_job(jobId).output(int(offset or 0))
+
+    @rpc.export
+    @timed
     def getLogs(self, service: str = None) -> Dict[str, str]:
         """Get logs from the Docker stack."""
+        if ENGINE.available():
+            try:
+                entries = ENGINE.project_log_entries(self.compose_name, service)
+                return {"logs": format_log_entries(entries), "error": ""}
+            except DockerEngineError as exc:
+                LOGGER.warning("Docker API unavailable, using CLI: %s", exc)
+
         try:
             cmd = ["docker", "compose", "logs", "--tail=100"]
             if service:
                 cmd.append(service)
 
-            result = subprocess.run(
+            result = RPC_METRICS.run(
                 cmd,
                 check=False,
                 capture_output=True,
                 text=True,
-                cwd=f"/srv/dev-disk-by-label-data/{self.compose_name}",
+                cwd=self._compose_dir(),
+                keep_tail=True,
             )
-            return {"logs": result.stdout, "error": result.stderr if result.returncode != 0 else ""}
+            return {
+                "logs": result.stdout,
+                "error": result.stderr if result.returncode != 0 else "",
+                "truncated": bool(result.truncated),
+            }
         except Exception as exc:
             LOGGER.error("Failed to get logs: %s", exc)
             return {"logs": "", "error": str(exc)}
+
+    def _cli_log_entries(
+        self, service: Optional[str], tail: int, after: Optional[str]
+    ) -> List[LogEntry]:
+        """Stream ``docker compose logs --timestamps`` into sorted entries.
+
+        Compose interleaves containers in no particular order, so at most
+        ``tail + 1`` entries past ``after`` are kept per container, which
+        covers the oldest ``tail`` overall, and the result is sorted.
+        """
+        after_key = parse_log_cursor(after)
+        cmd = ["docker", "compose", "logs", "--no-color", "--timestamps"]
+        cmd += ["--since", after_key[0] + "Z"] if after_key else ["--tail=%d" % tail]
+        if service:
+            cmd.append(service)
+
+        entries: List[LogEntry] = []
+        seen: Dict[str, Tuple[str, int]] = {}
+        kept: Dict[str, int] = {}
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self._compose_dir(),
+            env=process_env(),
+            start_new_session=True,
+        )
+        try:
+            with watchdog(process):
+                for raw in process.stdout:
+                    line = raw.decode("utf-8", "replace").rstrip("\n")
+                    prefix, separator, rest = line.partition("|")
+                    if not separator:
+                        continue
+                    timestamp, _, message = rest.strip().partition(" ")
+                    label = prefix.strip()
+                    entry = numbered_log_entry(seen, timestamp, label, message)
+                    if after_key is not None and log_entry_key(entry) <= after_key:
+                        continue
+                    if kept.get(label, 0) > tail:
+                        continue
+                    kept[label] = kept.get(label, 0) + 1
+                    entries.append(entry)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+        entries.sort(key=log_entry_key)
+        return entries
+
+    @rpc.export
+    @timed
+    def getLogsSince(
+        self, cursor: str = "", limit: int = LOG_PAGE_SIZE, service: str = None
+    ) -> Dict[str, Any]:
+        """Return log lines newer than ``cursor`` and a cursor to resume from.
+
+        Without a cursor the most recent ``limit`` lines are returned. When
+        more than ``limit`` new lines are pending, ``more`` is set and the
+        returned cursor points at the last line delivered.
+        """
+        limit = max(1, min(int(limit or LOG_PAGE_SIZE), LOG_LINE_CAP))
+        after = cursor or None
+        entries = None
+        try:
+            if ENGINE.available():
+                try:
+                    entries = ENGINE.project_log_entries(
+                        self.compose_name,
+                        service,
+                        tail=None if after else limit,
+                        after=after,
+                        limit=limit + 1,
+                    )
+                except DockerEngineError as exc:
+                    LOGGER.warning("Docker API unavailable, using CLI: %s", exc)
+            if entries is None:
+                entries = self._cli_log_entries(service, limit, after)
+        except Exception as exc:
+            LOGGER.error("Failed to get logs: %s", exc)
+            return {
+                "logs": "",
+                "lines": 0,
+                "cursor": cursor,
+                "more": False,
+                "error": str(exc),
+            }
+
+        more = False
+        if after:
+            more = len(entries) > limit
+            entries = entries[:limit]
+        else:
+            entries = entries[-limit:]
+
+        return {
+            "logs": format_log_entries(entries),
+            "lines": len(entries),
+            "cursor": log_cursor(entries[-1]) if entries else cursor,
+            "more": more,
+            "error": "",
+        }
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Docker events watcher keeping a versioned table of compose containers."""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ComposeStatusCache import STATUS_CACHE, StatusSnapshot
+from DockerEngineClient import (
+    PROJECT_LABEL,
+    SERVICE_LABEL,
+    DockerEngineClient,
+    DockerEngineError,
+    container_health,
+    summarize_states,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# Longest a waitForStatusChange call may hold an engined worker.
+MAX_WAIT = 30.0
+RECONNECT_DELAY = 5.0
+
+# The events stream can stay silent for a long time; reconnecting after an
+# idle read timeout is cheap and also recovers from daemon restarts.
+EVENTS_CLIENT = DockerEngineClient(pool_size=1, timeout=300.0)
+
+_STATES = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+}
+
+
+class ComposeEventWatcher:
+    """Mirror compose container state from the Docker events stream.
+
+    Every change bumps a global version; each project remembers the version
+    of its last change so long-poll callers can block until their project
+    actually changes. While connected, the table also answers the shared
+    status snapshot.
+    """
+
+    def __init__(self, client: DockerEngineClient = EVENTS_CLIENT) -> None:
+        self.client = client
+        self.version = 0
+        self._condition = threading.Condition()
+        self._containers: Dict[str, Dict[str, Any]] = {}
+        self._project_versions: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._connected = False
+
+    @property
+    def watching(self) -> bool:
+        return self._connected
+
+    def start(self) -> bool:
+        """Start the watcher thread once; returns False without a socket."""
+        if not self.client.available():
+            return False
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="docker-events", daemon=True
+                )
+                self._thread.start()
+        return True
+
+    def _touch(self, projects: List[str]) -> None:
+        """Record a change of ``projects``; caller holds the condition."""
+        if not projects:
+            return
+        self.version += 1
+        for project in projects:
+            self._project_versions[project] = self.version
+        if not self._connected:
+            # Seeding: the TTL snapshot may predate this change.
+            STATUS_CACHE.invalidate()
+        self._condition.notify_all()
+
+    def status_snapshot(self) -> Optional[StatusSnapshot]:
+        """Return the status of every project from the table while watching."""
+        with self._condition:
+            if not self._connected:
+                return None
+            rows = [dict(row) for row in self._containers.values()]
+        containers: Dict[str, List[Dict[str, str]]] = {}
+        for row in rows:
+            project = row.pop("project")
+            containers.setdefault(project, []).append(row)
+        projects = {
+            name: summarize_states([{"State": row["state"]} for row in items])
+            for name, items in containers.items()
+        }
+        return StatusSnapshot(projects, None, time.monotonic(), containers)
+
+    def _seed(self) -> None:
+        table = {}
+        for item in self.client.list_containers([PROJECT_LABEL]):
+            labels = item.get("Labels") or {}
+            table[item["Id"]] = {
+                "project": labels.get(PROJECT_LABEL, ""),
+                "service": labels.get(SERVICE_LABEL, ""),
+                "state": str(item.get("State", "unknown")),
+                "health": container_health(item.get("Status", "")),
+            }
+        with self._condition:
+            changed = set()
+            for key in set(table) | set(self._containers):
+                old, new = self._containers.get(key), table.get(key)
+                if old != new:
+                    changed.update(row["project"] for row in (old, new) if row)
+            self._containers = table
+            self._touch(sorted(changed))
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        actor = event.get("Actor") or {}
+        attributes = actor.get("Attributes") or {}
+        project = attributes.get(PROJECT_LABEL)
+        container_id = actor.get("ID") or event.get("id")
+        action = str(event.get("Action") or event.get("status") or "")
+        if not project or not container_id:
+            return
+
+        with self._condition:
+            if action == "destroy":
+                if self._containers.pop(container_id, None) is not None:
+                    self._touch([project])
+                return
+            row = self._containers.setdefault(
+                container_id,
+                {
+                    "project": project,
+                    "service": attributes.get(SERVICE_LABEL, ""),
+                    "state": "created",
+                    "health": "none",
+                },
+            )
+            before = dict(row)
+            if action.startswith("health_status:"):
+                row["health"] = action.partition(":")[2].strip()
+            elif action in _STATES:
+                row["state"] = _STATES[action]
+                if action in ("start", "restart", "die"):
+                    # A new run starts without a healthcheck result.
+                    row["health"] = "none" if action == "die" else "starting"
+            if row != before:
+                self._touch([project])
+
+    def _run(self) -> None:
+        while True:
+            try:
+                since = "%d" % int(time.time())
+                self._seed()
+                with self._condition:
+                    self._connected = True
+                filters = json.dumps({"type": ["container"], "label": [PROJECT_LABEL]})
+                for event in self.client.stream_json(
+                    "GET", "/events", {"since": since, "filters": filters}
+                ):
+                    self._apply(event)
+            except DockerEngineError as exc:
+                LOGGER.debug("Docker events stream ended: %s", exc)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Docker events watcher failed: %s", exc)
+            with self._condition:
+                self._connected = False
+            # The TTL snapshot was not refreshed while the table served it.
+            STATUS_CACHE.invalidate()
+            time.sleep(RECONNECT_DELAY)
+
+    def wait(
+        self, project: str, since_version: int, timeout: float
+    ) -> Tuple[int, bool]:
+        """Block until ``project`` changes after ``since_version``.
+
+        Returns the project's current version and whether it changed; a
+        negative ``since_version`` returns the current version immediately.
+        """
+        deadline = time.monotonic() + max(0.0, min(float(timeout), MAX_WAIT))
+        with self._condition:
+            while True:
+                version = self._project_versions.get(project, 0)
+                if version > since_version:
+                    return version, True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return version, False
+                self._condition.wait(remaining)
+
+
+WATCHER = ComposeEventWatcher()
+STATUS_CACHE.follow(WATCHER.status_snapshot)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Per-service container state and healthcheck results of compose projects."""
+
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from DockerEngineClient import (
+    ENGINE,
+    PROJECT_LABEL,
+    SERVICE_LABEL,
+    DockerEngineError,
+    epoch_seconds,
+)
+from RpcMetrics import RPC_METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+_STATE_COUNT_RE = re.compile(r"([a-z]+)\((\d+)\)")
+
+
+def summarize_health(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold ``{service, state, health}`` rows into one compact project state.
+
+    ``state`` is ``healthy`` when every container runs and no healthcheck
+    fails, ``starting`` while healthchecks are still pending, ``stopped``
+    when nothing runs and ``degraded`` otherwise.
+    """
+    running = [row for row in rows if row["state"] == "running"]
+    unhealthy = sorted({row["service"] for row in rows if row["health"] == "unhealthy"})
+    starting = sorted({row["service"] for row in rows if row["health"] == "starting"})
+    stopped = sorted({row["service"] for row in rows if row["state"] != "running"})
+
+    if not rows:
+        state = "not-installed"
+    elif not running:
+        state = "stopped"
+    elif stopped or unhealthy:
+        state = "degraded"
+    elif starting:
+        state = "starting"
+    else:
+        state = "healthy"
+    return {
+        "state": state,
+        "total": len(rows),
+        "running": len(running),
+        "unhealthy": unhealthy,
+        "starting": starting,
+        "stopped": stopped,
+    }
+
+
+def summarize_status_text(status: Optional[str]) -> Dict[str, Any]:
+    """Best-effort summary from ``docker compose ls`` text such as
+    ``running(1), exited(3)`` when no per-container rows are available."""
+    counts = {
+        state: int(count) for state, count in _STATE_COUNT_RE.findall(status or "")
+    }
+    total = sum(counts.values())
+    running = counts.get("running", 0)
+    if not total:
+        state = "not-installed"
+    elif not running:
+        state = "stopped"
+    elif running < total:
+        state = "degraded"
+    else:
+        state = "running"  # Healthchecks are unknown without container rows.
+    return {
+        "state": state,
+        "total": total,
+        "running": running,
+        "unhealthy": [],
+        "starting": [],
+        "stopped": [],
+    }
+
+
+def project_summary(snapshot: Any, project: str) -> Dict[str, Any]:
+    """Summarize ``project`` from a ``ComposeStatusCache`` snapshot."""
+    rows = snapshot.containers.get(project)
+    if rows is not None:
+        summary = summarize_health(rows)
+    else:
+        summary = summarize_status_text(snapshot.projects.get(project))
+    if snapshot.error and summary["state"] == "not-installed":
+        summary["state"] = snapshot.error
+    return summary
+
+
+def project_status(snapshot: Any, project: str) -> Dict[str, Any]:
+    """Return ``running``, ``status`` and ``health`` of ``project`` from a
+    ``ComposeStatusCache`` snapshot."""
+    if snapshot.error == "docker-not-found":
+        return {"running": False, "status": "docker-not-found"}
+
+    status_text = snapshot.projects.get(project)
+    running = status_text is not None and "running" in status_text.lower()
+    if status_text is None:
+        status_text = "not-installed"
+    if snapshot.error and not running:
+        status_text = "error"
+
+    return {
+        "running": running,
+        "status": status_text,
+        "health": project_summary(snapshot, project)["state"],
+    }
+
+
+def _container_ids(project: str) -> List[str]:
+    label = "%s=%s" % (PROJECT_LABEL, project)
+    if ENGINE.available():
+        try:
+            return [item["Id"] for item in ENGINE.list_containers([label])]
+        except DockerEngineError as exc:
+            LOGGER.warning("Docker API unavailable, using CLI: %s", exc)
+    result = RPC_METRICS.run(
+        [
+            "docker",
+            "ps",
+            "--all",
+            "--quiet",
+            "--no-trunc",
+            "--filter",
+            "label=" + label,
+        ],
+        check=False,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.split()
+
+
+def _service_row(info: Dict[str, Any], now: float) -> Dict[str, Any]:
+    state = info.get("State") or {}
+    config = info.get("Config") or {}
+    started_at = str(state.get("StartedAt") or "")
+    uptime = 0.0
+    if state.get("Running") and started_at and not started_at.startswith("0001"):
+        try:
+            uptime = max(now - epoch_seconds(started_at), 0.0)
+        except ValueError:
+            uptime = 0.0
+    return {
+        "name": str(info.get("Name", "")).lstrip("/"),
+        "service": (config.get("Labels") or {}).get(SERVICE_LABEL, ""),
+        "image": config.get("Image", ""),
+        "state": state.get("Status", "unknown"),
+        "health": (state.get("Health") or {}).get("Status", "none"),
+        "restartCount": int(info.get("RestartCount", 0)),
+        "exitCode": int(state.get("ExitCode", 0)),
+        "startedAt": started_at,
+        "uptime": int(uptime),
+    }
+
+
+def inspect_project(project: str) -> List[Dict[str, Any]]:
+    """Return detailed state of every container of ``project``.
+
+    Container IDs come from one label-filtered listing and are inspected with
+    a single ``docker inspect`` call, so the number of docker calls does not
+    grow with the number of containers.
+    """
+    ids = _container_ids(project)
+    if not ids:
+        return []
+    result = RPC_METRICS.run(
+        ["docker", "inspect"] + ids,
+        check=False,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0 and not result.stdout.strip():
+        raise RuntimeError(result.stderr.strip() or "docker inspect failed")
+    now = time.time()
+    rows = [_service_row(info, now) for info in json.loads(result.stdout or "[]")]
+    return sorted(rows, key=lambda row: (row["service"], row["name"]))
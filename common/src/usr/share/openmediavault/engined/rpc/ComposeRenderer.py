@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Idempotent compose rendering and change-only deployment for mkconf.
+
+Each plugin ships a ``<Project>Compose`` module whose ``build_model(conf,
+directory)`` returns the compose file as plain dicts and lists. This module
+renders it deterministically, keeps a digest per service and only asks
+``docker compose`` to touch the services whose digest changed.
+
+Usage: ComposeRenderer.py <render|deploy> <project> <directory>
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+COMPOSE_FILE = "docker-compose.yml"
+ENV_FILE = ".env"
+STATE_FILE = ".omv-compose-state.json"
+
+_PLAIN_RE = re.compile(r"^[A-Za-z_./@-][A-Za-z0-9_./@-]*$")
+_RESERVED = {"true", "false", "yes", "no", "on", "off", "null", "y", "n", "~"}
+
+
+def _scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    text = str(value)
+    if _PLAIN_RE.match(text) and text.lower() not in _RESERVED:
+        return text
+    return json.dumps(text)
+
+
+def _emit(value: Any, indent: int, lines: List[str]) -> None:
+    pad = " " * indent
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _emit_entry("%s%s:" % (pad, key), item, indent, lines)
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict) and item:
+                nested: List[str] = []
+                _emit(item, indent + 2, nested)
+                nested[0] = pad + "- " + nested[0][indent + 2 :]
+                lines.extend(nested)
+            else:
+                _emit_entry(pad + "-", item, indent, lines)
+
+
+def _emit_entry(prefix: str, item: Any, indent: int, lines: List[str]) -> None:
+    if isinstance(item, (dict, list)) and item:
+        lines.append(prefix)
+        _emit(item, indent + 2, lines)
+    elif isinstance(item, dict):
+        lines.append(prefix + " {}")
+    elif isinstance(item, list):
+        lines.append(prefix + " []")
+    elif isinstance(item, str) and "\n" in item:
+        lines.append(prefix + " |")
+        lines.extend(
+            (" " * (indent + 2) + line) if line else ""
+            for line in item.rstrip("\n").split("\n")
+        )
+    else:
+        lines.append("%s %s" % (prefix, _scalar(item)))
+
+
+def to_yaml(model: Dict[str, Any]) -> str:
+    """Render ``model`` as block-style YAML; equal models give equal text."""
+    lines: List[str] = []
+    for index, (key, value) in enumerate(model.items()):
+        if index and isinstance(value, dict):
+            lines.append("")
+        _emit_entry("%s:" % key, value, 0, lines)
+    return "\n".join(lines) + "\n"
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def service_digests(model: Dict[str, Any], env_digest: str) -> Dict[str, str]:
+    """Return a digest per service covering its definition and the .env it
+    reads, so a changed secret or variable redeploys the services using it.
+
+    Services with ``profiles`` are one-shot tasks started with ``docker
+    compose run``; deploy leaves them alone.
+    """
+    digests = {}
+    for name, service in (model.get("services") or {}).items():
+        if "profiles" in service:
+            continue
+        encoded = json.dumps(service, sort_keys=True)
+        uses_env = "env_file" in service or "${" in encoded
+        payload = encoded + (env_digest if uses_env else "")
+        digests[name] = _digest(payload.encode("utf-8"))
+    return digests
+
+
+def _write_atomic(path: str, text: str, mode: int = 0o644) -> None:
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".omv-")
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return handle.read()
+    except OSError:
+        return ""
+
+
+def load_config(project: str) -> Dict[str, Any]:
+    """Return ``conf.service.<project>`` as a dict."""
+    from openmediavault import config  # pylint: disable=import-outside-toplevel
+
+    return config.Database().get("conf.service.%s" % project).get_dict()
+
+
+def build_model(project: str, directory: str) -> Dict[str, Any]:
+    """Build the compose model with the plugin's ``<Project>Compose`` module."""
+    module = importlib.import_module("%sCompose" % project.capitalize())
+    return module.build_model(load_config(project), directory)
+
+
+def render(
+    project: str, directory: str, model: Dict[str, Any]
+) -> Tuple[bool, Dict[str, str]]:
+    """Write the compose file when its content changed.
+
+    Returns whether the file was rewritten and the per-service digests.
+    """
+    text = to_yaml(model)
+    path = os.path.join(directory, COMPOSE_FILE)
+    rewritten = _read(path) != text
+    if rewritten:
+        _write_atomic(path, text)
+    env_digest = _digest(_read(os.path.join(directory, ENV_FILE)).encode("utf-8"))
+    return rewritten, service_digests(model, env_digest)
+
+
+def plan(previous: Dict[str, str], current: Dict[str, str]) -> List[str]:
+    """Return the ``docker compose`` arguments needed to reach ``current``."""
+    changed = sorted(name for name in current if previous.get(name) != current[name])
+    removed = sorted(name for name in previous if name not in current)
+    if not previous or removed:
+        return ["up", "-d", "--remove-orphans"]
+    if changed:
+        return ["up", "-d", "--no-deps"] + changed
+    # Nothing changed: create or start missing containers, never recreate.
+    return ["up", "-d", "--no-recreate"]
+
+
+def deploy(project: str, directory: str, model: Dict[str, Any]) -> int:
+    """Render the stack and apply only what changed since the last deploy."""
+    _, digests = render(project, directory, model)
+    state_path = os.path.join(directory, STATE_FILE)
+    try:
+        previous = json.loads(_read(state_path) or "{}").get("services") or {}
+    except ValueError:
+        previous = {}
+
+    arguments = plan(previous, digests)
+    if "--no-recreate" in arguments:
+        print("%s: configuration unchanged, skipping redeploy" % project)
+    elif "--no-deps" in arguments:
+        print("%s: recreating %s" % (project, ", ".join(arguments[3:])))
+
+    result = subprocess.run(
+        ["docker", "compose", "-f", COMPOSE_FILE] + arguments,
+        check=False,
+        cwd=directory,
+        env=dict(os.environ, COMPOSE_PROJECT_NAME=project),
+    )
+    if result.returncode == 0:
+        _write_atomic(state_path, json.dumps({"services": digests}, sort_keys=True))
+    return result.returncode
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 4 or argv[1] not in ("render", "deploy"):
+        print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+        return 2
+    action, project, directory = argv[1:]
+    try:
+        model = build_model(project, directory)
+    except ValueError as exc:
+        # Invalid configuration, e.g. a missing shared folder.
+        print("%s: %s" % (project, exc), file=sys.stderr)
+        return 1
+    if action == "render":
+        rewritten, _ = render(project, directory, model)
+        print(
+            "%s: compose file %s" % (project, "updated" if rewritten else "unchanged")
+        )
+        return 0
+    return deploy(project, directory, model)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Process-wide cache of ``docker compose ls`` results shared by all plugins."""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from DockerEngineClient import (
+    ENGINE,
+    PROJECT_LABEL,
+    SERVICE_LABEL,
+    DockerEngineError,
+    container_health,
+    summarize_states,
+)
+from RpcMetrics import RPC_METRICS, current_service
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTL = float(os.environ.get("OMV_COMPOSE_STATUS_TTL", "5"))
+
+
+class StatusSnapshot:
+    """Status of every compose project at a single point in time."""
+
+    __slots__ = ("projects", "error", "taken_at", "containers")
+
+    def __init__(
+        self,
+        projects: Dict[str, str],
+        error: Optional[str],
+        taken_at: float,
+        containers: Optional[Dict[str, List[Dict[str, str]]]] = None,
+    ) -> None:
+        self.projects = projects
+        self.error = error
+        self.taken_at = taken_at
+        # Per-project ``{service, state, health}`` rows; only filled from the
+        # Engine API, the compose CLI listing has no per-container detail.
+        self.containers = containers or {}
+
+
+def _load_from_engine() -> StatusSnapshot:
+    """Group all compose-labelled containers by project via the Engine API."""
+    now = time.monotonic()
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for container in ENGINE.list_containers([PROJECT_LABEL]):
+        project = (container.get("Labels") or {}).get(PROJECT_LABEL)
+        if project:
+            grouped.setdefault(project, []).append(container)
+    projects = {name: summarize_states(items) for name, items in grouped.items()}
+    containers = {
+        name: [
+            {
+                "service": (item.get("Labels") or {}).get(SERVICE_LABEL, ""),
+                "state": str(item.get("State", "unknown")),
+                "health": container_health(item.get("Status", "")),
+            }
+            for item in items
+        ]
+        for name, items in grouped.items()
+    }
+    return StatusSnapshot(projects, None, now, containers)
+
+
+def _load_compose_projects() -> StatusSnapshot:
+    """Query all compose projects with a single API call or CLI invocation."""
+    if ENGINE.available():
+        try:
+            return _load_from_engine()
+        except DockerEngineError as exc:
+            LOGGER.warning("Docker API unavailable, using CLI: %s", exc)
+
+    now = time.monotonic()
+    try:
+        result = RPC_METRICS.run(
+            ["docker", "compose", "ls", "--all", "--format", "json"],
+            check=False,
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError as exc:
+        LOGGER.error("Docker not found: %s", exc)
+        return StatusSnapshot({}, "docker-not-found", now)
+
+    projects: Dict[str, str] = {}
+    try:
+        entries: List[Dict[str, Any]] = json.loads(result.stdout or "[]")
+    except ValueError as exc:
+        LOGGER.error("Unable to parse docker compose ls output: %s", exc)
+        entries = []
+
+    for entry in entries or []:
+        name = str(entry.get("Name", "")).strip()
+        if name:
+            projects[name] = str(entry.get("Status", "")).strip() or "unknown"
+
+    error = "error" if result.returncode != 0 else None
+    return StatusSnapshot(projects, error, now)
+
+
+class ComposeStatusCache:
+    """TTL cache of compose project status with single-flight refresh.
+
+    Concurrent callers that find the snapshot expired wait for one refresh
+    instead of each spawning their own docker process.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        loader: Callable[[], StatusSnapshot] = _load_compose_projects,
+    ) -> None:
+        self.ttl = ttl
+        self._loader = loader
+        self._snapshot: Optional[StatusSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._live: Optional[Callable[[], Optional[StatusSnapshot]]] = None
+
+    def follow(self, source: Callable[[], Optional[StatusSnapshot]]) -> None:
+        """Serve snapshots from ``source`` whenever it returns one.
+
+        ``source`` is an always-current view such as the Docker events
+        watcher; while it returns None the TTL cache is used.
+        """
+        self._live = source
+
+    def _is_fresh(self, snapshot: Optional[StatusSnapshot]) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot.taken_at < self.ttl
+
+    def _count(self, hit: bool) -> None:
+        """Count the lookup for getMetrics and the Prometheus text file."""
+        RPC_METRICS.increment(
+            "omv_compose_status_cache_total",
+            {"service": current_service(), "result": "hit" if hit else "miss"},
+        )
+
+    def snapshot(self) -> StatusSnapshot:
+        """Return a snapshot no older than the configured TTL."""
+        live = self._live
+        snapshot = live() if live is not None else None
+        if snapshot is not None:
+            self._count(True)
+            return snapshot
+
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            self._count(True)
+            return snapshot
+
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited for the lock.
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                self._count(True)
+                return snapshot
+            self._count(False)
+            snapshot = self._loader()
+            self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self) -> None:
+        """Drop the current snapshot so the next read refreshes it."""
+        self._snapshot = None
+
+
+STATUS_CACHE = ComposeStatusCache()
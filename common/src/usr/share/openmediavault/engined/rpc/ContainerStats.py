@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""Sampled container resource usage with fixed-size downsampled history."""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from DockerEngineClient import (
+    PROJECT_LABEL,
+    SERVICE_LABEL,
+    DockerEngineClient,
+    DockerEngineError,
+)
+from RpcMetrics import RPC_METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = float(os.environ.get("OMV_DOCKER_STATS_INTERVAL", "10"))
+# One hour of history at the default interval.
+DEFAULT_CAPACITY = int(os.environ.get("OMV_DOCKER_STATS_SAMPLES", "360"))
+# Projects nobody asked about for this long stop being sampled.
+IDLE_TIMEOUT = 300.0
+STATS_CONCURRENCY = 4
+
+# A non-streaming stats request blocks for about a second while the daemon
+# collects the CPU delta, so requests run on their own connections.
+STATS_CLIENT = DockerEngineClient(pool_size=STATS_CONCURRENCY, timeout=15.0)
+
+# Rates and gauges kept per container, in the order of Series.values.
+METRICS = (
+    "cpuPercent",
+    "memoryBytes",
+    "blockReadRate",
+    "blockWriteRate",
+    "netRxRate",
+    "netTxRate",
+)
+_COUNTERS = {
+    "blockReadRate": "blockRead",
+    "blockWriteRate": "blockWrite",
+    "netRxRate": "netRx",
+    "netTxRate": "netTx",
+}
+
+_SIZE_RE = re.compile(r"^\s*([0-9.]+)\s*([A-Za-z]*)\s*$")
+_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000**2,
+    "gb": 1000**3,
+    "tb": 1000**4,
+    "kib": 1024,
+    "mib": 1024**2,
+    "gib": 1024**3,
+    "tib": 1024**4,
+}
+
+
+def parse_size(text: str) -> float:
+    """Convert a docker CLI size such as ``12.5MiB`` or ``3kB`` to bytes."""
+    match = _SIZE_RE.match(text or "")
+    if not match:
+        return 0.0
+    return float(match.group(1)) * _UNITS.get(match.group(2).lower(), 1)
+
+
+def engine_sample(stats: Dict[str, Any]) -> Dict[str, float]:
+    """Reduce a ``/containers/{id}/stats`` document to flat numbers."""
+    cpu = stats.get("cpu_stats") or {}
+    precpu = stats.get("precpu_stats") or {}
+    cpu_delta = (cpu.get("cpu_usage") or {}).get("total_usage", 0) - (
+        precpu.get("cpu_usage") or {}
+    ).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    cpus = cpu.get("online_cpus") or len(
+        (cpu.get("cpu_usage") or {}).get("percpu_usage") or []
+    )
+    cpu_percent = 0.0
+    if cpu_delta > 0 and system_delta > 0:
+        cpu_percent = cpu_delta / system_delta * max(cpus, 1) * 100.0
+
+    memory = stats.get("memory_stats") or {}
+    details = memory.get("stats") or {}
+    cache = details.get("inactive_file", details.get("total_inactive_file", 0))
+    used = max(memory.get("usage", 0) - cache, 0)
+
+    block_read = block_write = 0
+    blkio = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive")
+    for entry in blkio or []:
+        operation = str(entry.get("op", "")).lower()
+        if operation == "read":
+            block_read += entry.get("value", 0)
+        elif operation == "write":
+            block_write += entry.get("value", 0)
+
+    networks = (stats.get("networks") or {}).values()
+    return {
+        "cpuPercent": cpu_percent,
+        "memoryBytes": float(used),
+        "memoryLimit": float(memory.get("limit", 0)),
+        "blockRead": float(block_read),
+        "blockWrite": float(block_write),
+        "netRx": float(sum(network.get("rx_bytes", 0) for network in networks)),
+        "netTx": float(sum(network.get("tx_bytes", 0) for network in networks)),
+    }
+
+
+def cli_sample(row: Dict[str, str]) -> Dict[str, float]:
+    """Reduce a ``docker stats --format '{{json .}}'`` row to flat numbers."""
+    used, _, limit = row.get("MemUsage", "").partition("/")
+    block_read, _, block_write = row.get("BlockIO", "").partition("/")
+    net_rx, _, net_tx = row.get("NetIO", "").partition("/")
+    try:
+        cpu_percent = float(row.get("CPUPerc", "0").rstrip("%") or 0)
+    except ValueError:
+        cpu_percent = 0.0
+    return {
+        "cpuPercent": cpu_percent,
+        "memoryBytes": parse_size(used),
+        "memoryLimit": parse_size(limit),
+        "blockRead": parse_size(block_read),
+        "blockWrite": parse_size(block_write),
+        "netRx": parse_size(net_rx),
+        "netTx": parse_size(net_tx),
+    }
+
+
+def downsample(
+    times: List[float], values: List[float], buckets: int
+) -> List[List[float]]:
+    """Fold a series into at most ``buckets`` ``[time, min, avg, max]`` rows."""
+    count = len(values)
+    if not count:
+        return []
+    buckets = max(1, min(int(buckets), count))
+    rows = []
+    for bucket in range(buckets):
+        start = bucket * count // buckets
+        end = (bucket + 1) * count // buckets
+        chunk = values[start:end]
+        rows.append(
+            [
+                int(times[end - 1]),
+                round(min(chunk), 3),
+                round(sum(chunk) / len(chunk), 3),
+                round(max(chunk), 3),
+            ]
+        )
+    return rows
+
+
+class Series:
+    """Fixed-capacity history of one container's metrics in typed arrays."""
+
+    __slots__ = ("service", "capacity", "times", "values", "head", "count", "last")
+
+    def __init__(self, service: str, capacity: int) -> None:
+        self.service = service
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = [array("f", bytes(4 * capacity)) for _ in METRICS]
+        self.head = 0
+        self.count = 0
+        self.last: Dict[str, float] = {}
+
+    def append(self, timestamp: float, sample: Dict[str, float]) -> Dict[str, float]:
+        """Record ``sample``; counters become per-second rates."""
+        elapsed = timestamp - self.last.get("time", timestamp)
+        current = dict(sample)
+        for rate, counter in _COUNTERS.items():
+            delta = sample[counter] - self.last.get(counter, sample[counter])
+            current[rate] = delta / elapsed if elapsed > 0 and delta > 0 else 0.0
+
+        self.times[self.head] = timestamp
+        for index, metric in enumerate(METRICS):
+            self.values[index][self.head] = current[metric]
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.last = dict(sample, time=timestamp)
+        return current
+
+    def ordered(self, data: array) -> List[float]:
+        start = (self.head - self.count) % self.capacity
+        return [data[(start + offset) % self.capacity] for offset in range(self.count)]
+
+
+class ResourceSampler:
+    """Samples compose projects in the background while someone is watching.
+
+    Each ``usage()`` call marks the project as watched; a single daemon
+    thread samples every watched project each ``interval`` seconds and stops
+    once no project has been asked about for ``IDLE_TIMEOUT`` seconds.
+    """
+
+    def __init__(
+        self,
+        client: DockerEngineClient = STATS_CLIENT,
+        interval: float = DEFAULT_INTERVAL,
+        capacity: int = DEFAULT_CAPACITY,
+        concurrency: int = STATS_CONCURRENCY,
+    ) -> None:
+        self.client = client
+        self.interval = interval
+        self.capacity = capacity
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._watched: Dict[str, float] = {}
+        self._series: Dict[str, Dict[str, Series]] = {}
+        self._current: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def _engine_stats(self, project: str) -> List[Tuple[str, str, Dict[str, float]]]:
+        containers = self.client.list_containers(
+            ["%s=%s" % (PROJECT_LABEL, project)], include_stopped=False
+        )
+
+        def _fetch(container: Dict[str, Any]) -> Tuple[str, str, Dict[str, float]]:
+            name = (container.get("Names") or [container["Id"][:12]])[0].lstrip("/")
+            service = (container.get("Labels") or {}).get(SERVICE_LABEL, name)
+            stats = self.client.get_json(
+                "/containers/%s/stats" % container["Id"], {"stream": "false"}
+            )
+            return name, service, engine_sample(stats or {})
+
+        if not containers:
+            return []
+        workers = min(self.concurrency, len(containers))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_fetch, containers))
+
+    @staticmethod
+    def _cli_stats(project: str) -> List[Tuple[str, str, Dict[str, float]]]:
+        label = "label=%s=%s" % (PROJECT_LABEL, project)
+        listing = RPC_METRICS.run(
+            ["docker", "ps", "--filter", label, "--format", "{{json .}}"],
+            check=False,
+            capture_output=True,
+            text=True,
+        )
+        services = {}
+        for line in listing.stdout.splitlines():
+            row = json.loads(line)
+            labels = dict(
+                item.partition("=")[::2] for item in row.get("Labels", "").split(",")
+            )
+            services[row.get("Names", "")] = labels.get(SERVICE_LABEL, row.get("Names"))
+        if not services:
+            return []
+
+        result = RPC_METRICS.run(
+            ["docker", "stats", "--no-stream", "--format", "{{json .}}"]
+            + sorted(services),
+            check=False,
+            capture_output=True,
+            text=True,
+        )
+        samples = []
+        for line in result.stdout.splitlines():
+            row = json.loads(line)
+            name = row.get("Name", "")
+            samples.append((name, services.get(name, name), cli_sample(row)))
+        return samples
+
+    def sample(self, project: str) -> None:
+        """Take one sample of every running container of ``project``."""
+        samples = None
+        if self.client.available():
+            try:
+                samples = self._engine_stats(project)
+            except DockerEngineError as exc:
+                LOGGER.warning("Docker API unavailable, using CLI: %s", exc)
+        if samples is None:
+            samples = self._cli_stats(project)
+
+        now = time.time()
+        with self._lock:
+            series = self._series.setdefault(project, {})
+            current = {}
+            for name, service, values in samples:
+                if name not in series:
+                    series[name] = Series(service, self.capacity)
+                current[name] = series[name].append(now, values)
+            # Forget containers that no longer exist (e.g. after a recreate).
+            for name in set(series) - set(current):
+                del series[name]
+            self._current[project] = current
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                cutoff = time.monotonic() - IDLE_TIMEOUT
+                for project in [p for p, t in self._watched.items() if t < cutoff]:
+                    del self._watched[project]
+                    self._series.pop(project, None)
+                    self._current.pop(project, None)
+                projects = list(self._watched)
+                if not projects:
+                    self._thread = None
+                    return
+            for project in projects:
+                try:
+                    self.sample(project)
+                except Exception as exc:  # pylint: disable=broad-except
+                    LOGGER.error("Sampling %s failed: %s", project, exc)
+
+    def usage(self, project: str, buckets: int = 30) -> Dict[str, Any]:
+        """Return current usage and downsampled history of ``project``."""
+        with self._lock:
+            self._watched[project] = time.monotonic()
+            sampled = project in self._current
+            # Started before the first sample, so a failing one cannot leave
+            # a thread that never runs. The loop sleeps before sampling.
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="docker-stats", daemon=True
+                )
+                self._thread.start()
+        if not sampled:
+            self.sample(project)
+
+        with self._lock:
+            containers = []
+            for name, series in sorted(self._series.get(project, {}).items()):
+                times = series.ordered(series.times)
+                history = {
+                    metric: downsample(times, series.ordered(data), buckets)
+                    for metric, data in zip(METRICS, series.values)
+                }
+                current = self._current.get(project, {}).get(name, {})
+                containers.append(
+                    {
+                        "name": name,
+                        "service": series.service,
+                        "current": {
+                            key: round(value, 3) for key, value in current.items()
+                        },
+                        "samples": series.count,
+                        "history": history,
+                    }
+                )
+        return {"interval": self.interval, "containers": containers}
+
+
+SAMPLER = ResourceSampler()
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""Minimal pooled HTTP/1.1 client for the Docker Engine API unix socket."""
+
+import calendar
+import datetime
+import http.client
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+
+LOGGER = logging.getLogger(__name__)
+
+DOCKER_SOCKET = os.environ.get("OMV_DOCKER_SOCKET", "/var/run/docker.sock")
+
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+
+_STREAM_NAMES = {0: "stdin", 1: "stdout", 2: "stderr"}
+
+MAX_LINE_BYTES = 16 * 1024
+
+_HEALTH_RE = re.compile(r"\((healthy|unhealthy|health: starting)\)")
+
+# ``(timestamp, service, line, index)``; ``index`` numbers the lines one
+# service logged with the same timestamp, so a cursor can resume between them.
+LogEntry = Tuple[str, str, str, int]
+LogKey = Tuple[str, str, int]
+
+
+class DockerEngineError(Exception):
+    """Raised when the Docker Engine API is unreachable or returns an error."""
+
+    def __init__(self, message: str, status: int = 0) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self._socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class DockerEngineClient:
+    """Keep-alive client for the Docker Engine API.
+
+    Connections are pooled so repeated RPC calls reuse an established socket
+    instead of paying for a docker CLI process on every request.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = DOCKER_SOCKET,
+        pool_size: int = 4,
+        timeout: float = 10.0,
+    ) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[_UnixHTTPConnection]" = queue.LifoQueue(
+            maxsize=pool_size
+        )
+
+    def available(self) -> bool:
+        """Return True when the engine socket exists."""
+        return os.path.exists(self.socket_path)
+
+    def _acquire(self) -> Tuple[_UnixHTTPConnection, bool]:
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return _UnixHTTPConnection(self.socket_path, self.timeout), False
+
+    def _release(self, conn: _UnixHTTPConnection) -> None:
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _open(
+        self, method: str, path: str, query: Optional[Dict[str, Any]] = None
+    ) -> Tuple[_UnixHTTPConnection, http.client.HTTPResponse]:
+        """Send a request and return the connection with an unread response."""
+        url = path
+        if query:
+            url = "%s?%s" % (path, urlencode(query))
+
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, url, headers={"Host": "docker"})
+                return conn, conn.getresponse()
+            except (OSError, http.client.HTTPException) as exc:
+                conn.close()
+                if reused:
+                    # The daemon may have closed an idle keep-alive connection.
+                    continue
+                raise DockerEngineError(
+                    "Docker API request %s %s failed: %s" % (method, path, exc)
+                ) from exc
+
+    def _finish(
+        self, conn: _UnixHTTPConnection, response: http.client.HTTPResponse
+    ) -> None:
+        """Return a fully read connection to the pool or close it."""
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(
+        self, method: str, path: str, query: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Perform a request and return status, headers and the full body."""
+        conn, response = self._open(method, path, query)
+        try:
+            body = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            conn.close()
+            raise DockerEngineError(
+                "Docker API request %s %s failed: %s" % (method, path, exc)
+            ) from exc
+        self._finish(conn, response)
+
+        headers = {key.lower(): value for key, value in response.getheaders()}
+        return response.status, headers, body
+
+    def get_json(self, path: str, query: Optional[Dict[str, Any]] = None) -> Any:
+        """GET a JSON document, raising DockerEngineError on HTTP errors."""
+        status, _, body = self.request("GET", path, query)
+        if status >= 400:
+            raise DockerEngineError(_error_message(body, status), status)
+        return json.loads(body or b"null")
+
+    def stream_json(
+        self, method: str, path: str, query: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the newline-delimited JSON objects of a streaming endpoint."""
+        conn, response = self._open(method, path, query)
+        completed = False
+        try:
+            if response.status >= 400:
+                body = response.read()
+                completed = True
+                raise DockerEngineError(
+                    _error_message(body, response.status), response.status
+                )
+            line = response.readline()
+            while line:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+                line = response.readline()
+            completed = True
+        except (OSError, ValueError, http.client.HTTPException) as exc:
+            raise DockerEngineError("Failed to read %s: %s" % (path, exc)) from exc
+        finally:
+            if completed:
+                self._finish(conn, response)
+            else:
+                conn.close()
+
+    def list_containers(
+        self, labels: Optional[List[str]] = None, include_stopped: bool = True
+    ) -> List[Dict[str, Any]]:
+        """List containers matching all of the given label filters."""
+        query: Dict[str, Any] = {"all": "1" if include_stopped else "0"}
+        if labels:
+            query["filters"] = json.dumps({"label": labels})
+        return self.get_json("/containers/json", query) or []
+
+    def project_containers(
+        self, project: str, service: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """List the containers belonging to a compose project."""
+        labels = ["%s=%s" % (PROJECT_LABEL, project)]
+        if service:
+            labels.append("%s=%s" % (SERVICE_LABEL, service))
+        return self.list_containers(labels)
+
+    def iter_log_lines(
+        self,
+        container_id: str,
+        tail: Optional[int] = 100,
+        since: Optional[str] = None,
+        timestamps: bool = False,
+    ) -> Iterator[bytes]:
+        """Stream the log lines of a container without buffering the body.
+
+        Multiplexed (non-TTY) streams are demultiplexed frame by frame; TTY
+        containers return a raw stream that is read line by line. Lines
+        longer than ``MAX_LINE_BYTES`` are cut. Closing the generator early
+        drops the connection instead of reading the remaining output.
+        """
+        query: Dict[str, Any] = {
+            "stdout": "1",
+            "stderr": "1",
+            "timestamps": "1" if timestamps else "0",
+            "tail": "all" if tail is None else str(int(tail)),
+        }
+        if since is not None:
+            query["since"] = since
+        conn, response = self._open("GET", "/containers/%s/logs" % container_id, query)
+        completed = False
+        try:
+            if response.status >= 400:
+                body = response.read()
+                completed = True
+                raise DockerEngineError(
+                    _error_message(body, response.status), response.status
+                )
+
+            header = response.read(8)
+            if (
+                len(header) == 8
+                and header[0] in _STREAM_NAMES
+                and header[1:4] == b"\0\0\0"
+            ):
+                pending: Dict[int, bytes] = {}
+                while len(header) == 8:
+                    (size,) = struct.unpack(">I", header[4:8])
+                    buffer = pending.get(header[0], b"") + response.read(size)
+                    *lines, rest = buffer.split(b"\n")
+                    pending[header[0]] = rest[:MAX_LINE_BYTES]
+                    for line in lines:
+                        yield line[:MAX_LINE_BYTES]
+                    header = response.read(8)
+                for rest in pending.values():
+                    if rest:
+                        yield rest
+            else:
+                line = header + response.readline(MAX_LINE_BYTES)
+                while line:
+                    yield line.rstrip(b"\n")[:MAX_LINE_BYTES]
+                    line = response.readline(MAX_LINE_BYTES)
+            completed = True
+        except (OSError, http.client.HTTPException) as exc:
+            raise DockerEngineError("Failed to read container logs: %s" % exc) from exc
+        finally:
+            if completed:
+                self._finish(conn, response)
+            else:
+                conn.close()
+
+    def project_log_entries(
+        self,
+        project: str,
+        service: Optional[str] = None,
+        tail: Optional[int] = 100,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[LogEntry]:
+        """Return the log entries of a project in :func:`log_entry_key` order.
+
+        Entries of all containers are merged, mirroring the interleaved output
+        of ``docker compose logs``. With ``after``, a :func:`log_cursor`, only
+        entries past that position are returned, and at most ``limit`` of
+        them are read from each container.
+        """
+        after_key = parse_log_cursor(after)
+        since = _timestamp_to_since(after_key[0]) if after_key else None
+        containers = sorted(
+            self.project_containers(project, service),
+            key=lambda container: (container.get("Names") or [""])[0],
+        )
+        entries: List[LogEntry] = []
+        seen: Dict[str, Tuple[str, int]] = {}
+        for container in containers:
+            labels = container.get("Labels") or {}
+            names = container.get("Names") or [""]
+            label = labels.get(SERVICE_LABEL) or names[0].lstrip("/")
+            lines = self.iter_log_lines(
+                container["Id"], tail=tail, since=since, timestamps=True
+            )
+            count = 0
+            try:
+                for raw in lines:
+                    timestamp, _, message = raw.decode("utf-8", "replace").partition(
+                        " "
+                    )
+                    entry = numbered_log_entry(seen, timestamp, label, message)
+                    if after_key is not None and log_entry_key(entry) <= after_key:
+                        continue
+                    entries.append(entry)
+                    count += 1
+                    if limit is not None and count >= limit:
+                        break
+            finally:
+                lines.close()
+        entries.sort(key=log_entry_key)
+        return entries
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _error_message(body: bytes, status: int) -> str:
+    try:
+        return json.loads(body).get("message") or "HTTP %d" % status
+    except (ValueError, AttributeError):
+        return "HTTP %d" % status
+
+
+def timestamp_key(timestamp: str) -> str:
+    """Pad RFC3339Nano fractions so timestamps sort lexically."""
+    seconds, dot, fraction = timestamp.rstrip("Z").partition(".")
+    return seconds + "." + fraction.ljust(9, "0") if dot else seconds + ".000000000"
+
+
+def numbered_log_entry(
+    seen: Dict[str, Tuple[str, int]], timestamp: str, service: str, line: str
+) -> LogEntry:
+    """Build an entry, numbering it after the previous line of ``service``.
+
+    ``seen`` maps each service to its last timestamp and index; lines must be
+    passed in the order the service logged them.
+    """
+    previous, index = seen.get(service, ("", -1))
+    index = index + 1 if previous == timestamp else 0
+    seen[service] = (timestamp, index)
+    return (timestamp, service, line, index)
+
+
+def log_entry_key(entry: LogEntry) -> LogKey:
+    """Total order of log entries: timestamp, service, index."""
+    return (timestamp_key(entry[0]), entry[1], entry[3])
+
+
+def log_cursor(entry: LogEntry) -> str:
+    """Opaque cursor resuming right after ``entry``."""
+    return "%s|%s|%d" % (entry[0], entry[1], entry[3])
+
+
+def parse_log_cursor(cursor: Optional[str]) -> Optional[LogKey]:
+    """Return the :func:`log_entry_key` of a :func:`log_cursor`.
+
+    A bare timestamp, as returned before cursors carried a position, resumes
+    after every line logged at that time.
+    """
+    if not cursor:
+        return None
+    timestamp, _, position = cursor.partition("|")
+    service, _, index = position.rpartition("|")
+    try:
+        return (timestamp_key(timestamp), service, int(index))
+    except ValueError:
+        return (timestamp_key(timestamp), "\uffff", 0)
+
+
+def _timestamp_to_since(timestamp: str) -> str:
+    """Convert an RFC3339Nano timestamp to the API's ``seconds.nanos`` form."""
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    parsed = datetime.datetime.strptime(seconds, "%Y-%m-%dT%H:%M:%S")
+    epoch = calendar.timegm(parsed.timetuple())
+    return "%d.%s" % (epoch, fraction.ljust(9, "0")[:9])
+
+
+def epoch_seconds(timestamp: str) -> float:
+    """Convert a UTC RFC3339Nano timestamp to seconds since the epoch."""
+    return float(_timestamp_to_since(timestamp))
+
+
+def container_health(status: str) -> str:
+    """Extract the healthcheck result from a container ``Status`` text."""
+    match = _HEALTH_RE.search(status or "")
+    if not match:
+        return "none"
+    return "starting" if match.group(1) == "health: starting" else match.group(1)
+
+
+def format_log_entries(entries: List[LogEntry]) -> str:
+    """Render log entries with compose-style ``service  | line`` prefixes."""
+    width = max((len(entry[1]) for entry in entries), default=0)
+    return "\n".join(
+        "%s  | %s" % (entry[1].ljust(width), entry[2]) for entry in entries
+    )
+
+
+def summarize_states(containers: List[Dict[str, Any]]) -> str:
+    """Format container states the way ``docker compose ls`` does."""
+    counts: Dict[str, int] = {}
+    for container in containers:
+        state = str(container.get("State", "unknown")) or "unknown"
+        counts[state] = counts.get(state, 0) + 1
+    return ", ".join("%s(%d)" % (state, counts[state]) for state in sorted(counts))
+
+
+ENGINE = DockerEngineClient()
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Status and restarts across every installed Docker plugin.
+
+Installed stacks are discovered from the :mod:`PluginRegistry` table. Fleet
+status is answered from one shared status snapshot, and fleet restarts run
+the stacks' mkconf restarts in parallel, starting a stack only after the
+stacks it depends on restarted successfully.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+from ComposeHealth import project_status
+from ComposeStatusCache import STATUS_CACHE
+from JobManager import JOBS, Job, JobFailed
+from openmediavault import rpc
+from PluginRegistry import PLUGINS, Plugin
+from ProcessRunner import process_env
+from RpcMetrics import RPC_METRICS, timed
+
+LOGGER = logging.getLogger(__name__)
+
+FLEET_PROJECT = "fleet"
+DEFAULT_CONCURRENCY = int(os.environ.get("OMV_FLEET_CONCURRENCY", "2"))
+# Longest one stack's restart may take before it is killed and counts as failed.
+RESTART_TIMEOUT = float(os.environ.get("OMV_FLEET_RESTART_TIMEOUT", "900"))
+
+
+def installed_plugins() -> List[Plugin]:
+    """Return the plugins whose mkconf script is present on this host."""
+    return [plugin for plugin in PLUGINS if os.path.exists(plugin.mkconf_script)]
+
+
+def restart_order(plugins: Sequence[Plugin]) -> List[Plugin]:
+    """Order ``plugins`` so every stack follows the stacks it depends on.
+
+    Dependencies on stacks outside ``plugins`` are ignored; a cycle raises
+    ``ValueError``.
+    """
+    by_name = {plugin.compose_name: plugin for plugin in plugins}
+    ordered: List[Plugin] = []
+    visiting: List[str] = []
+
+    def visit(name: str) -> None:
+        if any(plugin.compose_name == name for plugin in ordered):
+            return
+        if name in visiting:
+            raise ValueError("Dependency cycle: %s" % " -> ".join(visiting + [name]))
+        visiting.append(name)
+        for dependency in by_name[name].depends:
+            if dependency in by_name:
+                visit(dependency)
+        visiting.pop()
+        ordered.append(by_name[name])
+
+    for plugin in plugins:
+        visit(plugin.compose_name)
+    return ordered
+
+
+class FleetProgress:
+    """Thread-safe restart state per stack, published as job progress."""
+
+    def __init__(self, plugins: Sequence[Plugin]) -> None:
+        self._lock = threading.Lock()
+        self._stacks: Dict[str, Dict[str, Any]] = {
+            plugin.compose_name: {
+                "name": plugin.name,
+                "state": "pending",
+                "error": "",
+                "dependsOn": [
+                    name
+                    for name in plugin.depends
+                    if any(other.compose_name == name for other in plugins)
+                ],
+            }
+            for plugin in plugins
+        }
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            return self._stacks[name]["state"]
+
+    def update(self, name: str, **values: Any) -> None:
+        with self._lock:
+            self._stacks[name].update(values)
+
+    def dependencies(self, name: str) -> List[str]:
+        return self._stacks[name]["dependsOn"]
+
+    def failed(self) -> List[str]:
+        with self._lock:
+            return [
+                name
+                for name, stack in self._stacks.items()
+                if stack["state"] in ("failed", "skipped")
+            ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy suitable for JSON serialisation."""
+        with self._lock:
+            stacks = {name: dict(stack) for name, stack in self._stacks.items()}
+        return {
+            "stacks": stacks,
+            "total": len(stacks),
+            "completed": sum(
+                stack["state"] in ("succeeded", "failed", "skipped")
+                for stack in stacks.values()
+            ),
+        }
+
+
+def _restart_stack(plugin: Plugin, progress: FleetProgress, job: Job) -> None:
+    """Run one stack's mkconf restart on the fleet's own thread.
+
+    It does not queue the stack's restart job: the fleet job already holds a
+    worker of the shared job engine, and waiting on jobs queued behind it
+    would deadlock a busy or single-worker engine. Instead the stack is
+    reserved for the fleet job during its restart, so a stack with a job of
+    its own still running fails, and jobs submitted meanwhile wait for it.
+    """
+    name = plugin.compose_name
+    progress.update(name, state="running")
+    try:
+        with JOBS.reserve(name, job):
+            job.append("%s: restarting" % plugin.name)
+            result = RPC_METRICS.run(
+                ["/bin/bash", plugin.mkconf_script, "restart"],
+                env=job.env,
+                timeout=RESTART_TIMEOUT,
+                keep_tail=True,
+            )
+        for line in (result.stdout + result.stderr).splitlines():
+            job.append("%s: %s" % (plugin.name, line))
+        if result.timed_out:
+            raise JobFailed("restart did not finish in %.0f s" % RESTART_TIMEOUT)
+        if result.returncode != 0:
+            raise JobFailed("restart exited with status %d" % result.returncode)
+    except Exception as exc:  # pylint: disable=broad-except
+        LOGGER.error("Fleet restart of %s failed: %s", plugin.name, exc)
+        progress.update(name, state="failed", error=str(exc))
+        job.append("%s: failed: %s" % (plugin.name, exc))
+        return
+    finally:
+        STATUS_CACHE.invalidate()
+    progress.update(name, state="succeeded")
+    job.append("%s: restarted" % plugin.name)
+
+
+def restart_stacks(
+    plugins: Sequence[Plugin], concurrency: int, progress: FleetProgress, job: Job
+) -> None:
+    """Restart ``plugins`` with at most ``concurrency`` stacks at a time.
+
+    A stack starts once all stacks it depends on succeeded; it is skipped
+    when one of them failed.
+    """
+    pending = [plugin.compose_name for plugin in restart_order(plugins)]
+    by_name = {plugin.compose_name: plugin for plugin in plugins}
+    running: Dict[Future, str] = {}
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="omv-fleet"
+    ) as executor:
+        while pending or running:
+            for name in list(pending):
+                states = [progress.state(dep) for dep in progress.dependencies(name)]
+                if any(state in ("failed", "skipped") for state in states):
+                    pending.remove(name)
+                    progress.update(name, state="skipped", error="dependency failed")
+                    job.append("%s: skipped, a dependency failed" % by_name[name].name)
+                elif len(running) < concurrency and all(
+                    state == "succeeded" for state in states
+                ):
+                    pending.remove(name)
+                    future = executor.submit(
+                        _restart_stack, by_name[name], progress, job
+                    )
+                    running[future] = name
+            if not running:
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+
+    failed = progress.failed()
+    if failed:
+        raise JobFailed("Restart failed for: %s" % ", ".join(failed))
+
+
+class ServiceDockerFleet(rpc.Service):
+    """RPC service for status and restarts across all Docker plugins."""
+
+    name = "DockerFleet"
+
+    @rpc.export
+    @timed
+    def getStatus(self) -> Dict[str, Any]:
+        """Return the status of every installed stack from one docker query."""
+        snapshot = STATUS_CACHE.snapshot()
+        stacks = [
+            dict(
+                project_status(snapshot, plugin.compose_name),
+                name=plugin.name,
+                composeName=plugin.compose_name,
+                dependsOn=list(plugin.depends),
+            )
+            for plugin in installed_plugins()
+        ]
+        return {
+            "stacks": stacks,
+            "total": len(stacks),
+            "running": sum(stack["running"] for stack in stacks),
+            "error": snapshot.error or "",
+        }
+
+    @rpc.export
+    @timed
+    def restart(
+        self, services: Optional[List[str]] = None, concurrency: int = 0
+    ) -> Dict[str, str]:
+        """Queue a restart of all (or the named) stacks and return the job ID.
+
+        At most ``concurrency`` stacks restart at once; dependents such as
+        Drone wait for Gitea. ``getJobStatus`` reports progress per stack.
+        """
+        if services is not None and not (
+            isinstance(services, list)
+            and all(isinstance(service, str) for service in services)
+        ):
+            raise rpc.Error("services must be a list of stack names")
+        plugins = installed_plugins()
+        if services:
+            known = {plugin.compose_name for plugin in plugins}
+            unknown = sorted(set(services) - known)
+            if unknown:
+                raise rpc.Error("Unknown or missing stacks: %s" % ", ".join(unknown))
+            plugins = [plugin for plugin in plugins if plugin.compose_name in services]
+        try:
+            restart_order(plugins)
+        except ValueError as exc:
+            raise rpc.Error(str(exc))
+
+        limit = max(1, int(concurrency or DEFAULT_CONCURRENCY))
+        progress = FleetProgress(plugins)
+
+        def step(job: Job) -> None:
+            job.progress = progress
+            job.append("Restarting %d stacks, %d at a time" % (len(plugins), limit))
+            restart_stacks(plugins, limit, progress, job)
+
+        job = JOBS.submit(
+            FLEET_PROJECT,
+            "restart",
+            [step],
+            env=process_env(),
+            on_complete=lambda _job: STATUS_CACHE.invalidate(),
+        )
+        return {"status": job.state, "jobId": job.id}
+
+    def _get_job(self, job_id: str) -> Job:
+        try:
+            job = JOBS.get(str(job_id))
+        except KeyError:
+            raise rpc.Error("Unknown job: %s" % job_id)
+        if job.project != FLEET_PROJECT:
+            raise rpc.Error("Unknown job: %s" % job_id)
+        return job
+
+    @rpc.export
+    @timed
+    def getJobStatus(self, jobId: str) -> Dict[str, Any]:
+        """Return the state and per-stack progress of a fleet restart."""
+        return self._get_job(jobId).status()
+
+    @rpc.export
+    @timed
+    def getJobOutput(self, jobId: str, offset: int = 0) -> Dict[str, Any]:
+        """Return buffered fleet restart output starting at line ``offset``."""
+        return self._get_job(jobId).output(int(offset or 0))
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Parallel image pre-pull with per-layer progress for compose stacks."""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from DockerEngineClient import DockerEngineClient, DockerEngineError
+from RpcMetrics import RPC_METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.environ.get("OMV_DOCKER_PULL_CONCURRENCY", "3"))
+
+# Pull progress events can be minutes apart while a large layer extracts.
+PULL_CLIENT = DockerEngineClient(pool_size=DEFAULT_CONCURRENCY, timeout=600.0)
+# Deadline of a whole ``docker pull`` when falling back to the CLI.
+PULL_TIMEOUT = float(os.environ.get("OMV_DOCKER_PULL_TIMEOUT", "1800"))
+
+_DONE_STATUSES = ("Download complete", "Extracting", "Pull complete")
+# Engine pulls send no registry credentials; errors like these are retried
+# with ``docker pull``, which reads them from the docker client config.
+_AUTH_ERRORS = ("unauthorized", "denied", "authentication required", "docker login")
+
+
+def split_reference(reference: str) -> Tuple[str, Optional[str]]:
+    """Split an image reference into ``fromImage`` and ``tag`` API arguments."""
+    if "@" in reference:
+        return reference, None
+    name, _, tag = reference.rpartition(":")
+    if not name or "/" in tag:
+        return reference, "latest"
+    return name, tag
+
+
+class PullProgress:
+    """Thread-safe per-image, per-layer download progress."""
+
+    def __init__(self, images: List[str]) -> None:
+        self._lock = threading.Lock()
+        self._images: Dict[str, Dict[str, Any]] = {
+            image: {"state": "pending", "error": "", "layers": {}} for image in images
+        }
+
+    def set_state(self, image: str, state: str, error: str = "") -> None:
+        with self._lock:
+            self._images[image]["state"] = state
+            self._images[image]["error"] = error
+
+    def update_layer(self, image: str, event: Dict[str, Any]) -> None:
+        layer_id = event.get("id")
+        status = event.get("status", "")
+        if not layer_id or status.startswith(("Pulling from", "Digest:", "Status:")):
+            return
+        detail = event.get("progressDetail") or {}
+        with self._lock:
+            layer = self._images[image]["layers"].setdefault(
+                layer_id, {"status": "", "current": 0, "total": 0}
+            )
+            layer["status"] = status
+            if status == "Downloading":
+                layer["current"] = int(detail.get("current", 0))
+                layer["total"] = int(detail.get("total", layer["total"]))
+            elif status in _DONE_STATUSES and layer["total"]:
+                layer["current"] = layer["total"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy suitable for JSON serialisation."""
+        with self._lock:
+            images = {}
+            for image, data in self._images.items():
+                layers = {key: dict(value) for key, value in data["layers"].items()}
+                images[image] = {
+                    "state": data["state"],
+                    "error": data["error"],
+                    "current": sum(layer["current"] for layer in layers.values()),
+                    "total": sum(layer["total"] for layer in layers.values()),
+                    "layers": layers,
+                }
+        return {
+            "images": images,
+            "current": sum(image["current"] for image in images.values()),
+            "total": sum(image["total"] for image in images.values()),
+        }
+
+
+def _local_digests(client: DockerEngineClient, image: str) -> List[str]:
+    try:
+        info = client.get_json("/images/%s/json" % quote(image, safe="/:@"))
+    except DockerEngineError as exc:
+        if exc.status == 404:
+            return []
+        raise
+    return list((info or {}).get("RepoDigests") or [])
+
+
+def _remote_digest(client: DockerEngineClient, image: str) -> Optional[str]:
+    try:
+        info = client.get_json("/distribution/%s/json" % quote(image, safe="/:@"))
+    except DockerEngineError as exc:
+        LOGGER.debug("Unable to resolve remote digest of %s: %s", image, exc)
+        return None
+    return ((info or {}).get("Descriptor") or {}).get("digest")
+
+
+def _pull_with_engine(
+    client: DockerEngineClient, image: str, progress: PullProgress
+) -> str:
+    remote = _remote_digest(client, image)
+    if remote and any(
+        digest.endswith("@" + remote) for digest in _local_digests(client, image)
+    ):
+        progress.set_state(image, "skipped")
+        return "skipped"
+
+    progress.set_state(image, "pulling")
+    name, tag = split_reference(image)
+    query = {"fromImage": name}
+    if tag:
+        query["tag"] = tag
+    for event in client.stream_json("POST", "/images/create", query):
+        if event.get("error"):
+            raise DockerEngineError(str(event["error"]))
+        progress.update_layer(image, event)
+    progress.set_state(image, "done")
+    return "done"
+
+
+def _is_auth_error(exc: DockerEngineError) -> bool:
+    message = str(exc).lower()
+    return exc.status in (401, 403) or any(word in message for word in _AUTH_ERRORS)
+
+
+def _pull_with_cli(
+    image: str, progress: PullProgress, env: Optional[Dict[str, str]]
+) -> str:
+    progress.set_state(image, "pulling")
+    result = RPC_METRICS.run(
+        ["docker", "pull", "--quiet", image],
+        check=False,
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=PULL_TIMEOUT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "docker pull failed")
+    progress.set_state(image, "done")
+    return "done"
+
+
+def pull_images(
+    images: List[str],
+    progress: PullProgress,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    client: DockerEngineClient = PULL_CLIENT,
+    env: Optional[Dict[str, str]] = None,
+    report: Callable[[str], None] = LOGGER.info,
+) -> None:
+    """Pull ``images`` in parallel, skipping those already present locally.
+
+    The Engine API is used when its socket is available so per-layer byte
+    counts can be reported; otherwise ``docker pull`` is run per image. An
+    engine pull rejected by the registry, e.g. for a private image, is
+    retried with ``docker pull`` so the configured credentials apply.
+    """
+    if not images:
+        return
+    use_engine = client.available()
+    failures: List[str] = []
+    workers = max(1, min(int(concurrency), len(images)))
+
+    def _pull(image: str) -> str:
+        if use_engine:
+            try:
+                return _pull_with_engine(client, image, progress)
+            except DockerEngineError as exc:
+                if not _is_auth_error(exc):
+                    raise
+                report("%s: %s, retrying with docker pull" % (image, exc))
+        return _pull_with_cli(image, progress, env)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_pull, image): image for image in images}
+        for future in as_completed(futures):
+            image = futures[future]
+            try:
+                report("%s: %s" % (image, future.result()))
+            except Exception as exc:  # pylint: disable=broad-except
+                progress.set_state(image, "failed", str(exc))
+                report("%s: failed: %s" % (image, exc))
+                failures.append(image)
+    if failures:
+        raise RuntimeError("Failed to pull %s" % ", ".join(sorted(failures)))
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Background job engine for long running Docker stack operations."""
+
+import collections
+import logging
+import os
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from ProcessRunner import kill_group, watchdog
+
+LOGGER = logging.getLogger(__name__)
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_SUCCEEDED = "succeeded"
+STATE_FAILED = "failed"
+
+FINISHED_STATES = (STATE_SUCCEEDED, STATE_FAILED)
+
+# Longest a command step may run before its process group is killed, so a
+# hung mkconf cannot hold its project's slot forever.
+STEP_TIMEOUT = float(os.environ.get("OMV_DOCKER_JOB_TIMEOUT", "3600"))
+
+# A job step is either a command line or a callable that receives the job.
+Step = Union[List[str], Callable[["Job"], None]]
+
+
+class JobFailed(Exception):
+    """Raised by a job step to fail the job with a message."""
+
+
+class Job:
+    """A queued or running sequence of steps and its captured output.
+
+    Output is kept in a ring buffer of the most recent lines. Offsets are
+    absolute line numbers, so readers can resume even after old lines have
+    been dropped from the buffer.
+    """
+
+    __slots__ = (
+        "id",
+        "project",
+        "action",
+        "steps",
+        "env",
+        "on_complete",
+        "state",
+        "returncode",
+        "error",
+        "created",
+        "started",
+        "finished",
+        "total_lines",
+        "progress",
+        "_lines",
+        "_lock",
+        "_done",
+    )
+
+    def __init__(
+        self,
+        project: str,
+        action: str,
+        steps: Sequence[Step],
+        env: Optional[Dict[str, str]],
+        on_complete: Optional[Callable[["Job"], None]],
+        buffer_lines: int,
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.project = project
+        self.action = action
+        self.steps = list(steps)
+        self.env = env
+        self.on_complete = on_complete
+        self.state = STATE_QUEUED
+        self.returncode: Optional[int] = None
+        self.error = ""
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.total_lines = 0
+        # Optional object with a ``snapshot()`` method set by callable steps
+        # to publish structured progress.
+        self.progress: Any = None
+        self._lines: Deque[str] = collections.deque(maxlen=buffer_lines)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finished; return False on timeout."""
+        return self._done.wait(timeout)
+
+    def append(self, line: str) -> None:
+        with self._lock:
+            self._lines.append(line)
+            self.total_lines += 1
+
+    def status(self) -> Dict[str, Any]:
+        """Return a JSON serialisable progress summary."""
+        with self._lock:
+            last_line = self._lines[-1] if self._lines else ""
+            total = self.total_lines
+        end = self.finished or time.time()
+        progress = self.progress
+        return {
+            "jobId": self.id,
+            "project": self.project,
+            "action": self.action,
+            "state": self.state,
+            "finished": self.state in FINISHED_STATES,
+            "returncode": self.returncode,
+            "error": self.error,
+            "lines": total,
+            "lastLine": last_line,
+            "elapsed": round(end - self.started, 3) if self.started else 0.0,
+            "progress": progress.snapshot() if progress is not None else None,
+        }
+
+    def output(self, offset: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """Return up to ``limit`` buffered lines starting at ``offset``."""
+        with self._lock:
+            first = self.total_lines - len(self._lines)
+            start = max(int(offset), first)
+            lines = list(self._lines)[start - first : start - first + limit]
+            total = self.total_lines
+        return {
+            "jobId": self.id,
+            "offset": start,
+            "next": start + len(lines),
+            "dropped": start > offset,
+            "lines": lines,
+            "finished": self.state in FINISHED_STATES,
+            "more": start + len(lines) < total,
+        }
+
+
+class JobManager:
+    """Run jobs on a bounded worker pool, serialised per compose project."""
+
+    def __init__(
+        self, max_workers: int = 2, buffer_lines: int = 2000, retain: int = 50
+    ) -> None:
+        self.buffer_lines = buffer_lines
+        self.retain = retain
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="omv-docker-job"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[str, Job] = {}
+        self._pending: Dict[str, Deque[Job]] = {}
+
+    def submit(
+        self,
+        project: str,
+        action: str,
+        steps: Sequence[Step],
+        env: Optional[Dict[str, str]] = None,
+        on_complete: Optional[Callable[[Job], None]] = None,
+    ) -> Job:
+        """Queue a list of steps and return their job immediately."""
+        job = Job(project, action, steps, env, on_complete, self.buffer_lines)
+        with self._lock:
+            self._jobs[job.id] = job
+            if project in self._active:
+                self._pending.setdefault(project, collections.deque()).append(job)
+            else:
+                self._active[project] = job
+                self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Return a job by ID, raising KeyError for unknown IDs."""
+        with self._lock:
+            return self._jobs[job_id]
+
+    def active_job(self, project: str) -> Optional[Job]:
+        """Return the job currently running for a project, if any."""
+        with self._lock:
+            return self._active.get(project)
+
+    @contextmanager
+    def reserve(self, project: str, holder: Job) -> Iterator[None]:
+        """Hold ``project`` for ``holder`` while it works on it outside a job.
+
+        Raises ``JobFailed`` when another job is running for the project.
+        Jobs submitted meanwhile queue and start once the block exits.
+        """
+        with self._lock:
+            active = self._active.get(project)
+            if active is not None:
+                raise JobFailed(
+                    "%s job %s is still running" % (active.action, active.id)
+                )
+            self._active[project] = holder
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._start_next(project)
+
+    def _execute(self, job: Job, command: List[str]) -> None:
+        LOGGER.debug("Job %s executing: %s", job.id, command)
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=job.env,
+            start_new_session=True,
+        )
+        try:
+            with watchdog(process, STEP_TIMEOUT) as fired:
+                for raw in process.stdout:
+                    job.append(raw.decode("utf-8", "replace").rstrip("\n"))
+                job.returncode = process.wait()
+        except BaseException:
+            kill_group(process)
+            process.wait()
+            raise
+        finally:
+            process.stdout.close()
+        if fired.is_set():
+            raise JobFailed("Command did not finish in %.0f s" % STEP_TIMEOUT)
+        if job.returncode != 0:
+            raise JobFailed("Command exited with status %d" % job.returncode)
+
+    def _run(self, job: Job) -> None:
+        job.state = STATE_RUNNING
+        job.started = time.time()
+        try:
+            for step in job.steps:
+                if callable(step):
+                    step(job)
+                else:
+                    self._execute(job, step)
+            job.state = STATE_SUCCEEDED
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.error("Job %s failed: %s", job.id, exc)
+            job.state = STATE_FAILED
+            job.error = str(exc)
+        finally:
+            job.finished = time.time()
+            self._complete(job)
+
+    def _complete(self, job: Job) -> None:
+        if job.on_complete is not None:
+            try:
+                job.on_complete(job)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Job %s completion hook failed: %s", job.id, exc)
+        job._done.set()  # pylint: disable=protected-access
+
+        with self._lock:
+            self._start_next(job.project)
+            self._prune()
+
+    def _start_next(self, project: str) -> None:
+        # Called with the lock held, when the project's active slot frees up.
+        pending = self._pending.get(project)
+        if pending:
+            following = pending.popleft()
+            self._active[project] = following
+            self._executor.submit(self._run, following)
+        else:
+            self._pending.pop(project, None)
+            self._active.pop(project, None)
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (job for job in self._jobs.values() if job.state in FINISHED_STATES),
+            key=lambda job: job.finished or 0.0,
+        )
+        for job in finished[: max(0, len(finished) - self.retain)]:
+            del self._jobs[job.id]
+
+
+JOBS = JobManager(max_workers=int(os.environ.get("OMV_DOCKER_JOB_WORKERS", "4")))
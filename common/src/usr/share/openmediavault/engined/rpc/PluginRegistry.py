@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Declarative registration of the Docker plugin RPC services.
+
+Plugin modules only call :func:`register`. The service registered with
+engined is a thin proxy; ``BaseDockerService`` and everything it pulls in
+(engine clients, job manager, samplers) is imported on the first RPC call,
+so loading the plugins costs little when they are installed but unused.
+"""
+
+import importlib
+import logging
+import threading
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from openmediavault import rpc
+
+LOGGER = logging.getLogger(__name__)
+
+MKCONF_DIR = "/usr/share/openmediavault/mkconf"
+
+
+class Plugin(NamedTuple):
+    """One Docker plugin: RPC service name, mkconf script and compose project.
+
+    ``service`` optionally names a module defining ``Service<name>`` as a
+    ``BaseDockerService`` subclass; ``exports`` lists the RPC methods it adds.
+    ``depends`` names compose projects that fleet restarts finish first.
+    ``startup`` names a ``module.attribute`` whose ``start()`` is called on
+    registration, for background work that must not wait for the first RPC
+    call.
+    """
+
+    name: str
+    mkconf_script: str
+    compose_name: str
+    service: Optional[str] = None
+    exports: Tuple[str, ...] = ()
+    depends: Tuple[str, ...] = ()
+    startup: Optional[str] = None
+
+
+PLUGINS: Tuple[Plugin, ...] = (
+    Plugin(
+        "Immich",
+        MKCONF_DIR + "/immich",
+        "immich",
+        service="ImmichService",
+        exports=("getTuningProfiles",),
+    ),
+    Plugin("Gitea", MKCONF_DIR + "/gitea", "gitea"),
+    # Drone authenticates against Gitea's OAuth endpoint on start.
+    Plugin(
+        "Drone",
+        MKCONF_DIR + "/drone",
+        "drone",
+        service="DroneService",
+        exports=("getQueue",),
+        depends=("gitea",),
+    ),
+    Plugin(
+        "Certbot",
+        MKCONF_DIR + "/certbot",
+        "certbot",
+        service="CertbotService",
+        exports=("getCertificates",),
+        # Renewals run unattended from engined start.
+        startup="CertbotSchedule.SCHEDULER",
+    ),
+)
+
+# RPC methods exported by BaseDockerService; keep in sync with that class.
+EXPORTS: Tuple[str, ...] = (
+    "getStatus",
+    "getStatusSummary",
+    "getServiceStatus",
+    "waitForStatusChange",
+    "getResourceUsage",
+    "getMetrics",
+    "install",
+    "remove",
+    "restart",
+    "getJobStatus",
+    "getJobOutput",
+    "getLogs",
+    "getLogsSince",
+)
+
+# Service across all installed plugins, see DockerFleet.py.
+FLEET = Plugin(
+    "DockerFleet",
+    "",
+    "fleet",
+    service="DockerFleet",
+    exports=("getStatus", "restart", "getJobStatus", "getJobOutput"),
+)
+
+_LOCK = threading.Lock()
+_INSTANCES: Dict[str, Any] = {}
+_FLEET_REGISTERED = False
+
+
+def get_plugin(compose_name: str) -> Plugin:
+    """Return the table entry of ``compose_name``."""
+    for plugin in PLUGINS:
+        if plugin.compose_name == compose_name:
+            return plugin
+    raise KeyError(compose_name)
+
+
+def load_service(plugin: Plugin) -> type:
+    """Import and return the concrete ``BaseDockerService`` subclass."""
+    if plugin.service:
+        module = importlib.import_module(plugin.service)
+        return getattr(module, "Service%s" % plugin.name)
+    base = importlib.import_module("BaseDockerService").BaseDockerService
+    return type(
+        "Service%s" % plugin.name,
+        (base,),
+        {
+            "__doc__": "RPC service to manage the %s Docker stack." % plugin.name,
+            "name": plugin.name,
+            "mkconf_script": plugin.mkconf_script,
+            "compose_name": plugin.compose_name,
+        },
+    )
+
+
+def instance(plugin: Plugin) -> Any:
+    """Return the shared service instance of ``plugin``, loading it once."""
+    service = _INSTANCES.get(plugin.compose_name)
+    if service is None:
+        with _LOCK:
+            service = _INSTANCES.get(plugin.compose_name)
+            if service is None:
+                LOGGER.debug("Loading %s RPC service", plugin.name)
+                service = _INSTANCES[plugin.compose_name] = load_service(plugin)()
+    return service
+
+
+def _forward(plugin: Plugin, method: str) -> Callable[..., Any]:
+    def call(self: Any, *args: Any, **kwargs: Any) -> Any:
+        return getattr(instance(plugin), method)(*args, **kwargs)
+
+    call.__name__ = call.__qualname__ = method
+    return rpc.export(call)
+
+
+def proxy_class(plugin: Plugin, methods: Optional[Tuple[str, ...]] = None) -> type:
+    """Build the lightweight ``rpc.Service`` registered for ``plugin``.
+
+    It forwards ``methods``, by default the base exports and the plugin's own.
+    """
+    namespace: Dict[str, Any] = {
+        "__doc__": "Lazily loaded RPC service of the %s stack." % plugin.name,
+        "__module__": __name__,
+        "name": plugin.name,
+        "compose_name": plugin.compose_name,
+    }
+    for method in EXPORTS + plugin.exports if methods is None else methods:
+        namespace[method] = _forward(plugin, method)
+    return type("Service%s" % plugin.name, (rpc.Service,), namespace)
+
+
+def start_background(plugin: Plugin) -> None:
+    """Start the plugin's ``startup`` object, logging instead of raising."""
+    if not plugin.startup:
+        return
+    module, _, attribute = plugin.startup.rpartition(".")
+    try:
+        getattr(importlib.import_module(module), attribute).start()
+    except Exception as exc:  # pylint: disable=broad-except
+        LOGGER.error("Unable to start %s: %s", plugin.startup, exc)
+
+
+def register(compose_name: str) -> type:
+    """Register the RPC service of ``compose_name`` with engined.
+
+    The first plugin registered also registers the fleet service.
+    """
+    global _FLEET_REGISTERED  # pylint: disable=global-statement
+    plugin = get_plugin(compose_name)
+    service = proxy_class(plugin)
+    rpc.register(service)
+    start_background(plugin)
+    with _LOCK:
+        register_fleet = not _FLEET_REGISTERED
+        _FLEET_REGISTERED = True
+    if register_fleet:
+        rpc.register(proxy_class(FLEET, FLEET.exports))
+    return service
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Host capacity and Postgres memory settings shared by the compose models.
+
+Host memory is rounded down to 256 MiB so the small MemTotal changes
+between kernels do not alter rendered settings and recreate databases.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+MEMORY_GRANULARITY = 256  # MiB
+# Connections the plugins' applications open at most.
+DEFAULT_CONNECTIONS = 100
+
+_HOST: Optional[Tuple[int, int]] = None
+
+
+def _clamp(value: float, low: int, high: int) -> int:
+    return int(min(max(value, low), high))
+
+
+def host_capacity() -> Tuple[int, int]:
+    """Return usable cores and total memory in MiB, read once per process."""
+    global _HOST  # pylint: disable=global-statement
+    if _HOST is None:
+        try:
+            cores = len(os.sched_getaffinity(0))
+        except (AttributeError, OSError):
+            cores = os.cpu_count() or 1
+        memory = 0
+        try:
+            with open("/proc/meminfo", encoding="ascii") as handle:
+                for line in handle:
+                    if line.startswith("MemTotal:"):
+                        memory = int(line.split()[1]) // 1024
+                        break
+        except (OSError, ValueError, IndexError) as exc:
+            LOGGER.debug("Unable to read /proc/meminfo: %s", exc)
+        if not memory:
+            memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+        memory = max(memory // MEMORY_GRANULARITY, 1) * MEMORY_GRANULARITY
+        _HOST = (max(cores, 1), memory)
+    return _HOST
+
+
+def postgres_settings(
+    memory: int,
+    memory_share: float,
+    shared_buffers_max: int,
+    work_mem_max: int,
+    connections: int = DEFAULT_CONNECTIONS,
+) -> Dict[str, int]:
+    """Return Postgres memory settings in MiB for a host with ``memory`` MiB.
+
+    ``memory_share`` of RAM goes to ``shared_buffers``; ``work_mem`` lets
+    every connection run a few sorts or hashes within a quarter of the rest.
+    """
+    shared_buffers = _clamp(memory * memory_share, 128, shared_buffers_max)
+    work_mem = _clamp(
+        (memory - shared_buffers) * 0.25 / (connections * 3), 4, work_mem_max
+    )
+    return {
+        "sharedBuffers": shared_buffers,
+        "workMem": work_mem,
+        "maintenanceWorkMem": _clamp(memory / 16, 64, 1024),
+        "effectiveCacheSize": max(shared_buffers, memory // 2),
+    }
+
+
+def postgres_command(settings: Dict[str, int]) -> List[str]:
+    """Return the ``postgres -c ...`` command applying ``settings``."""
+    return [
+        "postgres",
+        "-c",
+        "shared_buffers=%dMB" % settings["sharedBuffers"],
+        "-c",
+        "work_mem=%dMB" % settings["workMem"],
+        "-c",
+        "maintenance_work_mem=%dMB" % settings["maintenanceWorkMem"],
+        "-c",
+        "effective_cache_size=%dMB" % settings["effectiveCacheSize"],
+    ]
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Bounded subprocess execution for RPC handlers.
+
+Output is read incrementally from both pipes into buffers capped at
+``output_cap`` bytes, every call has a deadline and a command that outlives
+it is killed together with its whole process group. Results say explicitly
+whether output was truncated or the command timed out, instead of silently
+holding an engined worker or hundreds of MB of output.
+"""
+
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = float(os.environ.get("OMV_COMMAND_TIMEOUT", "120"))
+DEFAULT_OUTPUT_CAP = int(os.environ.get("OMV_COMMAND_OUTPUT_CAP", str(8 * 1024**2)))
+# Time a process group gets between SIGTERM and SIGKILL.
+KILL_GRACE = 2.0
+READ_SIZE = 65536
+
+_ENV_LOCK = threading.Lock()
+_ENV: Optional[Dict[str, str]] = None
+
+
+def process_env() -> Dict[str, str]:
+    """Return OMV's process environment, built once per engined process.
+
+    Callers must not modify the returned dict; use ``dict(env, KEY=value)``.
+    """
+    global _ENV  # pylint: disable=global-statement
+    if _ENV is None:
+        with _ENV_LOCK:
+            if _ENV is None:
+                # pylint: disable=import-outside-toplevel
+                from openmediavault.procenv import ProcessEnvironment
+
+                _ENV = ProcessEnvironment().get_env()
+    return _ENV
+
+
+class RunResult(subprocess.CompletedProcess):
+    """``CompletedProcess`` with truncation and timeout details."""
+
+    def __init__(
+        self,
+        args: Any,
+        returncode: int,
+        stdout: Any,
+        stderr: Any,
+        truncated: Dict[str, int],
+        timed_out: bool,
+        elapsed: float,
+    ) -> None:
+        super().__init__(args, returncode, stdout, stderr)
+        # Bytes dropped per stream, e.g. {"stdout": 1048576}; empty if none.
+        self.truncated = truncated
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+
+
+class _Buffer:
+    """Keeps the first (or last) ``cap`` bytes of a stream."""
+
+    def __init__(self, cap: int, keep_tail: bool) -> None:
+        self.cap = cap
+        self.keep_tail = keep_tail
+        self.chunks: Deque[bytes] = deque()
+        self.size = 0
+        self.dropped = 0
+
+    def append(self, data: bytes) -> None:
+        if not self.keep_tail:
+            room = self.cap - self.size
+            if room > 0:
+                self.chunks.append(data[:room])
+                self.size += min(room, len(data))
+            self.dropped += max(0, len(data) - max(room, 0))
+            return
+        self.chunks.append(data)
+        self.size += len(data)
+        while len(self.chunks) > 1 and self.size - len(self.chunks[0]) >= self.cap:
+            self.size -= len(self.chunks[0])
+            self.dropped += len(self.chunks.popleft())
+
+    def value(self) -> bytes:
+        data = b"".join(self.chunks)
+        if self.keep_tail and len(data) > self.cap:
+            self.dropped += len(data) - self.cap
+            data = data[-self.cap :]
+        return data
+
+
+def kill_group(process: "subprocess.Popen[Any]") -> None:
+    """Terminate the process group of ``process``, then kill it if needed."""
+    for sig, grace in ((signal.SIGTERM, KILL_GRACE), (signal.SIGKILL, None)):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        if grace is None:
+            return
+        try:
+            process.wait(grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+@contextmanager
+def watchdog(
+    process: "subprocess.Popen[Any]", timeout: Optional[float] = DEFAULT_TIMEOUT
+) -> Iterator[threading.Event]:
+    """Kill ``process``'s group once ``timeout`` expires inside the block.
+
+    ``process`` must have been started with ``start_new_session=True``. The
+    yielded event is set when the watchdog fired.
+    """
+    fired = threading.Event()
+
+    def _fire() -> None:
+        fired.set()
+        LOGGER.warning("Killing %s after %.0f s", process.args, timeout)
+        kill_group(process)
+
+    timer = threading.Timer(timeout, _fire) if timeout else None
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    try:
+        yield fired
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+def _decode(data: bytes, text: bool) -> Any:
+    return data.decode("utf-8", "replace") if text else data
+
+
+def run(
+    command: List[str],
+    *,
+    check: bool = False,
+    capture_output: bool = True,
+    text: bool = True,
+    env: Optional[Dict[str, str]] = None,
+    cwd: Optional[str] = None,
+    timeout: Optional[float] = DEFAULT_TIMEOUT,
+    output_cap: int = DEFAULT_OUTPUT_CAP,
+    keep_tail: bool = False,
+) -> RunResult:
+    """Run ``command`` with bounded output and a deadline.
+
+    Mirrors ``subprocess.run(capture_output=True)``, including inheriting
+    the caller's environment when ``env`` is None; output is always
+    captured, ``capture_output`` is accepted for drop-in use. Each stream
+    keeps its first ``output_cap`` bytes (its last with ``keep_tail``, e.g.
+    for logs) and invalid UTF-8 is replaced instead of raising. On timeout
+    the process group is killed, ``timed_out`` is set and a note is appended
+    to stderr; with ``check`` a ``TimeoutExpired`` or ``CalledProcessError``
+    is raised instead.
+    """
+    del capture_output
+    started = time.monotonic()
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        cwd=cwd,
+        start_new_session=True,
+    )
+    buffers = {
+        "stdout": _Buffer(output_cap, keep_tail),
+        "stderr": _Buffer(output_cap, keep_tail),
+    }
+    deadline = started + timeout if timeout else None
+    timed_out = False
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+        selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, READ_SIZE)
+                if data:
+                    buffers[key.data].append(data)
+                else:
+                    selector.unregister(key.fileobj)
+
+    if not timed_out:
+        try:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            process.wait(max(remaining, 0) if remaining is not None else None)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+    if timed_out:
+        kill_group(process)
+        process.wait()
+    process.stdout.close()
+    process.stderr.close()
+
+    stdout = buffers["stdout"].value()
+    stderr = buffers["stderr"].value()
+    truncated = {
+        name: buffer.dropped for name, buffer in buffers.items() if buffer.dropped
+    }
+    if truncated:
+        LOGGER.warning("Output of %s truncated: %s", command, truncated)
+    if timed_out:
+        stderr += b"\nCommand timed out after %.0f seconds" % timeout
+    result = RunResult(
+        command,
+        process.returncode,
+        _decode(stdout, text),
+        _decode(stderr, text),
+        truncated,
+        timed_out,
+        time.monotonic() - started,
+    )
+    if check and timed_out:
+        raise subprocess.TimeoutExpired(command, timeout, result.stdout, result.stderr)
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(
+            result.returncode, command, result.stdout, result.stderr
+        )
+    return result
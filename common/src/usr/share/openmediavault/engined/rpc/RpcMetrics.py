@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""Latency histograms for RPC methods and the subprocesses they start.
+
+``@timed`` wraps an ``@rpc.export`` method and records its wall time; the
+method's service and name stay attached to the thread while it runs, so
+subprocesses started through :meth:`RpcMetrics.run` are attributed to the
+RPC that caused them. Set ``OMV_RPC_PROFILE`` to ``Service.method`` (or just
+``method``) to write a cProfile dump of every call of that method.
+"""
+
+import bisect
+import cProfile
+import functools
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import ProcessRunner
+from ProcessRunner import RunResult
+
+LOGGER = logging.getLogger(__name__)
+
+# Directory read by prometheus-node-exporter's textfile collector on Debian.
+PROMETHEUS_DIR = "/var/lib/prometheus/node-exporter"
+PROMETHEUS_FILE = "omv-rpc.prom"
+# The text file is rewritten at most this often, from the calling thread.
+WRITE_INTERVAL = 15.0
+
+PROFILE_TARGET = os.environ.get("OMV_RPC_PROFILE", "")
+PROFILE_DIR = os.environ.get("OMV_RPC_PROFILE_DIR", "/var/lib/openmediavault/profiles")
+PROFILE_KEEP = 20  # Dumps kept per method; older ones are deleted.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HELP = {
+    "omv_rpc_duration_seconds": "Wall time of RPC method calls.",
+    "omv_subprocess_duration_seconds": "Wall time of subprocesses started by RPCs.",
+    "omv_subprocess_output_bytes": "Output size of subprocesses started by RPCs.",
+    "omv_subprocess_exit_total": "Subprocess exit codes.",
+    "omv_subprocess_truncated_total": "Subprocess outputs cut at the size cap.",
+    "omv_compose_status_cache_total": "Compose status cache lookups by result.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_CONTEXT = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram as used by Prometheus."""
+
+    __slots__ = ("bounds", "counts", "count", "total")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+def command_label(command: Any) -> str:
+    """Return a low-cardinality name for ``command``.
+
+    ``/bin/bash /usr/share/openmediavault/mkconf/gitea restart`` becomes
+    ``gitea restart`` and ``docker compose ls`` becomes ``docker compose``.
+    """
+    argv = [str(part) for part in command] if not isinstance(command, str) else []
+    if not argv:
+        return os.path.basename(str(command).split(" ", 1)[0])
+    program = os.path.basename(argv[0])
+    if program in ("bash", "sh") and len(argv) > 1 and not argv[1].startswith("-"):
+        return " ".join([os.path.basename(argv[1])] + argv[2:3])
+    if program == "docker" and len(argv) > 1:
+        return "docker " + argv[1]
+    return program
+
+
+def _format_labels(labels: Labels) -> str:
+    return ",".join(
+        '%s="%s"' % (key, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+
+
+def _size(output: Any) -> int:
+    if output is None:
+        return 0
+    if isinstance(output, str):
+        return len(output.encode("utf-8", "replace"))
+    return len(output)
+
+
+class RpcMetrics:
+    """Process-wide store of RPC and subprocess histograms."""
+
+    def __init__(
+        self,
+        prometheus_dir: str = PROMETHEUS_DIR,
+        profile_target: str = PROFILE_TARGET,
+        profile_dir: str = PROFILE_DIR,
+    ) -> None:
+        self.prometheus_dir = prometheus_dir
+        self.profile_target = profile_target
+        self.profile_dir = profile_dir
+        self.started = time.time()
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], int] = {}
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._last_write = 0.0
+
+    def observe(
+        self,
+        name: str,
+        labels: Dict[str, str],
+        value: float,
+        bounds: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(bounds)
+            histogram.observe(value)
+
+    def increment(self, name: str, labels: Dict[str, str]) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def run(self, command: Any, **kwargs: Any) -> RunResult:
+        """:func:`ProcessRunner.run` recording wall time, exit code and output
+        size; timeouts are counted with the exit code ``timeout``."""
+        labels = {
+            "service": current_service(),
+            "command": command_label(command),
+        }
+        started = time.monotonic()
+        try:
+            result = ProcessRunner.run(command, **kwargs)
+        except subprocess.CalledProcessError as exc:
+            self._record_process(
+                labels, started, str(exc.returncode), exc.output, exc.stderr
+            )
+            raise
+        except subprocess.TimeoutExpired as exc:
+            self._record_process(labels, started, "timeout", exc.output, exc.stderr)
+            raise
+        except OSError:
+            self._record_process(labels, started, "-1", None, None)
+            raise
+        code = "timeout" if result.timed_out else str(result.returncode)
+        self._record_process(labels, started, code, result.stdout, result.stderr)
+        for stream in result.truncated:
+            self.increment(
+                "omv_subprocess_truncated_total", dict(labels, stream=stream)
+            )
+        return result
+
+    def _record_process(
+        self,
+        labels: Dict[str, str],
+        started: float,
+        code: str,
+        stdout: Any,
+        stderr: Any,
+    ) -> None:
+        self.observe(
+            "omv_subprocess_duration_seconds", labels, time.monotonic() - started
+        )
+        self.increment("omv_subprocess_exit_total", dict(labels, code=code))
+        for stream, output in (("stdout", stdout), ("stderr", stderr)):
+            self.observe(
+                "omv_subprocess_output_bytes",
+                dict(labels, stream=stream),
+                _size(output),
+                SIZE_BUCKETS,
+            )
+        self._maybe_write()
+
+    def _should_profile(self, service: str, method: str) -> bool:
+        target = self.profile_target
+        return bool(target) and target in (method, "%s.%s" % (service, method))
+
+    def _profiled(self, service: str, method: str, call: Callable[[], Any]) -> Any:
+        # Only one profiler can be active per interpreter on Python 3.12+.
+        if not self._profile_lock.acquire(blocking=False):
+            return call()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(call)
+        finally:
+            self._profile_lock.release()
+            self._dump_profile(profile, "%s.%s" % (service, method))
+
+    def _dump_profile(self, profile: cProfile.Profile, name: str) -> None:
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(
+                self.profile_dir, "%s-%d.pstats" % (name, time.time() * 1000)
+            )
+            profile.dump_stats(path)
+            dumps = sorted(
+                entry
+                for entry in os.listdir(self.profile_dir)
+                if entry.startswith(name + "-") and entry.endswith(".pstats")
+            )
+            for entry in dumps[:-PROFILE_KEEP]:
+                os.unlink(os.path.join(self.profile_dir, entry))
+            LOGGER.info("Wrote RPC profile %s", path)
+        except OSError as exc:
+            LOGGER.warning("Unable to write RPC profile: %s", exc)
+
+    def call(
+        self, service: str, method: str, function: Callable[..., Any], *args: Any
+    ) -> Any:
+        """Run ``function(*args)`` as RPC ``service.method`` and record it."""
+        previous = getattr(_CONTEXT, "service", None)
+        _CONTEXT.service = service
+        outcome = "error"
+        started = time.monotonic()
+        try:
+            if self._should_profile(service, method):
+                result = self._profiled(service, method, lambda: function(*args))
+            else:
+                result = function(*args)
+            outcome = "ok"
+            return result
+        finally:
+            if previous is None:
+                del _CONTEXT.service
+            else:
+                _CONTEXT.service = previous
+            self.observe(
+                "omv_rpc_duration_seconds",
+                {"service": service, "method": method, "outcome": outcome},
+                time.monotonic() - started,
+            )
+            self._maybe_write()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all series with counts, sums and estimated quantiles."""
+        with self._lock:
+            histograms = []
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                row: Dict[str, Any] = {
+                    "metric": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.total, 6),
+                }
+                for q in (0.5, 0.9, 0.99):
+                    value = histogram.quantile(q)
+                    row["p%d" % int(q * 100)] = (
+                        None if value is None else round(value, 6)
+                    )
+                histograms.append(row)
+            counters = [
+                {"metric": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {
+            "since": self.started,
+            "profile": self.profile_target,
+            "histograms": histograms,
+            "counters": counters,
+        }
+
+    def prometheus_text(self) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            names = sorted({name for name, _ in self._histograms})
+            for name in names:
+                lines.append("# HELP %s %s" % (name, HELP.get(name, name)))
+                lines.append("# TYPE %s histogram" % name)
+                for (series, labels), histogram in sorted(self._histograms.items()):
+                    if series != name:
+                        continue
+                    base = _format_labels(labels)
+                    prefix = base + "," if base else ""
+                    cumulative = 0
+                    bounds = [repr(float(b)) for b in histogram.bounds] + ["+Inf"]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            '%s_bucket{%sle="%s"} %d'
+                            % (name, prefix, bound, cumulative)
+                        )
+                    lines.append("%s_sum{%s} %r" % (name, base, histogram.total))
+                    lines.append("%s_count{%s} %d" % (name, base, histogram.count))
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append("# HELP %s %s" % (name, HELP.get(name, name)))
+                lines.append("# TYPE %s counter" % name)
+                for (series, labels), value in sorted(self._counters.items()):
+                    if series == name:
+                        lines.append(
+                            "%s{%s} %d" % (name, _format_labels(labels), value)
+                        )
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _maybe_write(self) -> None:
+        now = time.monotonic()
+        if now - self._last_write < WRITE_INTERVAL:
+            return
+        self._last_write = now
+        self.write_prometheus()
+
+    def write_prometheus(self) -> None:
+        if not os.path.isdir(self.prometheus_dir):
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.prometheus_dir, prefix=".omv-rpc-")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                handle.write(self.prometheus_text())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, os.path.join(self.prometheus_dir, PROMETHEUS_FILE))
+        except OSError as exc:
+            LOGGER.warning("Unable to write RPC metrics: %s", exc)
+
+
+RPC_METRICS = RpcMetrics()
+
+
+def current_service() -> str:
+    """Label of the service whose RPC runs on this thread, or ``background``."""
+    return getattr(_CONTEXT, "service", "background")
+
+
+def service_label(service: Any) -> str:
+    """``ServiceStoreCLI`` -> ``StoreCLI``; Docker services use ``name``."""
+    name = getattr(service, "name", None)
+    if isinstance(name, str) and name:
+        return name
+    class_name = type(service).__name__
+    return (
+        class_name[len("Service") :] if class_name.startswith("Service") else class_name
+    )
+
+
+def timed(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Record the wall time of an RPC method; apply below ``@rpc.export``."""
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        return RPC_METRICS.call(
+            service_label(self),
+            method.__name__,
+            functools.partial(method, self, *args, **kwargs),
+        )
+
+    return wrapper
@@ -12,6 +12,54 @@ Ext.define('OMV.module.admin.service.BaseDockerServicePanel', {
     serviceName: null,     // e.g., 'Drone', 'Gitea', 'Immich'
     webPort: null,         // e.g., 8080, 3080, 2285
     webPath: '',           // e.g., '', '/admin', '/login'
+    logPageSize: 500,      // Maximum log lines fetched per refresh
+    jobPollInterval: 1000, // Milliseconds between job status polls
+    statusWaitTimeout: 25, // Seconds a status long-poll may block
+    statusRetryInterval: 10000, // Milliseconds between polls without events
+    statusVersion: -1,
+
+    initComponent: function() {
+        var me = this;
+        me.callParent(arguments);
+        me.on('afterrender', me.watchStatus, me, { single: true });
+    },
+
+    /**
+     * Long-poll waitForStatusChange and reload the form only when the
+     * stack's containers actually change.
+     */
+    watchStatus: function() {
+        var me = this;
+        if (me.isDestroyed) {
+            return;
+        }
+        OMV.Rpc.request({
+            scope: me,
+            relayErrors: false,
+            callback: function(id, success, response) {
+                if (me.isDestroyed) {
+                    return;
+                }
+                if (!success || !response.watching) {
+                    Ext.defer(me.watchStatus, me.statusRetryInterval, me);
+                    return;
+                }
+                if (response.changed && me.statusVersion >= 0) {
+                    me.doReload();
+                }
+                me.statusVersion = response.version;
+                me.watchStatus();
+            },
+            rpcData: {
+                service: me.rpcService,
+                method: 'waitForStatusChange',
+                params: {
+                    sinceVersion: me.statusVersion,
+                    timeout: me.statusWaitTimeout
+                }
+            }
+        });
+    },
 
     defaults: {
         flex: 1,
@@ -67,12 +115,17 @@ Ext.define('OMV.module.admin.service.BaseDockerServicePanel', {
             fieldLabel: _('Running'),
             name: 'running',
             value: _('Unknown')
+        }, {
+            xtype: 'displayfield',
+            fieldLabel: _('Health'),
+            name: 'health',
+            value: _('Unknown')
         }];
     },
 
     onInstall: function() {
         var me = this;
-        me.doAjax('install',
+        me.runJob('install',
             Ext.String.format(_('Installing {0}...'), me.serviceName),
             Ext.String.format(_('{0} has been installed.'), me.serviceName)
         );
@@ -86,7 +139,7 @@ Ext.define('OMV.module.admin.service.BaseDockerServicePanel', {
             buttons: Ext.Msg.YESNO,
             fn: function(answer) {
                 if (answer === 'yes') {
-                    me.doAjax('remove',
+                    me.runJob('remove',
                         Ext.String.format(_('Removing {0}...'), me.serviceName),
                         Ext.String.format(_('{0} stack removed.'), me.serviceName)
                     );
@@ -99,12 +152,74 @@ Ext.define('OMV.module.admin.service.BaseDockerServicePanel', {
 
     onRestart: function() {
         var me = this;
-        me.doAjax('restart',
+        me.runJob('restart',
             Ext.String.format(_('Restarting {0}...'), me.serviceName),
             Ext.String.format(_('{0} restarted.'), me.serviceName)
         );
     },
 
+    runJob: function(method, waitMsg, successMsg) {
+        var me = this;
+        OMV.Rpc.request({
+            scope: me,
+            callback: function(id, success, response) {
+                if (!success) {
+                    OMV.MessageBox.error(null, response);
+                    return;
+                }
+                Ext.MessageBox.wait(waitMsg, me.serviceName);
+                me.pollJob(response.jobId, successMsg);
+            },
+            rpcData: {
+                service: me.rpcService,
+                method: method
+            }
+        });
+    },
+
+    pollJob: function(jobId, successMsg) {
+        var me = this;
+        Ext.defer(function() {
+            OMV.Rpc.request({
+                scope: me,
+                callback: function(id, success, response) {
+                    if (!success) {
+                        Ext.MessageBox.hide();
+                        OMV.MessageBox.error(null, response);
+                        return;
+                    }
+                    if (!response.finished) {
+                        var progress = response.progress;
+                        if (progress && progress.total) {
+                            Ext.MessageBox.updateText(Ext.String.format(
+                                _('Downloaded {0} of {1}'),
+                                Ext.util.Format.fileSize(progress.current),
+                                Ext.util.Format.fileSize(progress.total)
+                            ));
+                        } else if (response.lastLine) {
+                            Ext.MessageBox.updateText(response.lastLine);
+                        }
+                        me.pollJob(jobId, successMsg);
+                        return;
+                    }
+                    Ext.MessageBox.hide();
+                    if (response.state === 'succeeded') {
+                        OMV.MessageBox.success(null, successMsg);
+                    } else {
+                        OMV.MessageBox.error(null, response.error + '\n' + response.lastLine);
+                    }
+                },
+                rpcData: {
+                    service: me.rpcService,
+                    method: 'getJobStatus',
+                    params: {
+                        jobId: jobId
+                    }
+                }
+            });
+        }, me.jobPollInterval);
+    },
+
     onOpenWebInterface: function() {
         var me = this;
         var url = 'http://' + window.location.hostname + ':' + me.webPort + me.webPath;
@@ -113,45 +228,59 @@ Ext.define('OMV.module.admin.service.BaseDockerServicePanel', {
 
     onViewLogs: function() {
         var me = this;
+        var win = me.showLogsWindow();
+        me.fetchLogs(win);
+    },
+
+    fetchLogs: function(win) {
+        var me = this;
+        var textarea = win.down('textarea');
 
-        // Show loading mask
-        me.setLoading(true);
+        win.setLoading(true);
 
-        // Call the RPC method to get logs
+        // Only lines newer than the window's cursor are transferred
         OMV.Rpc.request({
             scope: me,
             callback: function(id, success, response) {
-                me.setLoading(false);
-                if (success) {
-                    me.showLogsWindow(response.logs, response.error);
-                } else {
+                win.setLoading(false);
+                if (!success) {
                     OMV.MessageBox.error(null, response);
+                    return;
                 }
+                if (response.error) {
+                    textarea.setValue(_('Error retrieving logs: ') + response.error);
+                    return;
+                }
+                if (response.logs) {
+                    var current = textarea.getValue();
+                    textarea.setValue(current ? current + '\n' + response.logs : response.logs);
+                }
+                win.logCursor = response.cursor;
             },
             rpcData: {
                 service: me.rpcService,
-                method: 'getLogs'
+                method: 'getLogsSince',
+                params: {
+                    cursor: win.logCursor || '',
+                    limit: me.logPageSize
+                }
             }
         });
     },
 
-    showLogsWindow: function(logs, error) {
+    showLogsWindow: function() {
         var me = this;
 
-        var logText = logs || _('No logs available');
-        if (error) {
-            logText = _('Error retrieving logs: ') + error;
-        }
-
-        Ext.create('Ext.window.Window', {
+        return Ext.create('Ext.window.Window', {
             title: Ext.String.format(_('{0} Logs'), me.serviceName),
             width: 800,
             height: 600,
             layout: 'fit',
             modal: true,
+            logCursor: '',
             items: [{
                 xtype: 'textarea',
-                value: logText,
+                emptyText: _('No logs available'),
                 readOnly: true,
                 style: {
                     fontFamily: 'monospace',
@@ -161,8 +290,7 @@ Ext.define('OMV.module.admin.service.BaseDockerServicePanel', {
             buttons: [{
                 text: _('Refresh'),
                 handler: function() {
-                    this.up('window').close();
-                    me.onViewLogs();
+                    me.fetchLogs(this.up('window'));
                 }
             }, {
                 text: _('Close'),
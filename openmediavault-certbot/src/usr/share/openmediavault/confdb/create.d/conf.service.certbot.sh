@@ -13,5 +13,8 @@ if ! omv_config_exists "/config/services/certbot"; then
         omv_config_add_key "/config/services/certbot" "staging" "1"
         omv_config_add_key "/config/services/certbot" "httpport" "8088"
 fi
+if ! omv_config_exists "/config/services/certbot/certificategroups"; then
+        omv_config_add_key "/config/services/certbot" "certificategroups" ""
+fi
 
 exit 0
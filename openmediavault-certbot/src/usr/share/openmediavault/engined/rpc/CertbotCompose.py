@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Compose model of the Certbot stack, rendered by ComposeRenderer."""
+
+from typing import Any, Dict
+
+from CertbotGroups import parse_groups
+
+# One-shot service started by CertbotSchedule through ``docker compose run``
+# when a certificate is due; deploy never starts it.
+RUN_SERVICE = "certbot-run"
+
+
+def build_model(conf: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Return the compose file for ``conf.service.certbot`` as dicts.
+
+    Only the nginx challenge server runs permanently. Invalid certificate
+    groups raise ``ValueError`` so mkconf reports them.
+    """
+    del directory  # Data lives next to the compose file.
+    parse_groups(conf)
+    http_port = conf.get("httpport") or 8088
+    return {
+        "name": "certbot",
+        "services": {
+            RUN_SERVICE: {
+                "image": "certbot/certbot:latest",
+                "volumes": [
+                    "./etc-letsencrypt:/etc/letsencrypt",
+                    "./var-lib-letsencrypt:/var/lib/letsencrypt",
+                    "./www:/var/www/certbot",
+                    "./logs:/var/log/letsencrypt",
+                ],
+                "profiles": ["oneshot"],
+                "depends_on": ["nginx"],
+            },
+            "nginx": {
+                "image": "nginx:1.25",
+                "volumes": [
+                    "./nginx.conf:/etc/nginx/nginx.conf:ro",
+                    "./www:/var/www/certbot",
+                ],
+                "ports": ["%s:8080" % http_port],
+                "restart": "unless-stopped",
+            },
+        },
+    }
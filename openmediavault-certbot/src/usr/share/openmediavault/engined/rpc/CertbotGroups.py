@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Certificate groups: the SAN sets Certbot keeps one certificate each for.
+
+Groups come from ``certificategroups``, one certificate per line, or from
+the single ``domains`` list of older configurations. Every group is
+matched to an existing lineage so only groups whose domain set changed are
+reissued.
+
+Certbot locks its config directory for the whole run, so lineages sharing
+one cannot be issued in parallel. New groups therefore get their own
+config directory below ``etc-letsencrypt/groups`` and a link in
+``etc-letsencrypt/live``, which keeps the usual certificate paths.
+Lineages issued before groups existed stay in the shared directory.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+GROUPS_DIR = "groups"
+# Mount points of the certbot-run service.
+CONFIG_ROOT = "/etc/letsencrypt"
+WORK_ROOT = "/var/lib/letsencrypt"
+LOGS_ROOT = "/var/log/letsencrypt"
+
+_DOMAIN_RE = re.compile(
+    r"^(?=.{1,253}$)([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,62}$"
+)
+
+
+class Group(NamedTuple):
+    """One configured certificate and the lineage that holds it."""
+
+    name: str
+    domains: Tuple[str, ...]
+    # ``renew`` (unchanged), ``reissue`` (domains changed) or ``issue``.
+    action: str
+    # Config directory below etc-letsencrypt; empty for the shared one.
+    config_dir: str
+
+
+def parse_groups(conf: Dict[str, Any]) -> List[Tuple[str, ...]]:
+    """Return the configured SAN sets, in order and without duplicates.
+
+    Domains are separated by commas or spaces; empty lines and ``#``
+    comments are skipped. Raises ``ValueError`` for invalid domains, and
+    for wildcards, which the HTTP challenge cannot validate.
+    """
+    text = str(conf.get("certificategroups") or "")
+    if not text.strip():
+        text = str(conf.get("domains") or "")
+    groups: List[Tuple[str, ...]] = []
+    seen: Set[frozenset] = set()
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.partition("#")[0]
+        domains = tuple(
+            dict.fromkeys(d.lower() for d in re.split(r"[\s,]+", line) if d)
+        )
+        if not domains:
+            continue
+        for domain in domains:
+            if domain.startswith("*."):
+                raise ValueError(
+                    "Line %d: wildcard %s needs a DNS challenge" % (number, domain)
+                )
+            if not _DOMAIN_RE.match(domain):
+                raise ValueError("Line %d: invalid domain %s" % (number, domain))
+        if frozenset(domains) not in seen:
+            seen.add(frozenset(domains))
+            groups.append(domains)
+    return groups
+
+
+def match_groups(
+    groups: Sequence[Tuple[str, ...]],
+    lineages: Dict[str, Tuple[str, ...]],
+    linked: Set[str],
+) -> Tuple[List[Group], List[str]]:
+    """Match ``groups`` to ``lineages`` (name to domains).
+
+    A lineage with the same domain set is renewed; otherwise a lineage named
+    after one of the group's domains is reissued with the new set; otherwise
+    a new lineage is issued in its own config directory. ``linked`` names
+    the lineages that already have one. Returns the groups and the names of
+    lineages no group claimed, which are left alone.
+    """
+    claimed: Dict[int, str] = {}
+    by_set = {frozenset(domains): name for name, domains in lineages.items()}
+    for index, domains in enumerate(groups):
+        name = by_set.get(frozenset(domains))
+        if name is not None and name not in claimed.values():
+            claimed[index] = name
+    for index, domains in enumerate(groups):
+        if index in claimed:
+            continue
+        for domain in domains:
+            if domain in lineages and domain not in claimed.values():
+                claimed[index] = domain
+                break
+
+    result = []
+    taken = set(lineages) | set(claimed.values())
+    for index, domains in enumerate(groups):
+        name = claimed.get(index)
+        if name is None:
+            name, suffix = domains[0], 1
+            while name in taken:
+                suffix += 1
+                name = "%s-%d" % (domains[0], suffix)
+            taken.add(name)
+            action = "issue"
+        elif frozenset(lineages[name]) == frozenset(domains):
+            action = "renew"
+        else:
+            action = "reissue"
+        own = action == "issue" or name in linked
+        result.append(
+            Group(name, domains, action, os.path.join(GROUPS_DIR, name) if own else "")
+        )
+    unclaimed = sorted(set(lineages) - set(claimed.values()))
+    return result, unclaimed
+
+
+def directory_options(name: str, config_dir: str) -> List[str]:
+    """Certbot options keeping a lineage's state in its own directories."""
+    if not config_dir:
+        return []
+    return [
+        "--config-dir",
+        os.path.join(CONFIG_ROOT, config_dir),
+        "--work-dir",
+        os.path.join(WORK_ROOT, name),
+        "--logs-dir",
+        os.path.join(LOGS_ROOT, name),
+    ]
+
+
+def link_lineage(letsencrypt: str, name: str, config_dir: str) -> Optional[str]:
+    """Link ``live/<name>`` to the lineage in its own config directory.
+
+    Returns an error message when the link cannot be created.
+    """
+    if not config_dir:
+        return None
+    link = os.path.join(letsencrypt, "live", name)
+    target = os.path.join("..", config_dir, "live", name)
+    try:
+        if os.path.islink(link) and os.readlink(link) == target:
+            return None
+        if os.path.lexists(link):
+            return "%s exists and is not a link to %s" % (link, target)
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        os.symlink(target, link)
+    except OSError as exc:
+        return str(exc)
+    return None
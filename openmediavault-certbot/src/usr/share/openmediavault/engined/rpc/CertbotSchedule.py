@@ -0,0 +1,561 @@
+# -*- coding: utf-8 -*-
+"""Expiry driven Certbot runs.
+
+Certificates under ``etc-letsencrypt/live`` are parsed in-process and
+re-read only when their files change. Each one is due once it enters its
+renewal window plus a stable per-certificate jitter; failed runs back off
+exponentially. Certificate groups whose domain set changed are reissued
+right away. Due certificates are handled by one-shot ``certbot-run``
+containers in a job of the stack's job manager, so nothing sleeps in a
+container between renewals; groups in separate config directories run
+concurrently.
+"""
+
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from CertbotCompose import RUN_SERVICE
+from CertbotGroups import directory_options, link_lineage, match_groups, parse_groups
+
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+except ImportError:  # pragma: no cover - python3-cryptography is a dependency
+    x509 = None
+
+LOGGER = logging.getLogger(__name__)
+
+PROJECT = "certbot"
+WEBROOT = "/var/www/certbot"
+STATE_FILE = ".omv-certbot-schedule.json"
+
+# Renew this long before expiry, or with a third of the lifetime left for
+# short-lived certificates, like certbot's own default.
+RENEW_BEFORE = float(os.environ.get("OMV_CERTBOT_RENEW_DAYS", "30")) * 86400
+# Spreads runs of many certificates (and hosts) over this many seconds.
+JITTER = float(os.environ.get("OMV_CERTBOT_JITTER", str(6 * 3600)))
+BACKOFF_BASE = float(os.environ.get("OMV_CERTBOT_BACKOFF", "3600"))
+BACKOFF_MAX = 86400.0
+# Longest sleep between checks, so config and certificate changes are seen.
+CHECK_INTERVAL = 3600.0
+# Shortest sleep, also used while another job of the stack runs.
+BUSY_RETRY = 60.0
+RUN_TIMEOUT = float(os.environ.get("OMV_CERTBOT_RUN_TIMEOUT", "600"))
+# Certificate groups issued at the same time.
+CONCURRENCY = int(os.environ.get("OMV_CERTBOT_CONCURRENCY", "2"))
+
+
+class Certificate(NamedTuple):
+    """Parsed ``cert.pem`` of one certbot lineage."""
+
+    name: str
+    domains: Tuple[str, ...]
+    not_before: float
+    not_after: float
+    issuer: str
+
+
+def _timestamp(certificate: Any, attribute: str) -> float:
+    """UTC validity bound, from the aware (cryptography >= 42) or the naive
+    UTC attribute."""
+    value = getattr(certificate, attribute + "_utc", None)
+    if value is None:
+        value = getattr(certificate, attribute).replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+def read_certificate(name: str, path: str) -> Certificate:
+    """Parse the first certificate of PEM file ``path``.
+
+    Raises ``ValueError`` for unreadable files, and when python3-cryptography
+    is missing, so the error shows in the schedule instead of stopping it.
+    """
+    if x509 is None:
+        raise ValueError("Unable to parse %s: python3-cryptography is missing" % path)
+    try:
+        with open(path, "rb") as handle:
+            certificate = x509.load_pem_x509_certificate(handle.read())
+        try:
+            extension = certificate.extensions.get_extension_for_class(
+                x509.SubjectAlternativeName
+            )
+            domains = tuple(extension.value.get_values_for_type(x509.DNSName))
+        except x509.ExtensionNotFound:
+            domains = ()
+        issuer = certificate.issuer.get_attributes_for_oid(
+            NameOID.ORGANIZATION_NAME
+        ) or certificate.issuer.get_attributes_for_oid(NameOID.COMMON_NAME)
+        return Certificate(
+            name,
+            domains,
+            _timestamp(certificate, "not_valid_before"),
+            _timestamp(certificate, "not_valid_after"),
+            str(issuer[0].value) if issuer else "",
+        )
+    except (OSError, ValueError) as exc:
+        raise ValueError("Unable to parse %s: %s" % (path, exc))
+
+
+class CertificateCache:
+    """Parsed certificates of ``live`` directories, keyed by file identity."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Tuple[int, int, int], Certificate]] = {}
+
+    def load(self, live: str) -> Tuple[List[Certificate], List[str]]:
+        """Return the certificates below ``live`` and per-lineage errors.
+
+        Files whose inode, size and mtime are unchanged are not re-parsed.
+        """
+        certificates, errors = [], []
+        try:
+            names = sorted(os.listdir(live))
+        except FileNotFoundError:
+            names = []
+        except OSError as exc:
+            return [], [str(exc)]
+        for name in names:
+            path = os.path.join(live, name, "cert.pem")
+            try:
+                # Follows the symlink into ../archive, which changes on renewal.
+                stat = os.stat(path)
+            except OSError:
+                continue  # e.g. the README certbot keeps in live/
+            key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                cached = self._entries.get(path)
+            if cached is not None and cached[0] == key:
+                certificates.append(cached[1])
+                continue
+            try:
+                certificate = read_certificate(name, path)
+            except ValueError as exc:
+                errors.append(str(exc))
+                continue
+            with self._lock:
+                self._entries[path] = (key, certificate)
+            certificates.append(certificate)
+        return certificates, errors
+
+
+CERTIFICATES = CertificateCache()
+
+
+def renew_from(certificate: Certificate) -> float:
+    """Return when ``certificate`` enters its renewal window."""
+    lifetime = certificate.not_after - certificate.not_before
+    return certificate.not_after - min(RENEW_BEFORE, lifetime / 3)
+
+
+def jitter(name: str, not_after: float) -> float:
+    """Stable offset in ``[0, JITTER)`` so restarts do not reshuffle runs."""
+    seed = zlib.crc32(("%s:%d" % (name, not_after)).encode("utf-8"))
+    return seed / 2**32 * JITTER
+
+
+def backoff(failures: int) -> float:
+    """Delay before retrying after ``failures`` consecutive failed runs."""
+    return min(BACKOFF_BASE * 2 ** max(failures - 1, 0), BACKOFF_MAX)
+
+
+def _write_atomic(path: str, text: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".omv-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class RunProgress:
+    """Per-certificate state of one run, published as the job's progress."""
+
+    def __init__(self, names: List[str]) -> None:
+        self._lock = threading.Lock()
+        self._certificates = {
+            name: {"state": "queued", "error": "", "started": None, "finished": None}
+            for name in names
+        }
+
+    def update(self, name: str, **values: Any) -> None:
+        with self._lock:
+            self._certificates[name].update(values)
+
+    def state(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._certificates.get(name)
+            return dict(entry) if entry is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy suitable for JSON serialisation."""
+        with self._lock:
+            certificates = {
+                name: dict(entry) for name, entry in self._certificates.items()
+            }
+        return {
+            "certificates": certificates,
+            "total": len(certificates),
+            "completed": sum(
+                entry["state"] in ("succeeded", "failed")
+                for entry in certificates.values()
+            ),
+        }
+
+
+class CertbotScheduler:
+    """Background thread renewing certificates when they are due.
+
+    Run history (failures, next retry, last outcome) is kept per lineage in
+    ``.omv-certbot-schedule.json`` next to the compose file, so backoff
+    survives engined restarts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._history: Dict[str, Dict[str, Any]] = {}
+        self._history_path = ""
+        self.job_id = ""
+        self.next_check: Optional[float] = None
+        # Progress of the current or most recent run.
+        self.progress: Optional[RunProgress] = None
+
+    def start(self) -> None:
+        """Start the scheduler thread once."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name="certbot-scheduler", daemon=True
+                )
+                self._thread.start()
+
+    def wake(self) -> None:
+        """Re-check the schedule now, e.g. after a configuration change."""
+        self._wake.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _load_history(self, directory: str) -> Dict[str, Dict[str, Any]]:
+        path = os.path.join(directory, STATE_FILE)
+        with self._lock:
+            if self._history_path != path:
+                try:
+                    with open(path, "r", encoding="utf-8") as handle:
+                        self._history = json.load(handle).get("certificates") or {}
+                except (OSError, ValueError):
+                    self._history = {}
+                self._history_path = path
+            return {name: dict(entry) for name, entry in self._history.items()}
+
+    def _record(self, directory: str, name: str, **values: Any) -> None:
+        self._load_history(directory)
+        with self._lock:
+            self._history.setdefault(name, {}).update(values)
+            text = json.dumps({"certificates": self._history}, sort_keys=True)
+            # Concurrent runs record outcomes; write in the order of updates.
+            try:
+                _write_atomic(os.path.join(directory, STATE_FILE), text)
+            except OSError as exc:
+                LOGGER.error("Unable to save the Certbot schedule: %s", exc)
+
+    def plan(
+        self, conf: Dict[str, Any], directory: str, now: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Return every certificate with its expiry, next run and outcome.
+
+        Each configured group is renewed by expiry, or is due right away
+        when it has no certificate yet or its domain set changed (once an
+        account email is set). Lineages matching no group are listed as
+        ``unmanaged`` and never run. Raises ``ValueError`` for an invalid
+        group list.
+        """
+        now = time.time() if now is None else now
+        live = os.path.join(directory, "etc-letsencrypt", "live")
+        certificates, errors = CERTIFICATES.load(live)
+        lineages = {certificate.name: certificate for certificate in certificates}
+        linked = {name for name in lineages if os.path.islink(os.path.join(live, name))}
+        groups, unclaimed = match_groups(
+            parse_groups(conf),
+            {name: lineage.domains for name, lineage in lineages.items()},
+            linked,
+        )
+        history = self._load_history(directory)
+        progress = self.progress
+        entries = []
+        for group in groups:
+            entry = self._entry(
+                group.name, lineages.get(group.name), history, now, group.action
+            )
+            entry.update(domains=list(group.domains), configDir=group.config_dir)
+            if group.action != "renew":
+                if conf.get("email"):
+                    retry = history.get(group.name, {}).get("retryAt") or 0.0
+                    entry["nextRun"] = max(now, retry)
+                else:
+                    entry.update(nextRun=None, note="Set an account email to issue")
+            entries.append(entry)
+        for name in unclaimed:
+            entry = self._entry(name, lineages[name], history, now, "unmanaged")
+            entry.update(nextRun=None, note="Not in the configured groups")
+            entries.append(entry)
+        for entry in entries:
+            entry["due"] = entry["nextRun"] is not None and entry["nextRun"] <= now
+            run = progress.state(entry["name"]) if progress is not None else None
+            entry["progress"] = run["state"] if run is not None else ""
+        return {"certificates": entries, "errors": errors}
+
+    @staticmethod
+    def _entry(
+        name: str,
+        certificate: Optional[Certificate],
+        history: Dict[str, Dict[str, Any]],
+        now: float,
+        action: str,
+    ) -> Dict[str, Any]:
+        past = history.get(name, {})
+        entry: Dict[str, Any] = {
+            "name": name,
+            "action": action,
+            "domains": [],
+            "certificateDomains": [],
+            "configDir": "",
+            "issuer": "",
+            "notBefore": None,
+            "notAfter": None,
+            "daysLeft": None,
+            "renewFrom": None,
+            "nextRun": None,
+            "note": "",
+            "failures": past.get("failures", 0),
+            "lastRun": past.get("lastRun"),
+            "lastResult": past.get("lastResult", ""),
+            "lastError": past.get("lastError", ""),
+        }
+        if certificate is not None:
+            window = renew_from(certificate)
+            due = window + jitter(name, certificate.not_after)
+            entry.update(
+                domains=list(certificate.domains),
+                certificateDomains=list(certificate.domains),
+                issuer=certificate.issuer,
+                notBefore=certificate.not_before,
+                notAfter=certificate.not_after,
+                daysLeft=round((certificate.not_after - now) / 86400, 1),
+                renewFrom=window,
+                nextRun=max(due, past.get("retryAt") or 0.0),
+            )
+        return entry
+
+    def _command(self, conf: Dict[str, Any], entry: Dict[str, Any]) -> List[str]:
+        command = ["docker", "compose", "-f", "docker-compose.yml", "run"]
+        command += ["--rm", RUN_SERVICE]
+        if entry["action"] in ("issue", "reissue"):
+            command += ["certonly", "--cert-name", entry["name"]]
+            command += ["--domains", ",".join(entry["domains"])]
+            command += ["--agree-tos", "--email", conf.get("email", "")]
+            if conf.get("staging", True):
+                command.append("--staging")
+        else:
+            # The schedule decided it is due; certbot must not second-guess it.
+            command += ["renew", "--cert-name", entry["name"], "--force-renewal"]
+        return (
+            command
+            + directory_options(entry["name"], entry["configDir"])
+            + ["--webroot", "--webroot-path", WEBROOT, "--non-interactive"]
+        )
+
+    def _verify(self, directory: str, entry: Dict[str, Any]) -> str:
+        """Check a successful certbot run left the expected certificate."""
+        letsencrypt = os.path.join(directory, "etc-letsencrypt")
+        error = link_lineage(letsencrypt, entry["name"], entry["configDir"])
+        if error:
+            return error
+        certificates = CERTIFICATES.load(os.path.join(letsencrypt, "live"))[0]
+        after = {certificate.name: certificate for certificate in certificates}
+        certificate = after.get(entry["name"])
+        if certificate is None:
+            return "certbot succeeded but no certificate was found"
+        if entry["action"] == "renew" and certificate.not_after == entry["notAfter"]:
+            return "certbot succeeded but the certificate is unchanged"
+        if set(certificate.domains) != set(entry["domains"]):
+            return "certbot succeeded but the certificate covers %s" % ", ".join(
+                certificate.domains
+            )
+        return ""
+
+    def run_entry(
+        self, conf: Dict[str, Any], directory: str, entry: Dict[str, Any], job: Any
+    ) -> bool:
+        """Run certbot once for ``entry``, logging to ``job``; record the
+        outcome and return whether it succeeded."""
+        # pylint: disable=import-outside-toplevel
+        from ProcessRunner import process_env, run
+
+        name = entry["name"]
+        job.append("%s: %s %s" % (name, entry["action"], ", ".join(entry["domains"])))
+        started = time.time()
+        progress = job.progress if isinstance(job.progress, RunProgress) else None
+        if progress is not None:
+            progress.update(name, state="running", started=started)
+        error = ""
+        try:
+            result = run(
+                self._command(conf, entry),
+                cwd=directory,
+                env=dict(process_env(), COMPOSE_PROJECT_NAME=PROJECT),
+                timeout=RUN_TIMEOUT,
+                keep_tail=True,
+            )
+        except OSError as exc:
+            error = str(exc)
+        else:
+            for line in (result.stdout + result.stderr).splitlines():
+                job.append("%s: %s" % (name, line))
+            if result.timed_out:
+                error = "certbot did not finish in %.0f s" % RUN_TIMEOUT
+            elif result.returncode != 0:
+                error = "certbot exited with status %d" % result.returncode
+            else:
+                error = self._verify(directory, entry)
+
+        history = self._load_history(directory).get(name, {})
+        if progress is not None:
+            progress.update(
+                name,
+                state="failed" if error else "succeeded",
+                error=error,
+                finished=time.time(),
+            )
+        if error:
+            failures = history.get("failures", 0) + 1
+            retry = started + backoff(failures)
+            self._record(
+                directory,
+                name,
+                failures=failures,
+                retryAt=retry,
+                lastRun=started,
+                lastResult="failed",
+                lastError=error,
+            )
+            job.append(
+                "%s: failed (%s), retrying in %.0f min"
+                % (name, error, (retry - started) / 60)
+            )
+            return False
+        self._record(
+            directory,
+            name,
+            failures=0,
+            retryAt=None,
+            lastRun=started,
+            lastResult="succeeded",
+            lastError="",
+        )
+        job.append("%s: succeeded" % name)
+        return True
+
+    def run_due(
+        self,
+        conf: Dict[str, Any],
+        directory: str,
+        due: List[Dict[str, Any]],
+        job: Any,
+        concurrency: int = CONCURRENCY,
+    ) -> List[str]:
+        """Run ``due`` certificates, ``concurrency`` config directories at a
+        time, and return the names that failed.
+
+        Certificates sharing a config directory run one after another, as
+        certbot locks it; a failure never stops the others.
+        """
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in due:
+            batches.setdefault(entry["configDir"], []).append(entry)
+
+        def run_batch(batch: List[Dict[str, Any]]) -> List[str]:
+            return [
+                entry["name"]
+                for entry in batch
+                if not self.run_entry(conf, directory, entry, job)
+            ]
+
+        workers = max(1, min(concurrency, len(batches)))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="omv-certbot"
+        ) as executor:
+            results = list(executor.map(run_batch, batches.values()))
+        return [name for failed in results for name in failed]
+
+    def tick(self) -> float:
+        """Queue a run for due certificates; return seconds until the next
+        check."""
+        # pylint: disable=import-outside-toplevel
+        from ComposeRenderer import COMPOSE_FILE, load_config
+        from JobManager import JOBS, Job, JobFailed
+
+        conf = load_config(PROJECT)
+        directory = conf.get("composepath") or "/srv/dev-disk-by-label-data/certbot"
+        if not conf.get("enable") or not os.path.exists(
+            os.path.join(directory, COMPOSE_FILE)
+        ):
+            self.next_check = None
+            return CHECK_INTERVAL
+
+        now = time.time()
+        entries = self.plan(conf, directory, now)["certificates"]
+        due = [entry for entry in entries if entry["due"]]
+        upcoming = [
+            entry["nextRun"] - now
+            for entry in entries
+            if entry["nextRun"] is not None and not entry["due"]
+        ]
+        delay = max(min([CHECK_INTERVAL] + upcoming), BUSY_RETRY)
+        if due and JOBS.active_job(PROJECT) is not None:
+            # An install, restart or earlier run of the stack is still busy.
+            delay = BUSY_RETRY
+        elif due:
+            progress = RunProgress([entry["name"] for entry in due])
+
+            def step(job: Job) -> None:
+                job.progress = progress
+                failed = self.run_due(conf, directory, due, job)
+                if failed:
+                    raise JobFailed("Certbot failed for: %s" % ", ".join(failed))
+
+            self.progress = progress
+            # Re-plan as soon as the run ends instead of after ``delay``.
+            job = JOBS.submit(
+                PROJECT, "renew", [step], on_complete=lambda _job: self.wake()
+            )
+            self.job_id = job.id
+            LOGGER.info("Certbot run queued for %d certificate(s)", len(due))
+        self.next_check = now + delay
+        return delay
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                delay = self.tick()
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("Certbot schedule check failed: %s", exc)
+                delay = CHECK_INTERVAL
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+SCHEDULER = CertbotScheduler()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Certbot RPC service with the certificate schedule, loaded by PluginRegistry."""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from BaseDockerService import BaseDockerService
+from CertbotSchedule import SCHEDULER
+from JobManager import Step
+from openmediavault import config, rpc
+from RpcMetrics import timed
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ServiceCertbot(BaseDockerService):
+    """RPC service to manage the Certbot Docker stack."""
+
+    name = "Certbot"
+    mkconf_script = "/usr/share/openmediavault/mkconf/certbot"
+    compose_name = "certbot"
+
+    def _conf(self) -> Dict[str, Any]:
+        try:
+            return config.Database().get("conf.service.certbot").get_dict()
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.debug("Unable to read conf.service.certbot: %s", exc)
+            return {}
+
+    def _submit_job(
+        self, action: str, steps: Optional[List[Step]] = None
+    ) -> Dict[str, str]:
+        """Re-check the schedule once an install or restart finished, so the
+        first certificate is requested right away."""
+        steps = list(steps or [self._mkconf(action)])
+        if action != "remove":
+            steps.append(lambda _job: SCHEDULER.wake())
+        return super()._submit_job(action, steps)
+
+    def _status(self) -> Dict[str, Any]:
+        """Add the soonest expiry, running groups and next run to the status."""
+        status = super()._status()
+        try:
+            entries = SCHEDULER.plan(self._conf(), self._compose_dir())["certificates"]
+        except ValueError as exc:
+            status["certificatesSummary"] = str(exc)
+            return status
+        issued = [entry for entry in entries if entry["notAfter"] is not None]
+        if not entries:
+            summary = "No certificates"
+        elif not issued:
+            summary = "Waiting for the first certificate"
+        else:
+            soonest = min(issued, key=lambda entry: entry["notAfter"])
+            summary = "%d certificate(s); %s expires in %.0f days" % (
+                len(issued),
+                soonest["name"],
+                soonest["daysLeft"],
+            )
+        running = [e["name"] for e in entries if e["progress"] in ("queued", "running")]
+        if running:
+            summary += "; in progress: %s" % ", ".join(running)
+        upcoming = [e["nextRun"] for e in entries if e["nextRun"] is not None]
+        if upcoming and not running:
+            summary += "; next run %s" % time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(min(upcoming))
+            )
+        failed = [entry["name"] for entry in entries if entry["lastResult"] == "failed"]
+        if failed:
+            summary += "; last run failed for %s" % ", ".join(failed)
+        status["certificatesSummary"] = summary
+        return status
+
+    @rpc.export
+    @timed
+    def getCertificates(self) -> Dict[str, Any]:
+        """Return expiry, renewal window and run history of every certificate.
+
+        Each configured group reports its ``action`` (renew, reissue, issue)
+        and its ``progress`` in the current run; lineages outside the groups
+        are ``unmanaged``. Answered from the parsed certificate cache; no
+        container is started. Times are Unix timestamps.
+        """
+        try:
+            plan = SCHEDULER.plan(self._conf(), self._compose_dir())
+        except ValueError as exc:
+            raise rpc.Error(str(exc))
+        progress = SCHEDULER.progress
+        plan.update(
+            scheduler=SCHEDULER.running,
+            nextCheck=SCHEDULER.next_check,
+            jobId=SCHEDULER.job_id,
+            run=progress.snapshot() if progress is not None else None,
+        )
+        return plan
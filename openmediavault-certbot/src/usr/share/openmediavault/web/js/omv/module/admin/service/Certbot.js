@@ -30,6 +30,12 @@ Ext.define('OMV.module.admin.service.Certbot', {
                         name: 'running',
                         value: _('Loading...')
                     },
+                    {
+                        xtype: 'displayfield',
+                        fieldLabel: _('Certificates'),
+                        name: 'certificatesSummary',
+                        value: _('Loading...')
+                    },
                     {
                         xtype: 'displayfield',
                         fieldLabel: _('Stack directory'),
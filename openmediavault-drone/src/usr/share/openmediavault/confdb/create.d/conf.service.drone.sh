@@ -11,5 +11,10 @@ if ! omv_config_exists "/config/services/drone"; then
         omv_config_add_key "/config/services/drone" "timezone" ""
         omv_config_add_key "/config/services/drone" "serverport" "8080"
 fi
+if ! omv_config_exists "/config/services/drone/runnercapacity"; then
+        omv_config_add_key "/config/services/drone" "runnercapacity" "0"
+        omv_config_add_key "/config/services/drone" "runnerreplicas" "1"
+        omv_config_add_key "/config/services/drone" "database" "sqlite"
+fi
 
 exit 0
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Compose model of the Drone stack, rendered by ComposeRenderer."""
+
+import math
+import os
+from typing import Any, Dict, Tuple
+
+from PostgresTuning import host_capacity, postgres_command, postgres_settings
+
+# Memory one concurrent build is assumed to need, and memory kept for the
+# host and the other stacks.
+BUILD_MEMORY = 2048  # MiB
+HOST_RESERVE = 2048  # MiB
+MAX_REPLICAS = 8
+
+# Machine user the RPC service reads /metrics with, see DroneService.py.
+# Drone serves /metrics to machine users without admin rights; the server
+# updates the flags of an existing user on start, so older installs that
+# created it as an admin are demoted on the next deploy.
+METRICS_USER = "omv-metrics"
+SQLITE_FILE = os.path.join("data", "database.sqlite")
+
+
+def runner_capacity(conf: Dict[str, Any]) -> Tuple[int, int]:
+    """Return concurrent builds per runner and the number of runners.
+
+    ``runnercapacity`` overrides the builds per runner; otherwise one build
+    per core, bounded by memory, is spread over ``runnerreplicas`` runners.
+    """
+    replicas = min(max(int(conf.get("runnerreplicas") or 1), 1), MAX_REPLICAS)
+    override = int(conf.get("runnercapacity") or 0)
+    if override > 0:
+        return override, replicas
+    cores, memory = host_capacity()
+    total = max(1, min(cores, (memory - HOST_RESERVE) // BUILD_MEMORY))
+    return max(1, math.ceil(total / replicas)), replicas
+
+
+def check_sqlite(directory: str) -> None:
+    """Refuse to switch to a new PostgreSQL database while SQLite holds data.
+
+    Drone does not migrate between datastores, so the switch would start
+    with no users, repositories or builds.
+    """
+    sqlite = os.path.join(directory, SQLITE_FILE)
+    postgres = os.path.join(directory, "postgres")
+    if os.path.isfile(sqlite) and not (
+        os.path.isdir(postgres) and os.listdir(postgres)
+    ):
+        raise ValueError(
+            "Drone's SQLite database %s would be abandoned by switching to "
+            "PostgreSQL, which starts empty. Migrate it first, or move it "
+            "aside to start over, or keep the SQLite datastore." % sqlite
+        )
+
+
+def build_model(conf: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Return the compose file for ``conf.service.drone`` as dicts.
+
+    ``${VAR}`` references are resolved by compose from the stack's ``.env``.
+    Raises ``ValueError`` when switching to PostgreSQL would leave an
+    existing SQLite database behind.
+    """
+    port = conf.get("serverport") or 8080
+    capacity, replicas = runner_capacity(conf)
+
+    server_environment: Dict[str, Any] = {
+        "DRONE_DATABASE_DRIVER": "sqlite3",
+        "DRONE_DATABASE_DATASOURCE": "/data/database.sqlite",
+        "DRONE_RUNNER_CAPACITY": capacity,
+        "DRONE_USER_CREATE": "username:%s,machine:true,admin:false,"
+        "token:${DRONE_METRICS_TOKEN}" % METRICS_USER,
+    }
+    server: Dict[str, Any] = {
+        "image": "drone/drone:2",
+        "env_file": [".env"],
+        "environment": server_environment,
+        "volumes": ["./data:/data"],
+        "ports": ["%s:80" % port],
+        "restart": "unless-stopped",
+    }
+    runner: Dict[str, Any] = {
+        "image": "drone/drone-runner-docker:1",
+        "env_file": [".env"],
+        "environment": {
+            "DRONE_RPC_HOST": "drone-server",
+            "DRONE_RPC_PROTO": "http",
+            "DRONE_RPC_SECRET": "${DRONE_RPC_SECRET}",
+            "DRONE_RUNNER_CAPACITY": capacity,
+            "DRONE_RUNNER_NAME": "openmediavault",
+        },
+        "volumes": ["/var/run/docker.sock:/var/run/docker.sock"],
+        "depends_on": ["drone-server"],
+        "restart": "unless-stopped",
+    }
+    if replicas > 1:
+        # Replicas register under their container hostnames.
+        del runner["environment"]["DRONE_RUNNER_NAME"]
+        runner["deploy"] = {"replicas": replicas}
+    services = {"drone-server": server, "drone-runner": runner}
+
+    if conf.get("database") == "postgres":
+        check_sqlite(directory)
+        server_environment.update(
+            DRONE_DATABASE_DRIVER="postgres",
+            DRONE_DATABASE_DATASOURCE="postgres://drone:${DRONE_DB_PASSWORD}"
+            "@postgres:5432/drone?sslmode=disable",
+        )
+        server["depends_on"] = ["postgres"]
+        _, memory = host_capacity()
+        services["postgres"] = {
+            "image": "postgres:15",
+            "environment": {
+                "POSTGRES_USER": "drone",
+                "POSTGRES_PASSWORD": "${DRONE_DB_PASSWORD}",
+                "POSTGRES_DB": "drone",
+            },
+            # Drone's tables are small: a sixteenth of RAM is plenty.
+            "command": postgres_command(postgres_settings(memory, 0.0625, 1024, 16)),
+            "volumes": ["./postgres:/var/lib/postgresql/data"],
+            "restart": "unless-stopped",
+        }
+    return {"name": "drone", "services": services}
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Drone RPC service with build queue saturation, loaded by PluginRegistry."""
+
+import logging
+import os
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, Optional, Tuple
+
+from BaseDockerService import BaseDockerService
+from DroneCompose import runner_capacity
+from openmediavault import config, rpc
+from RpcMetrics import timed
+
+LOGGER = logging.getLogger(__name__)
+
+# Gauges of the Drone server's Prometheus endpoint.
+QUEUE_METRICS = {
+    "drone_pending_builds": "pendingBuilds",
+    "drone_running_builds": "runningBuilds",
+    "drone_pending_jobs": "pendingJobs",
+    "drone_running_jobs": "runningJobs",
+}
+QUEUE_TTL = 5.0
+METRICS_TIMEOUT = 2.0
+
+
+def parse_metrics(text: str) -> Dict[str, int]:
+    """Return the queue gauges found in Prometheus text output."""
+    values = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in QUEUE_METRICS:
+            try:
+                values[QUEUE_METRICS[name]] = int(float(value))
+            except ValueError:
+                continue
+    return values
+
+
+def read_env(path: str) -> Dict[str, str]:
+    """Return the ``KEY=value`` pairs of a compose ``.env`` file."""
+    values = {}
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                key, separator, value = line.strip().partition("=")
+                if separator and not key.startswith("#"):
+                    values[key] = value
+    except OSError as exc:
+        LOGGER.debug("Unable to read %s: %s", path, exc)
+    return values
+
+
+class ServiceDrone(BaseDockerService):
+    """RPC service to manage the Drone Docker stack."""
+
+    name = "Drone"
+    mkconf_script = "/usr/share/openmediavault/mkconf/drone"
+    compose_name = "drone"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._queue_lock = threading.Lock()
+        self._queue: Optional[Tuple[float, Dict[str, Any]]] = None
+
+    def _conf(self) -> Dict[str, Any]:
+        try:
+            return config.Database().get("conf.service.drone").get_dict()
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.debug("Unable to read conf.service.drone: %s", exc)
+            return {}
+
+    def _fetch_queue(self, conf: Dict[str, Any]) -> Dict[str, Any]:
+        capacity, replicas = runner_capacity(conf)
+        queue: Dict[str, Any] = dict.fromkeys(QUEUE_METRICS.values())
+        queue.update(
+            capacity=capacity * replicas,
+            runnerCapacity=capacity,
+            runners=replicas,
+            saturation=None,
+            error="",
+        )
+        token = read_env(os.path.join(self._compose_dir(), ".env")).get(
+            "DRONE_METRICS_TOKEN"
+        )
+        if not token:
+            queue["error"] = "No metrics token; restart the stack to create one"
+            return queue
+        request = urllib.request.Request(
+            "http://127.0.0.1:%d/metrics" % int(conf.get("serverport") or 8080),
+            headers={"Authorization": "Bearer %s" % token},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=METRICS_TIMEOUT) as response:
+                queue.update(parse_metrics(response.read().decode("utf-8", "replace")))
+        except (OSError, ValueError) as exc:
+            queue["error"] = str(exc)
+            return queue
+        if queue["runningJobs"] is not None:
+            queue["saturation"] = round(queue["runningJobs"] / queue["capacity"], 2)
+        return queue
+
+    def _queue_status(self, conf: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue gauges, fetched at most every ``QUEUE_TTL`` seconds."""
+        with self._queue_lock:
+            cached = self._queue
+            if cached is not None and time.monotonic() - cached[0] < QUEUE_TTL:
+                return cached[1]
+            queue = self._fetch_queue(conf)
+            self._queue = (time.monotonic(), queue)
+            return queue
+
+    def _status(self) -> Dict[str, Any]:
+        """Add build queue depth, running builds and runner capacity."""
+        status = super()._status()
+        if not status.get("running"):
+            return status
+        queue = self._queue_status(self._conf())
+        status["queue"] = queue
+        if queue["error"]:
+            status["queueSummary"] = queue["error"]
+        else:
+            status["queueSummary"] = (
+                "%d builds running, %d pending; %d of %d slots busy on %d runner(s)"
+                % (
+                    queue["runningBuilds"] or 0,
+                    queue["pendingBuilds"] or 0,
+                    queue["runningJobs"] or 0,
+                    queue["capacity"],
+                    queue["runners"],
+                )
+            )
+        return status
+
+    @rpc.export
+    @timed
+    def getQueue(self) -> Dict[str, Any]:
+        """Return pending and running builds and jobs, runner capacity and
+        the share of build slots in use."""
+        return self._queue_status(self._conf())
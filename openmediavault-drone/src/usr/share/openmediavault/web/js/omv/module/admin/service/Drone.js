@@ -30,6 +30,12 @@ Ext.define('OMV.module.admin.service.Drone', {
                         fieldLabel: _('Running'),
                         name: 'running',
                         value: _('Loading...')
+                    },
+                    {
+                        xtype: 'displayfield',
+                        fieldLabel: _('Build queue'),
+                        name: 'queueSummary',
+                        value: _('Loading...')
                     }
                 ]
             }
@@ -15,5 +15,10 @@ if ! omv_config_exists "/config/services/gitea"; then
         omv_config_add_key "/config/services/gitea" "httpport" "3080"
         omv_config_add_key "/config/services/gitea" "sshport" "2222"
 fi
+if ! omv_config_exists "/config/services/gitea/sharedcache"; then
+        omv_config_add_key "/config/services/gitea" "sharedcache" "0"
+        omv_config_add_key "/config/services/gitea" "codeindexer" "off"
+        omv_config_add_key "/config/services/gitea" "indexerurl" ""
+fi
 
 exit 0
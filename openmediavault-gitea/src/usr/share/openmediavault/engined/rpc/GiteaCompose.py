@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Compose model of the Gitea stack, rendered by ComposeRenderer."""
+
+from typing import Any, Dict
+
+from PostgresTuning import host_capacity, postgres_command, postgres_settings
+
+VALKEY_IMAGE = "docker.io/valkey/valkey:8-bookworm"
+CODE_INDEXERS = ("off", "bleve", "elasticsearch")
+
+
+def cache_environment() -> Dict[str, str]:
+    """Gitea settings moving cache, sessions and queues to Valkey.
+
+    Each gets its own database so sessions and queues never compete with
+    cache entries for eviction.
+    """
+    return {
+        "GITEA__cache__ADAPTER": "redis",
+        "GITEA__cache__HOST": "redis://valkey:6379/0",
+        "GITEA__session__PROVIDER": "redis",
+        "GITEA__session__PROVIDER_CONFIG": "redis://valkey:6379/1",
+        "GITEA__queue__TYPE": "redis",
+        "GITEA__queue__CONN_STR": "redis://valkey:6379/2",
+    }
+
+
+def valkey_service(memory: int) -> Dict[str, Any]:
+    """Valkey sized to the host; only expiring keys (cache and sessions) are
+    evicted and queues persist in an append-only file."""
+    maxmemory = min(max(memory // 32, 64), 512)
+    return {
+        "image": VALKEY_IMAGE,
+        "command": [
+            "valkey-server",
+            "--appendonly",
+            "yes",
+            "--maxmemory",
+            "%dmb" % maxmemory,
+            "--maxmemory-policy",
+            "volatile-lru",
+        ],
+        "volumes": ["./valkey:/data"],
+        "restart": "unless-stopped",
+    }
+
+
+def indexer_environment(conf: Dict[str, Any]) -> Dict[str, str]:
+    """Gitea settings of the configured code indexer."""
+    indexer = conf.get("codeindexer") or "off"
+    if indexer not in CODE_INDEXERS:
+        raise ValueError("Unknown code indexer: %s" % indexer)
+    if indexer == "off":
+        return {}  # Gitea's default
+    environment = {
+        "GITEA__indexer__REPO_INDEXER_ENABLED": "true",
+        "GITEA__indexer__REPO_INDEXER_TYPE": indexer,
+        "GITEA__indexer__REPO_INDEXER_EXCLUDE_VENDORED": "true",
+    }
+    if indexer == "elasticsearch":
+        url = conf.get("indexerurl") or ""
+        if not url:
+            raise ValueError("The elasticsearch code indexer needs an indexer URL")
+        environment["GITEA__indexer__REPO_INDEXER_CONN_STR"] = url
+    return environment
+
+
+def build_model(conf: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Return the compose file for ``conf.service.gitea`` as dicts.
+
+    ``${VAR}`` references are resolved by compose from the stack's ``.env``.
+    Postgres and Valkey are sized from host RAM, which PostgresTuning rounds,
+    so the output only changes with the configuration.
+    """
+    del directory  # Data lives next to the compose file.
+    http_port = conf.get("httpport") or 3080
+    ssh_port = conf.get("sshport") or 2222
+    _, memory = host_capacity()
+    environment = {
+        "USER_UID": "1000",
+        "USER_GID": "100",
+        "DB_TYPE": "postgres",
+        "DB_HOST": "postgres:5432",
+        "DB_NAME": "${GITEA_DB_NAME}",
+        "DB_USER": "${GITEA_DB_USER}",
+        "DB_PASSWD": "${GITEA_DB_PASSWORD}",
+        "GITEA__server__DOMAIN": "${GITEA_DOMAIN:-localhost}",
+        "GITEA__database__SSL_MODE": "disable",
+        "GITEA__mailer__ENABLED": "false",
+        "GITEA__server__SSH_DOMAIN": "${GITEA_DOMAIN:-localhost}",
+        "GITEA__security__INSTALL_LOCK": "true",
+    }
+    environment.update(indexer_environment(conf))
+    depends_on = ["postgres"]
+    if conf.get("sharedcache"):
+        environment.update(cache_environment())
+        depends_on.append("valkey")
+
+    services: Dict[str, Any] = {
+        "gitea": {
+            "image": "gitea/gitea:1.22",
+            "env_file": [".env"],
+            "environment": environment,
+            "volumes": ["./gitea:/data"],
+            "ports": ["%s:3000" % http_port, "%s:22" % ssh_port],
+            "depends_on": depends_on,
+            "restart": "unless-stopped",
+        },
+        "postgres": {
+            "image": "postgres:15",
+            "env_file": [".env"],
+            "environment": {
+                "POSTGRES_USER": "${GITEA_DB_USER}",
+                "POSTGRES_PASSWORD": "${GITEA_DB_PASSWORD}",
+                "POSTGRES_DB": "${GITEA_DB_NAME}",
+            },
+            # Gitea shares the host with other stacks: an eighth of RAM.
+            "command": postgres_command(postgres_settings(memory, 0.125, 2048, 16)),
+            "volumes": ["./postgres:/var/lib/postgresql/data"],
+            "restart": "unless-stopped",
+        },
+    }
+    if conf.get("sharedcache"):
+        services["valkey"] = valkey_service(memory)
+    return {"name": "gitea", "services": services}
@@ -13,6 +13,10 @@ set -e
 #       <timezone></timezone>
 #       <serverport>2283</serverport>
 #       <webport>2285</webport>
+#       <tuningprofile>balanced|low-power|throughput|off</tuningprofile>
+#       <dbsharedfolderref></dbsharedfolderref>
+#       <cachesharedfolderref></cachesharedfolderref>
+#       <librarysharedfolderref></librarysharedfolderref>
 #     </immich>
 #   </services>
 # </config>
@@ -26,5 +30,13 @@ if ! omv_config_exists "/config/services/immich"; then
         omv_config_add_key "/config/services/immich" "serverport" "2283"
         omv_config_add_key "/config/services/immich" "webport" "2285"
 fi
+if ! omv_config_exists "/config/services/immich/tuningprofile"; then
+        omv_config_add_key "/config/services/immich" "tuningprofile" "balanced"
+fi
+for key in dbsharedfolderref cachesharedfolderref librarysharedfolderref; do
+        if ! omv_config_exists "/config/services/immich/${key}"; then
+                omv_config_add_key "/config/services/immich" "${key}" ""
+        fi
+done
 
 exit 0
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Compose model of the Immich stack, rendered by ComposeRenderer."""
+
+from typing import Any, Dict
+
+from ImmichStorage import check_moves, volumes
+from ImmichTuning import DEFAULT_PROFILE, tune
+from PostgresTuning import postgres_command
+
+
+def apply_tuning(services: Dict[str, Any], tuning: Dict[str, Any]) -> None:
+    """Add the Postgres settings, ML threads and container limits of a
+    tuning profile to the ``database`` and ``immich-machine-learning``
+    services."""
+    database = tuning["database"]
+    services["database"].update(
+        {
+            "command": postgres_command(database),
+            "shm_size": "256m",
+            "cpu_shares": database["cpuShares"],
+            "mem_reservation": "%dm" % database["memoryReservation"],
+        }
+    )
+    ml = tuning["machineLearning"]
+    services["immich-machine-learning"].update(
+        {
+            "environment": {
+                "MACHINE_LEARNING_WORKERS": ml["workers"],
+                "MACHINE_LEARNING_REQUEST_THREADS": ml["threads"],
+                "MACHINE_LEARNING_MODEL_INTRA_OP_THREADS": ml["threads"],
+                "MACHINE_LEARNING_MODEL_INTER_OP_THREADS": 1,
+            },
+            "cpus": ml["cpus"],
+            "cpu_shares": ml["cpuShares"],
+            "mem_limit": "%dm" % ml["memoryLimit"],
+        }
+    )
+
+
+def build_model(conf: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Return the compose file for ``conf.service.immich`` as dicts.
+
+    ``${VAR}`` references are resolved by compose from the stack's ``.env``.
+    The ``tuningprofile`` sizes the database and ML services to the host and
+    configured shared folders hold the database, cache and originals.
+    Raises ``ValueError`` when a changed folder would leave the database or
+    the originals behind.
+    """
+    mounts = volumes(conf)
+    check_moves(directory, mounts)
+    server_port = conf.get("serverport") or 2283
+    web_port = conf.get("webport") or 2285
+    model = {
+        "name": "immich",
+        "services": {
+            "immich-server": {
+                "image": "ghcr.io/immich-app/immich-server:"
+                "${IMMICH_VERSION:-release}",
+                "env_file": [".env"],
+                "volumes": mounts["server"] + ["/etc/localtime:/etc/localtime:ro"],
+                "ports": ["%s:2283" % server_port, "%s:3001" % web_port],
+                "depends_on": ["redis", "database"],
+                "restart": "unless-stopped",
+            },
+            "immich-machine-learning": {
+                "image": "ghcr.io/immich-app/immich-machine-learning:"
+                "${IMMICH_VERSION:-release}",
+                "env_file": [".env"],
+                "volumes": ["model-cache:/cache"],
+                "restart": "unless-stopped",
+            },
+            "redis": {
+                "image": "docker.io/valkey/valkey:8-bookworm",
+                "restart": "unless-stopped",
+            },
+            "database": {
+                "image": "postgres:15",
+                "environment": {
+                    "POSTGRES_USER": "${DB_USERNAME}",
+                    "POSTGRES_PASSWORD": "${DB_PASSWORD}",
+                    "POSTGRES_DB": "${DB_DATABASE_NAME}",
+                    "TZ": "${TZ}",
+                },
+                "volumes": mounts["database"],
+                "restart": "unless-stopped",
+            },
+        },
+        "volumes": {"model-cache": {}},
+    }
+    tuning = tune(conf.get("tuningprofile") or DEFAULT_PROFILE)
+    if tuning is not None:
+        apply_tuning(model["services"], tuning)
+    return model
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Immich RPC service with tuning and storage tiers, loaded by PluginRegistry."""
+
+import logging
+from typing import Any, Dict
+
+import ImmichStorage
+from BaseDockerService import BaseDockerService
+from ImmichTuning import DEFAULT_PROFILE, PROFILES, summary, tune
+from openmediavault import config, rpc
+from RpcMetrics import timed
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ServiceImmich(BaseDockerService):
+    """RPC service to manage the Immich Docker stack."""
+
+    name = "Immich"
+    mkconf_script = "/usr/share/openmediavault/mkconf/immich"
+    compose_name = "immich"
+
+    def _conf(self) -> Dict[str, Any]:
+        try:
+            return config.Database().get("conf.service.immich").get_dict()
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.debug("Unable to read conf.service.immich: %s", exc)
+            return {}
+
+    def _status(self) -> Dict[str, Any]:
+        """Add the tuning profile values and storage tiers to the status."""
+        conf = self._conf()
+        tuning = tune(conf.get("tuningprofile") or DEFAULT_PROFILE)
+        status = dict(super()._status(), tuning=tuning, tuningSummary=summary(tuning))
+        status["storage"] = ImmichStorage.summary(conf, self._compose_dir())
+        for row in status["storage"]:
+            status["storage" + row["tier"].capitalize()] = row["description"]
+        return status
+
+    @rpc.export
+    @timed
+    def getTuningProfiles(self) -> Dict[str, Any]:
+        """Return the values every profile would use on this host."""
+        profiles = {name: tune(name) for name in PROFILES}
+        profiles["off"] = None
+        selected = self._conf().get("tuningprofile") or DEFAULT_PROFILE
+        return {"selected": selected, "profiles": profiles}
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""Placement of Immich data on separate storage tiers.
+
+The database, the thumbnail and encoded-video cache and the originals can
+each live on their own OMV shared folder, e.g. Postgres and thumbnails on
+SSD and the library on a spinning array. Unset tiers stay under the
+compose directory.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+SECTOR_SIZE = 512
+_RATES = ("readBytes", "writeBytes", "readIops", "writeIops")
+
+
+class Tier(NamedTuple):
+    """One storage tier and the config key of its shared folder."""
+
+    name: str
+    key: str
+    label: str
+    # Directories in the shared folder and where they are mounted.
+    mounts: Tuple[Tuple[str, str], ...]
+    # Mount used when the tier is unset, resolved by compose from .env.
+    default: str
+
+
+TIERS: Tuple[Tier, ...] = (
+    Tier(
+        "database",
+        "dbsharedfolderref",
+        "Database",
+        (("postgres", "/var/lib/postgresql/data"),),
+        "${DB_DATA_LOCATION}",
+    ),
+    Tier(
+        "cache",
+        "cachesharedfolderref",
+        "Thumbnails and encoded video",
+        (("thumbs", "/data/thumbs"), ("encoded-video", "/data/encoded-video")),
+        "",
+    ),
+    Tier(
+        "library",
+        "librarysharedfolderref",
+        "Originals",
+        (("library", "/data"),),
+        "${UPLOAD_LOCATION}",
+    ),
+)
+
+# Default host directories below the compose directory, see ensure_env_file.
+_DEFAULT_DIRS = {"database": "postgres", "cache": "library", "library": "library"}
+
+# Mounts whose data is lost to Immich when they point somewhere new: the
+# database and the originals. Thumbnails and encoded video are regenerated.
+_DATA_TARGETS = {"Database": "/var/lib/postgresql/data", "Originals": "/data"}
+_VARIABLE_RE = re.compile(r"\$\{(\w+)[^}]*\}")
+
+_IO_LOCK = threading.Lock()
+_IO_SAMPLES: Dict[str, Tuple[float, List[int]]] = {}
+
+
+def sharedfolder_path(uuid: str) -> str:
+    """Return the absolute path of shared folder ``uuid``.
+
+    Raises ``ValueError`` when the shared folder does not exist or its file
+    system is not mounted, so data never lands on the root file system.
+    """
+    from openmediavault import config  # pylint: disable=import-outside-toplevel
+
+    db = config.Database()
+    try:
+        folder = db.get("conf.system.sharedfolder", uuid)
+        mountpoint = db.get(
+            "conf.system.filesystem.mountpoint", folder.get("mntentref")
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        raise ValueError("Shared folder %s does not exist: %s" % (uuid, exc))
+    root = mountpoint.get("dir")
+    if not os.path.ismount(root):
+        raise ValueError(
+            "File system of shared folder '%s' is not mounted at %s"
+            % (folder.get("name"), root)
+        )
+    return os.path.join(root, folder.get("reldirpath"))
+
+
+def tier_paths(conf: Dict[str, Any]) -> Dict[str, str]:
+    """Return the shared folder path of every configured tier."""
+    paths = {}
+    for tier in TIERS:
+        uuid = conf.get(tier.key) or ""
+        if uuid:
+            paths[tier.name] = sharedfolder_path(uuid)
+    return paths
+
+
+def volumes(conf: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Return the bind mounts of the ``database`` and ``server`` services."""
+    paths = tier_paths(conf)
+    mounts: Dict[str, List[str]] = {"database": [], "server": []}
+    for tier in TIERS:
+        service = "database" if tier.name == "database" else "server"
+        if tier.name in paths:
+            mounts[service].extend(
+                "%s:%s" % (os.path.join(paths[tier.name], directory), target)
+                for directory, target in tier.mounts
+            )
+        elif tier.default:
+            mounts[service].append("%s:%s" % (tier.default, tier.mounts[0][1]))
+    # Mount /data before the tiers nested below it.
+    mounts["server"].sort(key=lambda volume: len(volume.rpartition(":")[2]))
+    return mounts
+
+
+def _read_env(directory: str) -> Dict[str, str]:
+    values = {}
+    try:
+        with open(os.path.join(directory, ".env"), encoding="utf-8") as handle:
+            for line in handle:
+                key, separator, value = line.strip().partition("=")
+                if separator and not key.startswith("#"):
+                    values[key] = value
+    except OSError:
+        pass
+    return values
+
+
+def _sources(volume_list: List[str], env: Dict[str, str]) -> Dict[str, str]:
+    """Map mount targets to host paths, with ``${VAR}`` taken from ``env``."""
+    sources = {}
+    for volume in volume_list:
+        volume = _VARIABLE_RE.sub(lambda match: env.get(match.group(1), ""), volume)
+        source, _, target = volume.partition(":")
+        target = target.partition(":")[0]
+        if source.startswith("/"):
+            sources[target] = os.path.normpath(source)
+    return sources
+
+
+def _deployed_volumes(directory: str) -> List[str]:
+    """Bind mounts of the compose file currently in ``directory``."""
+    volume_list = []
+    try:
+        with open(os.path.join(directory, "docker-compose.yml"), encoding="utf-8") as f:
+            for line in f:
+                item = line.strip()
+                if not item.startswith("- "):
+                    continue
+                item = item[2:].strip()
+                if item.startswith('"'):
+                    item = json.loads(item)
+                if item.count(":") in (1, 2):
+                    volume_list.append(item)
+    except (OSError, ValueError) as exc:
+        LOGGER.debug("Unable to read the compose file in %s: %s", directory, exc)
+    return volume_list
+
+
+def _has_data(path: str) -> bool:
+    try:
+        with os.scandir(path) as entries:
+            return any(True for _ in entries)
+    except OSError:
+        return False
+
+
+def check_moves(directory: str, mounts: Dict[str, List[str]]) -> None:
+    """Refuse to re-point the database or the originals to an empty folder.
+
+    Compares ``mounts`` with the compose file in ``directory``. Changing a
+    shared folder only changes the bind mount, so Postgres would initialise
+    a fresh database and the library would appear empty. Raises
+    ``ValueError`` naming both paths until the data has been moved.
+    """
+    env = _read_env(directory)
+    deployed = _sources(_deployed_volumes(directory), env)
+    wanted = _sources(mounts["database"] + mounts["server"], env)
+    for label, target in _DATA_TARGETS.items():
+        old, new = deployed.get(target), wanted.get(target)
+        if not old or not new or old == new:
+            continue
+        if _has_data(old) and not _has_data(new):
+            raise ValueError(
+                "%s data is in %s but the new location %s is empty. Stop "
+                "Immich and move the data first, e.g. 'rsync -a %s/ %s/', or "
+                "select the previous shared folder again." % (label, old, new, old, new)
+            )
+
+
+def _device(path: str) -> Optional[str]:
+    """Return the block device name backing ``path``, if any."""
+    st_dev = os.stat(path).st_dev
+    if not os.major(st_dev):
+        return None  # e.g. btrfs subvolumes, tmpfs, overlay
+    link = "/sys/dev/block/%d:%d" % (os.major(st_dev), os.minor(st_dev))
+    return os.path.basename(os.path.realpath(link)) if os.path.exists(link) else None
+
+
+def _rotational(device: str) -> Optional[bool]:
+    """Whether ``device`` (or the disk holding the partition) spins."""
+    sysfs = os.path.realpath("/sys/class/block/%s" % device)
+    for base in (sysfs, os.path.dirname(sysfs)):
+        try:
+            with open(os.path.join(base, "queue", "rotational"), encoding="ascii") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+def _diskstats(device: str) -> Optional[List[int]]:
+    """Reads, sectors read, writes and sectors written of ``device``."""
+    try:
+        with open("/proc/diskstats", encoding="ascii") as handle:
+            for line in handle:
+                fields = line.split()
+                if len(fields) > 9 and fields[2] == device:
+                    return [int(fields[index]) for index in (3, 5, 7, 9)]
+    except (OSError, ValueError) as exc:
+        LOGGER.debug("Unable to read /proc/diskstats: %s", exc)
+    return None
+
+
+def _io_rates(device: str) -> Dict[str, Optional[float]]:
+    """Return I/O rates of ``device`` since the previous call for it."""
+    counters = _diskstats(device)
+    rates: Dict[str, Optional[float]] = dict.fromkeys(_RATES)
+    if counters is None:
+        return rates
+    now = time.monotonic()
+    with _IO_LOCK:
+        previous = _IO_SAMPLES.get(device)
+        _IO_SAMPLES[device] = (now, counters)
+    if previous is None or now <= previous[0]:
+        return rates
+    elapsed = now - previous[0]
+    reads, read_sectors, writes, write_sectors = (
+        current - old for current, old in zip(counters, previous[1])
+    )
+    rates.update(
+        readBytes=round(read_sectors * SECTOR_SIZE / elapsed, 1),
+        writeBytes=round(write_sectors * SECTOR_SIZE / elapsed, 1),
+        readIops=round(reads / elapsed, 1),
+        writeIops=round(writes / elapsed, 1),
+    )
+    return rates
+
+
+def _size(value: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if value < 1024 or unit == "TiB":
+            return "%.1f %s" % (value, unit)
+        value /= 1024
+    return ""
+
+
+def _describe(row: Dict[str, Any]) -> str:
+    if row["error"]:
+        return "%s: %s" % (row["path"] or row["sharedFolder"], row["error"])
+    parts = [
+        "%s, %s free of %s" % (row["path"], _size(row["available"]), _size(row["size"]))
+    ]
+    if row["device"]:
+        kind = {True: "HDD", False: "SSD", None: "unknown"}[row["rotational"]]
+        parts.append("%s (%s)" % (row["device"], kind))
+    if row["readBytes"] is not None:
+        parts.append(
+            "%s/s read, %s/s write"
+            % (_size(row["readBytes"]), _size(row["writeBytes"]))
+        )
+    return "; ".join(parts)
+
+
+def summary(conf: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    """Return capacity, device and I/O rates of every tier.
+
+    Rates cover the time since the previous summary and are None on the
+    first one. ``description`` is a one-line text for the status panel.
+    """
+    rows = []
+    # Tiers sharing a device share one sample.
+    rates: Dict[str, Dict[str, Optional[float]]] = {}
+    for tier in TIERS:
+        uuid = conf.get(tier.key) or ""
+        row: Dict[str, Any] = {
+            "tier": tier.name,
+            "label": tier.label,
+            "sharedFolder": uuid,
+            "path": "",
+            "error": "",
+            "device": None,
+            "rotational": None,
+            "size": 0,
+            "available": 0,
+        }
+        row.update(dict.fromkeys(_RATES))
+        try:
+            if uuid:
+                row["path"] = os.path.join(sharedfolder_path(uuid), tier.mounts[0][0])
+            else:
+                row["path"] = os.path.join(directory, _DEFAULT_DIRS[tier.name])
+            existing = row["path"]
+            while not os.path.exists(existing):
+                existing = os.path.dirname(existing)
+            stats = os.statvfs(existing)
+            row["size"] = stats.f_blocks * stats.f_frsize
+            row["available"] = stats.f_bavail * stats.f_frsize
+            row["device"] = _device(existing)
+            if row["device"]:
+                row["rotational"] = _rotational(row["device"])
+                if row["device"] not in rates:
+                    rates[row["device"]] = _io_rates(row["device"])
+                row.update(rates[row["device"]])
+        except (OSError, ValueError) as exc:
+            row["error"] = str(exc)
+        row["description"] = _describe(row)
+        rows.append(row)
+    return rows
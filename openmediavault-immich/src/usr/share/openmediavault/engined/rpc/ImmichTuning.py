@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Immich database and machine-learning tuning derived from host capacity.
+
+A profile turns the host's usable cores and memory into Postgres memory
+settings, machine-learning worker and thread counts and container CPU and
+memory limits, so ML jobs cannot starve the database on small NAS boxes.
+"""
+
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+
+from PostgresTuning import host_capacity, postgres_settings
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = "balanced"
+
+
+class Profile(NamedTuple):
+    """Shares of the host a profile hands to the database and ML service."""
+
+    description: str
+    db_memory_share: float  # shared_buffers as a share of RAM
+    shared_buffers_max: int  # MiB
+    work_mem_max: int  # MiB
+    ml_cpu_share: float  # CPU limit of the ML container as a share of cores
+    ml_cores_per_worker: int  # 0 keeps a single ML worker
+    ml_memory_share: float  # memory limit of the ML container
+    db_cpu_shares: int  # relative CPU weight under contention
+    ml_cpu_shares: int
+
+
+PROFILES: Dict[str, Profile] = {
+    "low-power": Profile(
+        "Small Postgres caches, one single-threaded ML worker on a quarter of"
+        " the cores",
+        0.125,
+        1024,
+        8,
+        0.25,
+        0,
+        0.2,
+        1024,
+        256,
+    ),
+    "balanced": Profile(
+        "A quarter of RAM for Postgres, one ML worker on half of the cores",
+        0.25,
+        4096,
+        32,
+        0.5,
+        0,
+        0.3,
+        2048,
+        512,
+    ),
+    "throughput": Profile(
+        "Large Postgres caches, one ML worker per four cores on three quarters"
+        " of the cores",
+        0.25,
+        8192,
+        64,
+        0.75,
+        4,
+        0.4,
+        2048,
+        1024,
+    ),
+}
+
+
+def tune(
+    name: str, cores: Optional[int] = None, memory: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Return the settings of profile ``name`` for this (or the given) host.
+
+    ``memory`` is in MiB, as are all sizes returned. ``off`` returns None,
+    leaving the images' defaults; unknown names use the default profile.
+    """
+    if name == "off":
+        return None
+    profile = PROFILES.get(name)
+    if profile is None:
+        LOGGER.warning(
+            "Unknown Immich tuning profile %r, using %s", name, DEFAULT_PROFILE
+        )
+        name, profile = DEFAULT_PROFILE, PROFILES[DEFAULT_PROFILE]
+    if cores is None or memory is None:
+        cores, memory = host_capacity()
+
+    database: Dict[str, Any] = postgres_settings(
+        memory,
+        profile.db_memory_share,
+        profile.shared_buffers_max,
+        profile.work_mem_max,
+    )
+    database.update(
+        memoryReservation=min(database["sharedBuffers"] * 2, memory // 2),
+        cpuShares=profile.db_cpu_shares,
+    )
+    ml_cpus = max(1.0, round(cores * profile.ml_cpu_share, 1))
+    ml_workers = 1
+    if profile.ml_cores_per_worker:
+        ml_workers = max(1, int(ml_cpus) // profile.ml_cores_per_worker)
+    ml_threads = max(1, int(ml_cpus) // ml_workers)
+    return {
+        "profile": name,
+        "description": profile.description,
+        "host": {"cores": cores, "memory": memory},
+        "database": database,
+        "machineLearning": {
+            "workers": ml_workers,
+            "threads": ml_threads,
+            "cpus": ml_cpus,
+            "memoryLimit": max(1024, int(memory * profile.ml_memory_share)),
+            "cpuShares": profile.ml_cpu_shares,
+        },
+    }
+
+
+def summary(tuning: Optional[Dict[str, Any]]) -> str:
+    """One line describing ``tuning`` for the status panel."""
+    if tuning is None:
+        return "off (image defaults)"
+    database = tuning["database"]
+    ml = tuning["machineLearning"]
+    return (
+        "%s: Postgres shared_buffers %d MiB, work_mem %d MiB; ML %d worker(s) x"
+        " %d thread(s) on %s CPUs, %d MiB"
+        % (
+            tuning["profile"],
+            database["sharedBuffers"],
+            database["workMem"],
+            ml["workers"],
+            ml["threads"],
+            ml["cpus"],
+            ml["memoryLimit"],
+        )
+    )
@@ -30,6 +30,36 @@ Ext.define('OMV.module.admin.service.Immich', {
                         fieldLabel: _('Running'),
                         name: 'running',
                         value: _('Loading...')
+                    },
+                    {
+                        xtype: 'displayfield',
+                        fieldLabel: _('Tuning'),
+                        name: 'tuningSummary',
+                        value: _('Loading...')
+                    }
+                ]
+            },
+            {
+                xtype: 'fieldset',
+                title: _('Storage'),
+                items: [
+                    {
+                        xtype: 'displayfield',
+                        fieldLabel: _('Database'),
+                        name: 'storageDatabase',
+                        value: _('Loading...')
+                    },
+                    {
+                        xtype: 'displayfield',
+                        fieldLabel: _('Thumbnails and video'),
+                        name: 'storageCache',
+                        value: _('Loading...')
+                    },
+                    {
+                        xtype: 'displayfield',
+                        fieldLabel: _('Originals'),
+                        name: 'storageLibrary',
+                        value: _('Loading...')
                     }
                 ]
             }
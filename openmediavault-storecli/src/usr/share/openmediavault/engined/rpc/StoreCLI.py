@@ -5,17 +5,42 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 import re
 import shlex
 import shutil
 import subprocess
-from typing import Any, Dict, List, Optional
-
-from openmediavault import rpc
-from openmediavault.procenv import ProcessEnvironment
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Make sibling helper modules importable when loaded by engined
+rpc_path = os.path.dirname(os.path.abspath(__file__))
+if rpc_path not in sys.path:
+    sys.path.insert(0, rpc_path)
+
+from openmediavault import rpc  # noqa: E402
+
+# Shared with the Docker plugins, from openmediavault-docker-common.
+from ProcessRunner import process_env  # noqa: E402
+from RpcMetrics import RPC_METRICS, timed  # noqa: E402
+from StoreCLICache import INVENTORY_CACHE, classify  # noqa: E402
+from StoreCLIEvents import EVENT_STORE, format_events  # noqa: E402
+from StoreCLIHealth import HEALTH_COLLECTOR  # noqa: E402
+from StoreCLIModels import parse_json_output  # noqa: E402
 
 LOGGER = logging.getLogger(__name__)
 
+LOG_EVENT_COUNT = 200
+BATCH_MAX_COMMANDS = 32
+BATCH_WORKERS = 4
+
+MISSING_BINARY_ERROR = (
+    "No storecli/storcli binary found. Install Broadcom's StoreCLI package "
+    "and ensure it is available in the system PATH."
+)
+
 
 class ServiceStoreCLI(rpc.Service):
     """RPC layer exposing read-only StoreCLI operations to the OMV UI."""
@@ -27,26 +52,68 @@ class ServiceStoreCLI(rpc.Service):
         "storcli",
         "storcli64",
     ]
+    # Resolved once per engined process; re-checked with a single access().
+    _binary_path: Optional[str] = None
 
     def _get_env(self) -> Dict[str, str]:
-        return ProcessEnvironment().get_env()
+        return process_env()
 
     def _detect_binary(self) -> Optional[str]:
+        cached = ServiceStoreCLI._binary_path
+        if cached and os.access(cached, os.X_OK):
+            return cached
+        ServiceStoreCLI._binary_path = None
         for candidate in self.binary_candidates:
             path = shutil.which(candidate)
             if path:
+                ServiceStoreCLI._binary_path = path
                 return path
         return None
 
-    def _run_command(self, command: List[str]) -> subprocess.CompletedProcess:
+    def _run_command(
+        self, command: List[str], keep_tail: bool = False
+    ) -> subprocess.CompletedProcess:
+        """Run ``command`` with the shared deadline and output cap.
+
+        ``keep_tail`` keeps the end of oversized output (newest events)
+        instead of its start.
+        """
         LOGGER.debug("Executing command: %s", json.dumps(command))
-        return subprocess.run(
-            command,
-            check=False,
-            capture_output=True,
-            text=True,
-            env=self._get_env(),
+        return RPC_METRICS.run(command, env=self._get_env(), keep_tail=keep_tail)
+
+    def _run_storecli(self, arguments: List[str]) -> Optional[str]:
+        """Run StoreCLI with ``arguments``; None when no binary is present."""
+        binary = self._detect_binary()
+        if not binary:
+            return None
+        return self._run_command([binary] + arguments).stdout
+
+    def _cached_run(
+        self, command: List[str], target: str = ""
+    ) -> Tuple[subprocess.CompletedProcess, Dict[str, Any]]:
+        """Run ``command`` through the inventory cache.
+
+        Returns the (possibly stale) result and the cache metadata.
+        """
+        arguments = command[2:] if target else command[1:]
+
+        def _fetch() -> Dict[str, Any]:
+            result = self._run_command(command)
+            return {
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+                "returncode": result.returncode,
+                "truncated": getattr(result, "truncated", {}),
+            }
+
+        cached, meta = INVENTORY_CACHE.get(
+            target, arguments, classify(arguments), _fetch
         )
+        result = subprocess.CompletedProcess(
+            command, cached["returncode"], cached["stdout"], cached["stderr"]
+        )
+        result.truncated = cached.get("truncated", {})  # type: ignore[attr-defined]
+        return result, meta
 
     @staticmethod
     def _safe_controller(controller: str) -> str:
@@ -89,20 +156,70 @@ class ServiceStoreCLI(rpc.Service):
             "stdout": result.stdout,
             "stderr": result.stderr,
             "returncode": result.returncode,
+            "truncated": getattr(result, "truncated", {}),
+        }
+
+    def _structured_result(
+        self, command: List[str], result: subprocess.CompletedProcess
+    ) -> Dict[str, Any]:
+        inventory = parse_json_output(result.stdout)
+        response = {
+            "command": " ".join(shlex.quote(part) for part in command),
+            "stderr": result.stderr,
+            "returncode": result.returncode,
+            "truncated": getattr(result, "truncated", {}),
         }
+        response.update(inventory.to_dict())
+        return response
+
+    def _get_structured_status(self, binary: Optional[str]) -> Dict[str, Any]:
+        if not binary:
+            return {
+                "installed": False,
+                "binary": None,
+                "version": "",
+                "error": MISSING_BINARY_ERROR,
+            }
+
+        version_result, _ = self._cached_run([binary, "-v"])
+        version_info = version_result.stdout.strip() or version_result.stderr.strip()
+        command = [binary, "/call", "show", "J"]
+        result, meta = self._cached_run(command, "/call")
+        response = self._structured_result(command, result)
+        response.update(
+            {
+                "installed": True,
+                "binary": binary,
+                "version": version_info,
+                "error": "\n".join(response["errors"]),
+                "cache": meta,
+            }
+        )
+        return response
 
     @rpc.export
-    def getStatus(self) -> Dict[str, Any]:
-        """Return StoreCLI availability and a summary of controller status."""
+    @timed
+    def getStatus(self, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Return StoreCLI availability and a summary of controller status.
+
+        With ``structured`` set, controllers, virtual drives, physical drives
+        and backup units are returned as compact records parsed from
+        ``/call show J`` instead of raw text. Output is served from the
+        inventory cache; ``cache`` reports whether it is stale and its age.
+        """
 
         binary = self._detect_binary()
+        if (params or {}).get("structured"):
+            return self._get_structured_status(binary)
+
         installed = binary is not None
         version_info = ""
         summary_output = ""
         error: Optional[str] = None
+        cache: Dict[str, Any] = {}
 
         if installed and binary:
-            version_result = self._run_command([binary, "-v"])
+            version_result, _ = self._cached_run([binary, "-v"])
             if version_result.returncode == 0:
                 version_info = (
                     version_result.stdout.strip() or version_result.stderr.strip()
@@ -110,17 +227,14 @@ class ServiceStoreCLI(rpc.Service):
             else:
                 error = version_result.stderr.strip() or version_result.stdout.strip()
 
-            summary_result = self._run_command([binary, "show", "summary"])
+            summary_result, cache = self._cached_run([binary, "show", "summary"])
             if summary_result.returncode == 0:
                 summary_output = summary_result.stdout.strip()
             else:
                 extra = summary_result.stderr.strip() or summary_result.stdout.strip()
                 error = "\n".join(filter(None, [error, extra])) if error else extra
         else:
-            error = (
-                "No storecli/storcli binary found. Install Broadcom's StoreCLI package "
-                "and ensure it is available in the system PATH."
-            )
+            error = MISSING_BINARY_ERROR
 
         controller_hints = "\n".join(
             line.strip()
@@ -135,11 +249,39 @@ class ServiceStoreCLI(rpc.Service):
             "summary": summary_output,
             "controllerHints": controller_hints,
             "error": error or "",
+            "cache": cache,
         }
 
+    def _execute_show(
+        self,
+        binary: str,
+        target: str,
+        cleaned: List[str],
+        structured: Any,
+        cached: bool = False,
+    ) -> Dict[str, Any]:
+        if structured and cleaned[-1].upper() != "J":
+            cleaned = cleaned + ["J"]
+        command = [binary, target] + cleaned
+
+        meta: Optional[Dict[str, Any]] = None
+        if cached:
+            result, meta = self._cached_run(command, target)
+        else:
+            result = self._run_command(command)
+
+        if structured:
+            response = self._structured_result(command, result)
+        else:
+            response = self._serialize_result(command, result)
+        if meta is not None:
+            response["cache"] = meta
+        return response
+
     @rpc.export
+    @timed
     def getControllerDetails(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Run a safe controller detail command."""
+        """Run a safe controller detail command, served from the cache."""
 
         binary = self._detect_binary()
         if not binary:
@@ -150,11 +292,12 @@ class ServiceStoreCLI(rpc.Service):
         arguments = params.get("arguments", ["show", "all"])
         cleaned = self._sanitize_show_args(arguments)
 
-        command = [binary, target] + cleaned
-        result = self._run_command(command)
-        return self._serialize_result(command, result)
+        return self._execute_show(
+            binary, target, cleaned, params.get("structured"), cached=True
+        )
 
     @rpc.export
+    @timed
     def runShowCommand(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a validated StoreCLI read-only command."""
 
@@ -166,20 +309,197 @@ class ServiceStoreCLI(rpc.Service):
         target = self._safe_controller(str(controller))
         cleaned = self._sanitize_show_args(params.get("arguments", []))
 
-        command = [binary, target] + cleaned
-        result = self._run_command(command)
-        return self._serialize_result(command, result)
+        return self._execute_show(binary, target, cleaned, params.get("structured"))
+
+    @rpc.export
+    @timed
+    def runShowBatch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute several validated read-only commands in one round trip.
+
+        ``commands`` is a list of ``{controller, arguments, structured}``
+        objects. Identical commands run once; results are returned in request
+        order with the time each command took. Invalid or failing commands
+        report an error without affecting the rest of the batch.
+        """
+
+        binary = self._detect_binary()
+        if not binary:
+            raise rpc.Error("storecli binary is not available on this system")
+
+        commands = params.get("commands")
+        if not isinstance(commands, list) or not commands:
+            raise rpc.Error("commands must be a non-empty list")
+        if len(commands) > BATCH_MAX_COMMANDS:
+            raise rpc.Error("At most %d commands may be batched" % BATCH_MAX_COMMANDS)
+
+        keys: List[Optional[Tuple[str, Tuple[str, ...], bool]]] = []
+        errors: Dict[int, str] = {}
+        for index, command in enumerate(commands):
+            try:
+                if not isinstance(command, dict):
+                    raise ValueError("Each command must be an object")
+                target = self._safe_controller(str(command.get("controller", "all")))
+                cleaned = self._sanitize_show_args(command.get("arguments", []))
+            except ValueError as exc:
+                keys.append(None)
+                errors[index] = str(exc)
+                continue
+            keys.append((target, tuple(cleaned), bool(command.get("structured"))))
+
+        def _run(
+            key: Tuple[str, Tuple[str, ...], bool],
+        ) -> Tuple[Dict[str, Any], float]:
+            started = time.monotonic()
+            try:
+                result = self._execute_show(binary, key[0], list(key[1]), key[2])
+            except Exception as exc:  # pylint: disable=broad-except
+                # One failing command must not discard the whole batch.
+                result = {"error": str(exc)}
+            return result, round(time.monotonic() - started, 3)
+
+        unique = list(dict.fromkeys(key for key in keys if key is not None))
+        started = time.monotonic()
+        outcomes: Dict[Tuple[str, Tuple[str, ...], bool], Tuple[Any, float]] = {}
+        if unique:
+            workers = min(BATCH_WORKERS, len(unique))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = dict(zip(unique, pool.map(_run, unique)))
+
+        results: List[Dict[str, Any]] = []
+        for index, key in enumerate(keys):
+            if key is None:
+                results.append({"index": index, "error": errors[index]})
+                continue
+            result, elapsed = outcomes[key]
+            entry = dict(result)
+            entry.update({"index": index, "elapsed": elapsed})
+            results.append(entry)
+
+        return {
+            "results": results,
+            "executed": len(unique),
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+
+    @rpc.export
+    @timed
+    def invalidateCache(
+        self, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Drop cached StoreCLI output so the next read runs the command.
+
+        ``controller`` limits invalidation to one controller and
+        ``commandClass`` to ``version``, ``topology`` or ``health``.
+        """
+
+        params = params or {}
+        controller = params.get("controller")
+        target = self._safe_controller(str(controller)) if controller else None
+        if target == "/call":
+            target = None
+        count = INVENTORY_CACHE.invalidate(target, params.get("commandClass") or None)
+        return {"invalidated": count}
+
+    def _controller_ids(self, binary: str) -> List[int]:
+        result, _ = self._cached_run([binary, "show", "ctrlcount"])
+        match = re.search(r"Controller Count\s*=\s*(\d+)", result.stdout)
+        return list(range(int(match.group(1)))) if match else [0]
+
+    def _ingest_events(self, binary: str, force: bool = False) -> Dict[int, int]:
+        def _run(arguments: List[str]) -> str:
+            return self._run_command([binary] + arguments, keep_tail=True).stdout
+
+        return EVENT_STORE.ingest(self._controller_ids(binary), _run, force=force)
 
     @rpc.export
+    @timed
+    def getEvents(self, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Return a page of controller events from the local event store.
+
+        New events are ingested first (at most every 30 seconds, or on
+        ``refresh``) by fetching only those above each controller's stored
+        sequence number. ``controller``, ``minClass``, ``search`` and
+        ``sinceSeq`` filter the result; ``start``/``limit`` page it.
+        """
+
+        params = params or {}
+        binary = self._detect_binary()
+        if binary:
+            self._ingest_events(binary, force=bool(params.get("refresh")))
+
+        controller = params.get("controller")
+        if controller not in (None, "", "all"):
+            target = self._safe_controller(str(controller))
+            controller = int(target[2:])
+        else:
+            controller = None
+        min_class = params.get("minClass")
+        since_seq = params.get("sinceSeq")
+
+        response = EVENT_STORE.query(
+            controller=controller,
+            min_class=None if min_class in (None, "") else int(min_class),
+            search=str(params.get("search") or ""),
+            since_seq=None if since_seq in (None, "") else int(since_seq),
+            start=int(params.get("start", 0)),
+            limit=int(params.get("limit", 100)),
+        )
+        response["error"] = "" if binary else MISSING_BINARY_ERROR
+        return response
+
+    @rpc.export
+    @timed
+    def getHealthHistory(
+        self, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Return sampled health series from the background collector.
+
+        ``metric`` selects one series name and ``points`` keeps only the most
+        recent samples of each series.
+        """
+
+        params = params or {}
+        return HEALTH_COLLECTOR.history(params.get("metric"), params.get("points"))
+
+    @rpc.export
+    @timed
+    def getHealthMetrics(self) -> Dict[str, Any]:
+        """Return the latest health sample in Prometheus text format."""
+
+        return {"text": HEALTH_COLLECTOR.prometheus_text()}
+
+    @rpc.export
+    def getMetrics(self, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Return latency histograms of StoreCLI RPCs and StoreCLI runs.
+
+        ``allServices`` includes the series of every plugin service.
+        """
+
+        metrics = RPC_METRICS.snapshot()
+        if not (params or {}).get("allServices"):
+            for key in ("histograms", "counters"):
+                metrics[key] = [
+                    row
+                    for row in metrics[key]
+                    if row["labels"].get("service") == "StoreCLI"
+                ]
+        metrics["error"] = ""
+        return metrics
+
+    @rpc.export
+    @timed
     def getLogs(self) -> Dict[str, Any]:
-        """Return recent controller event log output."""
+        """Return the most recent controller events as text."""
 
         try:
-            response = self.getControllerDetails(
-                {"controller": "all", "arguments": ["show", "events"]}
-            )
+            response = self.getEvents({"limit": LOG_EVENT_COUNT})
         except Exception as exc:  # pragma: no cover - defensive fallback
             LOGGER.error("Failed to collect StoreCLI logs: %s", exc)
             return {"logs": "", "error": str(exc)}
 
-        return {"logs": response.get("stdout", ""), "error": response.get("stderr")}
+        return {"logs": format_events(response["data"]), "error": response["error"]}
+
+
+# Sample from engined start rather than from the first StoreCLI RPC, so the
+# history and the Prometheus file cover the time nobody had the page open.
+HEALTH_COLLECTOR.start(ServiceStoreCLI()._run_storecli)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Persistent, stale-while-revalidate cache of StoreCLI command output."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Set, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_FILE = "/var/cache/openmediavault/storecli-inventory.json"
+
+CLASS_VERSION = "version"
+CLASS_TOPOLOGY = "topology"
+CLASS_HEALTH = "health"
+
+# Seconds before an entry is refreshed; None means it never expires.
+DEFAULT_TTLS: Dict[str, Optional[float]] = {
+    CLASS_VERSION: None,
+    CLASS_TOPOLOGY: 300.0,
+    CLASS_HEALTH: 30.0,
+}
+
+_HEALTH_WORDS = {
+    "all",
+    "bbu",
+    "bgi",
+    "cc",
+    "cv",
+    "events",
+    "patrolread",
+    "pr",
+    "rebuild",
+    "summary",
+    "temperature",
+}
+
+
+def classify(arguments: Sequence[str]) -> str:
+    """Map a StoreCLI argument list to its cache class."""
+    lowered = [argument.lower() for argument in arguments]
+    if lowered == ["-v"]:
+        return CLASS_VERSION
+    if _HEALTH_WORDS.intersection(lowered):
+        return CLASS_HEALTH
+    return CLASS_TOPOLOGY
+
+
+class InventoryCache:
+    """Cache of command results keyed by controller target and arguments.
+
+    Expired entries are returned immediately while a single background
+    refresh per key replaces them, so page loads never wait on a busy
+    controller once an entry exists. Entries are persisted to disk so a
+    restarted engined can serve them straight away.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_FILE,
+        ttls: Optional[Dict[str, Optional[float]]] = None,
+    ) -> None:
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._refreshing: Set[str] = set()
+
+    @staticmethod
+    def _key(target: str, arguments: Sequence[str]) -> str:
+        return " ".join(part for part in [target] + list(arguments) if part)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as handle:
+                    self._entries = json.load(handle)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".storecli-")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(self._entries, handle)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            LOGGER.warning("Unable to persist StoreCLI cache: %s", exc)
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        ttl = self.ttls.get(entry["class"])
+        return ttl is not None and time.time() - entry["fetched"] >= ttl
+
+    def _store(
+        self, key: str, target: str, command_class: str, result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        entry = {
+            "target": target,
+            "class": command_class,
+            "fetched": time.time(),
+            "result": result,
+        }
+        with self._lock:
+            self._load()[key] = entry
+            self._refreshing.discard(key)
+            self._save()
+        return entry
+
+    def _refresh_in_background(
+        self,
+        key: str,
+        target: str,
+        command_class: str,
+        fetch: Callable[[], Dict[str, Any]],
+    ) -> None:
+        def _run() -> None:
+            try:
+                self._store(key, target, command_class, fetch())
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("StoreCLI cache refresh of %s failed: %s", key, exc)
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_run, name="storecli-refresh", daemon=True).start()
+
+    def get(
+        self,
+        target: str,
+        arguments: Sequence[str],
+        command_class: str,
+        fetch: Callable[[], Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Return ``(result, cache metadata)`` for a command.
+
+        ``fetch`` runs synchronously only when no entry exists yet.
+        """
+        key = self._key(target, arguments)
+        with self._lock:
+            entry = self._load().get(key)
+            stale = entry is not None and self._expired(entry)
+            if stale and key not in self._refreshing:
+                self._refreshing.add(key)
+                self._refresh_in_background(key, target, command_class, fetch)
+
+        if entry is None:
+            entry = self._store(key, target, command_class, fetch())
+
+        return entry["result"], {
+            "class": command_class,
+            "stale": stale,
+            "age": round(time.time() - entry["fetched"], 3),
+        }
+
+    def invalidate(
+        self, controller: Optional[str] = None, command_class: Optional[str] = None
+    ) -> int:
+        """Drop matching entries so their next read fetches fresh output.
+
+        ``controller`` is a target such as ``/c0``; entries for ``/call`` and
+        controller-less commands match every controller.
+        """
+        with self._lock:
+            entries = self._load()
+            keys = [
+                key
+                for key, entry in entries.items()
+                if (not controller or entry["target"] in (controller, "/call", ""))
+                and (not command_class or entry["class"] == command_class)
+            ]
+            for key in keys:
+                del entries[key]
+            if keys:
+                self._save()
+        return len(keys)
+
+
+INVENTORY_CACHE = InventoryCache()
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Incremental ingestion of StoreCLI controller events into SQLite."""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+LOGGER = logging.getLogger(__name__)
+
+EVENT_DB = "/var/lib/openmediavault/storecli-events.sqlite"
+
+# Minimum seconds between two ingestion passes triggered by queries.
+INGEST_INTERVAL = 30.0
+# ``type=latest=N`` window used for incremental fetches; doubled until it
+# overlaps the watermark or reaches the cap.
+FETCH_WINDOW = 64
+FETCH_WINDOW_MAX = 4096
+
+# StoreCLI event classes, see "show events" in the StoreCLI reference.
+SEVERITIES = {
+    -2: "debug",
+    -1: "progress",
+    0: "info",
+    1: "warning",
+    2: "critical",
+    3: "fatal",
+    4: "dead",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    controller INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    class INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    data TEXT NOT NULL,
+    ingested REAL NOT NULL,
+    PRIMARY KEY (controller, seq)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    controller INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+_SEQ_RE = re.compile(r"^\s*seqNum\s*:\s*(0x[0-9a-fA-F]+|\d+)", re.MULTILINE)
+_FIELD_RE = re.compile(r"^\s*([A-Za-z ]+?)\s*:\s*(.*)$")
+
+Runner = Callable[[List[str]], str]
+
+
+def _number(value: str, default: int = 0) -> int:
+    try:
+        return int(value.strip(), 0)
+    except (AttributeError, ValueError):
+        return default
+
+
+def parse_events(controller: int, output: str) -> List[Dict[str, Any]]:
+    """Parse ``show events`` text output into event dictionaries."""
+    events: List[Dict[str, Any]] = []
+    starts = [match.start() for match in _SEQ_RE.finditer(output)]
+    for index, start in enumerate(starts):
+        end = starts[index + 1] if index + 1 < len(starts) else len(output)
+        fields: Dict[str, str] = {}
+        data: List[str] = []
+        in_data = False
+        for line in output[start:end].splitlines():
+            if in_data:
+                if line.strip() and not line.strip().startswith("==="):
+                    data.append(line.strip())
+                continue
+            match = _FIELD_RE.match(line)
+            if not match:
+                continue
+            key, value = match.group(1).lower(), match.group(2).strip()
+            if key == "event data":
+                in_data = True
+            fields.setdefault(key, value)
+
+        events.append(
+            {
+                "controller": controller,
+                "seq": _number(fields.get("seqnum", "")),
+                "time": fields.get("time") or fields.get("seconds since power on", ""),
+                "code": _number(fields.get("code", "")),
+                "class": _number(fields.get("class", "")),
+                "description": fields.get("event description", ""),
+                "data": "\n".join(line for line in data if line != "None"),
+            }
+        )
+    return events
+
+
+class EventStore:
+    """Append-only event store with a sequence watermark per controller."""
+
+    def __init__(
+        self, path: str = EVENT_DB, ingest_interval: float = INGEST_INTERVAL
+    ) -> None:
+        self.path = path
+        self.ingest_interval = ingest_interval
+        self._ingest_lock = threading.Lock()
+        self._last_ingest = 0.0
+        self._initialised = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Yield a connection inside a transaction and close it afterwards."""
+        if not self._initialised:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        try:
+            connection.row_factory = sqlite3.Row
+            if not self._initialised:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(_SCHEMA)
+                self._initialised = True
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def watermark(self, controller: int) -> Optional[int]:
+        """Return the highest ingested sequence number of ``controller``."""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT seq FROM watermarks WHERE controller = ?", (controller,)
+            ).fetchone()
+        return row["seq"] if row else None
+
+    def append(self, controller: int, events: Sequence[Dict[str, Any]]) -> int:
+        """Store events newer than the watermark and advance it."""
+        mark = self.watermark(controller)
+        fresh = [event for event in events if mark is None or event["seq"] > mark]
+        if not fresh:
+            return 0
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO events (controller, seq, time, code, class,"
+                " description, data, ingested) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        controller,
+                        event["seq"],
+                        event["time"],
+                        event["code"],
+                        event["class"],
+                        event["description"],
+                        event["data"],
+                        now,
+                    )
+                    for event in fresh
+                ],
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO watermarks (controller, seq, updated)"
+                " VALUES (?, ?, ?)",
+                (controller, max(event["seq"] for event in fresh), now),
+            )
+        return len(fresh)
+
+    def _fetch_newer(self, controller: int, run: Runner) -> List[Dict[str, Any]]:
+        target = "/c%d" % controller
+        mark = self.watermark(controller)
+        if mark is None:
+            # First contact: take the full history once.
+            return parse_events(controller, run([target, "show", "events"]))
+
+        window = FETCH_WINDOW
+        while True:
+            output = run([target, "show", "events", "type=latest=%d" % window])
+            events = parse_events(controller, output)
+            if (
+                len(events) < window
+                or window >= FETCH_WINDOW_MAX
+                or any(event["seq"] <= mark for event in events)
+            ):
+                return events
+            window *= 2
+
+    def ingest(
+        self, controllers: Sequence[int], run: Runner, force: bool = False
+    ) -> Dict[int, int]:
+        """Fetch events newer than each controller's watermark.
+
+        ``run`` executes StoreCLI with the given arguments and returns stdout.
+        Passes are rate limited to one per ``ingest_interval`` unless
+        ``force`` is set; concurrent callers skip instead of waiting.
+        """
+        if not force and time.time() - self._last_ingest < self.ingest_interval:
+            return {}
+        if not self._ingest_lock.acquire(blocking=False):
+            return {}
+        try:
+            added: Dict[int, int] = {}
+            for controller in controllers:
+                try:
+                    events = self._fetch_newer(controller, run)
+                    added[controller] = self.append(controller, events)
+                except Exception as exc:  # pylint: disable=broad-except
+                    LOGGER.error(
+                        "Event ingestion for controller %d failed: %s", controller, exc
+                    )
+            self._last_ingest = time.time()
+            return added
+        finally:
+            self._ingest_lock.release()
+
+    def query(
+        self,
+        controller: Optional[int] = None,
+        min_class: Optional[int] = None,
+        search: str = "",
+        since_seq: Optional[int] = None,
+        start: int = 0,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """Return a page of events, newest first, as ``{total, data}``."""
+        clauses: List[str] = []
+        args: List[Any] = []
+        if controller is not None:
+            clauses.append("controller = ?")
+            args.append(controller)
+        if min_class is not None:
+            clauses.append("class >= ?")
+            args.append(min_class)
+        if search:
+            clauses.append("(description LIKE ? OR data LIKE ?)")
+            args.extend(["%" + search + "%"] * 2)
+        if since_seq is not None:
+            clauses.append("seq > ?")
+            args.append(since_seq)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+        with self._connect() as connection:
+            total = connection.execute(
+                "SELECT COUNT(*) FROM events" + where, args
+            ).fetchone()[0]
+            rows = connection.execute(
+                "SELECT controller, seq, time, code, class, description, data"
+                " FROM events" + where + " ORDER BY ingested DESC, controller, seq DESC"
+                " LIMIT ? OFFSET ?",
+                args + [max(1, int(limit)), max(0, int(start))],
+            ).fetchall()
+
+        data = []
+        for row in rows:
+            event = dict(row)
+            event["severity"] = SEVERITIES.get(event["class"], str(event["class"]))
+            data.append(event)
+        return {"total": total, "data": data}
+
+
+def format_events(events: Sequence[Dict[str, Any]]) -> str:
+    """Render events as one line each for the plain-text log view."""
+    return "\n".join(
+        "c%d #%d %s [%s] %s"
+        % (
+            event["controller"],
+            event["seq"],
+            event["time"],
+            event["severity"],
+            event["description"],
+        )
+        for event in events
+    )
+
+
+EVENT_STORE = EventStore()
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""Periodic RAID health sampling with fixed-size in-memory history."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from StoreCLIModels import parse_inventory
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = float(os.environ.get("OMV_STORECLI_HEALTH_INTERVAL", "60"))
+# One day of history at the default interval.
+DEFAULT_CAPACITY = int(os.environ.get("OMV_STORECLI_HEALTH_SAMPLES", "1440"))
+
+# Directory read by prometheus-node-exporter's textfile collector on Debian.
+PROMETHEUS_DIR = "/var/lib/prometheus/node-exporter"
+PROMETHEUS_FILE = "storecli.prom"
+
+HELP = {
+    "storecli_drive_temperature_celsius": "Physical drive temperature.",
+    "storecli_drive_media_errors_total": "Physical drive media error count.",
+    "storecli_drive_other_errors_total": "Physical drive other error count.",
+    "storecli_drive_predictive_failures_total": "Predictive failure count.",
+    "storecli_rebuild_progress_percent": "Rebuild progress of a drive.",
+    "storecli_patrol_read_progress_percent": "Patrol read progress.",
+    "storecli_consistency_check_progress_percent": "Consistency check progress.",
+    "storecli_backup_unit_temperature_celsius": "BBU/CacheVault temperature.",
+    "storecli_backup_unit_optimal": "1 when the BBU/CacheVault is optimal.",
+}
+
+# Sources sampled on every pass, as StoreCLI arguments.
+_COMMANDS = {
+    "drives": ["/call/eall/sall", "show", "all", "J"],
+    "rebuild": ["/call/eall/sall", "show", "rebuild", "J"],
+    "cc": ["/call/vall", "show", "cc", "J"],
+    "patrol": ["/call", "show", "patrolread", "J"],
+    "backup": ["/call", "show", "all", "J"],
+}
+
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_DRIVE_RE = re.compile(r"/c(\d+)/e(\d+)/s(\d+)")
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+Runner = Callable[[List[str]], Optional[str]]
+
+
+class RingBuffer:
+    """Fixed-capacity series of ``(timestamp, value)`` in typed arrays."""
+
+    __slots__ = ("capacity", "_times", "_values", "_head", "_count")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._times = array("I", bytes(4 * capacity))
+        self._values = array("f", bytes(4 * capacity))
+        self._head = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, value: float) -> None:
+        self._times[self._head] = int(timestamp)
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        start = (self._head - self._count) % self.capacity
+        for offset in range(self._count):
+            index = (start + offset) % self.capacity
+            yield self._times[index], self._values[index]
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        if not self._count:
+            return None
+        index = (self._head - 1) % self.capacity
+        return self._times[index], self._values[index]
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _NUMBER_RE.search(str(value or ""))
+    return float(match.group(0)) if match else None
+
+
+def _responses(stdout: Optional[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(controller, response data)`` from StoreCLI JSON output."""
+    try:
+        document = json.loads(stdout or "{}")
+    except ValueError:
+        return
+    for position, entry in enumerate(document.get("Controllers") or []):
+        status = entry.get("Command Status") or {}
+        if str(status.get("Status", "")).lower() == "failure":
+            continue
+        controller = str(status.get("Controller", position))
+        yield controller, entry.get("Response Data") or {}
+
+
+def _drive_samples(stdout: Optional[str]) -> List[Sample]:
+    fields = {
+        "Drive Temperature": "storecli_drive_temperature_celsius",
+        "Media Error Count": "storecli_drive_media_errors_total",
+        "Other Error Count": "storecli_drive_other_errors_total",
+        "Predictive Failure Count": "storecli_drive_predictive_failures_total",
+    }
+    samples: List[Sample] = []
+    for _, data in _responses(stdout):
+        for key, value in data.items():
+            match = _DRIVE_RE.search(key)
+            if not match or not isinstance(value, dict):
+                continue
+            labels = {
+                "controller": match.group(1),
+                "drive": "%s:%s" % (match.group(2), match.group(3)),
+            }
+            for section in value.values():
+                if not isinstance(section, dict):
+                    continue
+                for field, metric in fields.items():
+                    number = _number(section.get(field))
+                    if number is not None:
+                        samples.append((metric, labels, number))
+    return samples
+
+
+def _progress_rows(stdout: Optional[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    for controller, data in _responses(stdout):
+        for value in data.values():
+            if isinstance(value, list):
+                for row in value:
+                    if isinstance(row, dict) and "Progress%" in row:
+                        yield controller, row
+
+
+def _rebuild_samples(stdout: Optional[str]) -> List[Sample]:
+    samples: List[Sample] = []
+    for controller, row in _progress_rows(stdout):
+        match = _DRIVE_RE.search(str(row.get("Drive-ID", "")))
+        progress = _number(row.get("Progress%"))
+        if match and progress is not None:
+            labels = {
+                "controller": controller,
+                "drive": "%s:%s" % (match.group(2), match.group(3)),
+            }
+            samples.append(("storecli_rebuild_progress_percent", labels, progress))
+    return samples
+
+
+def _cc_samples(stdout: Optional[str]) -> List[Sample]:
+    samples: List[Sample] = []
+    for controller, row in _progress_rows(stdout):
+        progress = _number(row.get("Progress%"))
+        if progress is not None:
+            labels = {"controller": controller, "vd": str(row.get("VD", ""))}
+            samples.append(
+                ("storecli_consistency_check_progress_percent", labels, progress)
+            )
+    return samples
+
+
+def _patrol_samples(stdout: Optional[str]) -> List[Sample]:
+    samples: List[Sample] = []
+    for controller, data in _responses(stdout):
+        for row in data.get("Controller Properties") or []:
+            name = str(row.get("Ctrl_Prop", ""))
+            value = str(row.get("Value", ""))
+            if name == "PR Current State" and value.lower().startswith("active"):
+                progress = _number(value)
+                if progress is not None:
+                    samples.append(
+                        (
+                            "storecli_patrol_read_progress_percent",
+                            {"controller": controller},
+                            progress,
+                        )
+                    )
+    return samples
+
+
+def _backup_samples(stdout: Optional[str]) -> List[Sample]:
+    try:
+        document = json.loads(stdout or "{}")
+    except ValueError:
+        return []
+    samples: List[Sample] = []
+    for unit in parse_inventory(document).backup_units:
+        labels = {"controller": str(unit.controller), "kind": unit.kind}
+        temperature = _number(unit.temperature)
+        if temperature is not None:
+            samples.append(
+                ("storecli_backup_unit_temperature_celsius", labels, temperature)
+            )
+        optimal = 1.0 if unit.state.lower() == "optimal" else 0.0
+        samples.append(("storecli_backup_unit_optimal", labels, optimal))
+    return samples
+
+
+_PARSERS = {
+    "drives": _drive_samples,
+    "rebuild": _rebuild_samples,
+    "cc": _cc_samples,
+    "patrol": _patrol_samples,
+    "backup": _backup_samples,
+}
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (key, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+
+
+class HealthCollector:
+    """Samples controller health on a fixed schedule in a daemon thread."""
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_INTERVAL,
+        capacity: int = DEFAULT_CAPACITY,
+        prometheus_dir: str = PROMETHEUS_DIR,
+    ) -> None:
+        self.interval = interval
+        self.capacity = capacity
+        self.prometheus_dir = prometheus_dir
+        self.last_sample = 0.0
+        self.last_duration = 0.0
+        self._series: Dict[Tuple[str, Labels], RingBuffer] = {}
+        self._current: List[Tuple[str, Labels]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, run: Runner) -> None:
+        """Start sampling with ``run`` unless already running or disabled."""
+        with self._lock:
+            if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(
+                target=self._loop, args=(run,), name="storecli-health", daemon=True
+            )
+            self._thread.start()
+
+    def _loop(self, run: Runner) -> None:
+        while True:
+            try:
+                self.sample(run)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error("StoreCLI health sampling failed: %s", exc)
+            time.sleep(self.interval)
+
+    def sample(self, run: Runner) -> int:
+        """Take one sample of every metric; returns the number recorded."""
+        started = time.time()
+        samples: List[Sample] = []
+        for source, arguments in _COMMANDS.items():
+            stdout = run(arguments)
+            if stdout is None:
+                return 0
+            samples.extend(_PARSERS[source](stdout))
+
+        with self._lock:
+            current = []
+            for metric, labels, value in samples:
+                key = (metric, tuple(sorted(labels.items())))
+                buffer = self._series.get(key)
+                if buffer is None:
+                    buffer = self._series[key] = RingBuffer(self.capacity)
+                buffer.append(started, value)
+                current.append(key)
+            self._current = current
+            self.last_sample = started
+            self.last_duration = time.time() - started
+        self._write_prometheus()
+        return len(samples)
+
+    def history(
+        self, metric: Optional[str] = None, points: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Return recorded series, optionally one metric and the last N points."""
+        with self._lock:
+            series = []
+            for (name, labels), buffer in sorted(self._series.items()):
+                if metric and name != metric:
+                    continue
+                data = [[stamp, round(value, 3)] for stamp, value in buffer]
+                if points:
+                    data = data[-int(points) :]
+                series.append({"metric": name, "labels": dict(labels), "points": data})
+            return {
+                "interval": self.interval,
+                "capacity": self.capacity,
+                "lastSample": self.last_sample,
+                "lastDuration": round(self.last_duration, 3),
+                "series": series,
+            }
+
+    def prometheus_text(self) -> str:
+        """Render the latest sample in the Prometheus text exposition format."""
+        with self._lock:
+            latest: Dict[str, List[str]] = {}
+            for key in sorted(self._current):
+                point = self._series[key].latest()
+                if point is None:
+                    continue
+                name, labels = key
+                # The textfile collector rejects explicit sample timestamps.
+                latest.setdefault(name, []).append(
+                    "%s%s %s" % (name, _format_labels(labels), repr(point[1]))
+                )
+        lines: List[str] = []
+        for name, rows in latest.items():
+            lines.append("# HELP %s %s" % (name, HELP.get(name, name)))
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append("# TYPE %s %s" % (name, kind))
+            lines.extend(rows)
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _write_prometheus(self) -> None:
+        if not os.path.isdir(self.prometheus_dir):
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.prometheus_dir, prefix=".storecli-"
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                handle.write(self.prometheus_text())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, os.path.join(self.prometheus_dir, PROMETHEUS_FILE))
+        except OSError as exc:
+            LOGGER.warning("Unable to write StoreCLI Prometheus metrics: %s", exc)
+
+
+HEALTH_COLLECTOR = HealthCollector()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Typed records parsed from StoreCLI ``J`` (JSON) output."""
+
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class Controller:
+    __slots__ = (
+        "controller",
+        "model",
+        "serial",
+        "firmware",
+        "driver",
+        "status",
+        "virtual_drives",
+        "physical_drives",
+    )
+
+    controller: int
+    model: str
+    serial: str
+    firmware: str
+    driver: str
+    status: str
+    virtual_drives: int
+    physical_drives: int
+
+
+@dataclass
+class VirtualDrive:
+    __slots__ = (
+        "controller",
+        "drive_group",
+        "virtual_drive",
+        "raid_type",
+        "state",
+        "access",
+        "consistent",
+        "cache",
+        "size",
+        "name",
+    )
+
+    controller: int
+    drive_group: str
+    virtual_drive: str
+    raid_type: str
+    state: str
+    access: str
+    consistent: str
+    cache: str
+    size: str
+    name: str
+
+
+@dataclass
+class PhysicalDrive:
+    __slots__ = (
+        "controller",
+        "enclosure",
+        "slot",
+        "device_id",
+        "state",
+        "drive_group",
+        "size",
+        "interface",
+        "media",
+        "model",
+    )
+
+    controller: int
+    enclosure: str
+    slot: str
+    device_id: str
+    state: str
+    drive_group: str
+    size: str
+    interface: str
+    media: str
+    model: str
+
+
+@dataclass
+class BackupUnit:
+    __slots__ = ("controller", "kind", "model", "state", "temperature")
+
+    controller: int
+    kind: str
+    model: str
+    state: str
+    temperature: str
+
+
+@dataclass
+class Inventory:
+    __slots__ = (
+        "controllers",
+        "virtual_drives",
+        "physical_drives",
+        "backup_units",
+        "errors",
+    )
+
+    controllers: List[Controller]
+    virtual_drives: List[VirtualDrive]
+    physical_drives: List[PhysicalDrive]
+    backup_units: List[BackupUnit]
+    errors: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the camelCase structure sent to the UI."""
+        return {
+            "controllers": [_camel(asdict(item)) for item in self.controllers],
+            "virtualDrives": [_camel(asdict(item)) for item in self.virtual_drives],
+            "physicalDrives": [_camel(asdict(item)) for item in self.physical_drives],
+            "backupUnits": [_camel(asdict(item)) for item in self.backup_units],
+            "errors": list(self.errors),
+        }
+
+
+def _camel(record: Dict[str, Any]) -> Dict[str, Any]:
+    result = {}
+    for key, value in record.items():
+        head, *rest = key.split("_")
+        result[head + "".join(part.title() for part in rest)] = value
+    return result
+
+
+def _text(data: Dict[str, Any], *keys: str) -> str:
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+
+def _controller_index(status: Dict[str, Any], fallback: int) -> int:
+    try:
+        return int(status.get("Controller", fallback))
+    except (TypeError, ValueError):
+        return fallback
+
+
+def _parse_controller(index: int, data: Dict[str, Any]) -> Optional[Controller]:
+    basics = data.get("Basics") or {}
+    version = data.get("Version") or {}
+    status = data.get("Status") or {}
+    model = _text(data, "Product Name") or _text(basics, "Model")
+    if not model:
+        return None
+    return Controller(
+        controller=index,
+        model=model,
+        serial=_text(data, "Serial Number") or _text(basics, "Serial Number"),
+        firmware=_text(data, "FW Version") or _text(version, "Firmware Version"),
+        driver=_text(data, "Driver Version") or _text(version, "Driver Version"),
+        status=_text(data, "Controller Status") or _text(status, "Controller Status"),
+        virtual_drives=_count(data.get("Virtual Drives")),
+        physical_drives=_count(data.get("Physical Drives")),
+    )
+
+
+def _parse_virtual_drive(index: int, row: Dict[str, Any]) -> VirtualDrive:
+    group, _, number = _text(row, "DG/VD").partition("/")
+    return VirtualDrive(
+        controller=index,
+        drive_group=group,
+        virtual_drive=number,
+        raid_type=_text(row, "TYPE"),
+        state=_text(row, "State"),
+        access=_text(row, "Access"),
+        consistent=_text(row, "Consist"),
+        cache=_text(row, "Cache"),
+        size=_text(row, "Size"),
+        name=_text(row, "Name"),
+    )
+
+
+def _parse_physical_drive(index: int, row: Dict[str, Any]) -> PhysicalDrive:
+    enclosure, _, slot = _text(row, "EID:Slt").partition(":")
+    return PhysicalDrive(
+        controller=index,
+        enclosure=enclosure,
+        slot=slot,
+        device_id=_text(row, "DID"),
+        state=_text(row, "State"),
+        drive_group=_text(row, "DG"),
+        size=_text(row, "Size"),
+        interface=_text(row, "Intf"),
+        media=_text(row, "Med"),
+        model=_text(row, "Model"),
+    )
+
+
+def _parse_backup_unit(index: int, kind: str, row: Dict[str, Any]) -> BackupUnit:
+    return BackupUnit(
+        controller=index,
+        kind=kind,
+        model=_text(row, "Model"),
+        state=_text(row, "State"),
+        temperature=_text(row, "Temp"),
+    )
+
+
+def _table_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the rows of every table (list of objects) in a response."""
+    rows: List[Dict[str, Any]] = []
+    for value in data.values():
+        if isinstance(value, list):
+            rows.extend(row for row in value if isinstance(row, dict))
+    return rows
+
+
+def _count(value: Any) -> int:
+    return value if isinstance(value, int) else 0
+
+
+def parse_inventory(document: Any) -> Inventory:
+    """Build an :class:`Inventory` from a decoded StoreCLI JSON document."""
+    inventory = Inventory([], [], [], [], [])
+    controllers = (document or {}).get("Controllers") or []
+    for position, entry in enumerate(controllers):
+        status = entry.get("Command Status") or {}
+        index = _controller_index(status, position)
+        if str(status.get("Status", "")).lower() == "failure":
+            inventory.errors.append(
+                "Controller %d: %s" % (index, _text(status, "Description"))
+            )
+            continue
+
+        data = entry.get("Response Data") or {}
+        controller = _parse_controller(index, data)
+        if controller is not None:
+            inventory.controllers.append(controller)
+        for row in _table_rows(data):
+            if "DG/VD" in row:
+                inventory.virtual_drives.append(_parse_virtual_drive(index, row))
+            elif "EID:Slt" in row:
+                inventory.physical_drives.append(_parse_physical_drive(index, row))
+        for kind, key in (("BBU", "BBU_Info"), ("CacheVault", "Cachevault_Info")):
+            for row in data.get(key) or []:
+                inventory.backup_units.append(_parse_backup_unit(index, kind, row))
+    return inventory
+
+
+def parse_json_output(stdout: str) -> Inventory:
+    """Decode StoreCLI JSON output, recording malformed output as an error."""
+    try:
+        document = json.loads(stdout or "{}")
+    except ValueError as exc:
+        return Inventory([], [], [], [], ["Invalid StoreCLI JSON output: %s" % exc])
+    return parse_inventory(document)
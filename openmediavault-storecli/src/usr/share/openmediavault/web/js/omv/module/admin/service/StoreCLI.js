@@ -80,7 +80,7 @@ Ext.define('OMV.module.admin.service.StoreCLI', {
             {
                 text: _('Refresh Summary'),
                 iconCls: 'x-fa fa-sync',
-                handler: this.doReload,
+                handler: this.onRefreshSummary,
                 scope: this
             },
             {
@@ -98,6 +98,30 @@ Ext.define('OMV.module.admin.service.StoreCLI', {
         ];
     },
 
+    onRefreshSummary: function () {
+        var me = this;
+        me.setLoading(true);
+
+        OMV.Rpc.request({
+            scope: me,
+            callback: function (id, success, response) {
+                me.setLoading(false);
+                if (!success) {
+                    OMV.MessageBox.error(null, response);
+                    return;
+                }
+                me.doReload();
+            },
+            rpcData: {
+                service: 'StoreCLI',
+                method: 'invalidateCache',
+                params: {
+                    commandClass: 'health'
+                }
+            }
+        });
+    },
+
     onShowController: function () {
         var me = this;
         OMV.MessageBox.prompt(
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Measure engined start-up cost of loading the Docker plugin RPC modules.
+
+Every run happens in a fresh interpreter, like an engined restart:
+
+* ``baseline`` imports ``openmediavault.rpc`` only
+* ``startup`` additionally imports all plugin modules, which is what engined
+  pays at start
+* ``first-call`` also loads every service behind the registry, which is the
+  cost moved to the first RPC call of each plugin
+
+Needs the ``openmediavault`` Python package, i.e. run it on an OMV host.
+By default the RPC modules are copied from this checkout; pass ``--rpc-dir``
+to measure an installed tree instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PLUGINS = ("immich", "gitea", "drone", "certbot")
+MODES = ("baseline", "startup", "first-call")
+
+CHILD = r"""
+import importlib, json, resource, sys, time
+
+mode, plugins = sys.argv[1], sys.argv[2:]
+started = time.perf_counter()
+importlib.import_module("openmediavault.rpc")
+if mode != "baseline":
+    for plugin in plugins:
+        importlib.import_module(plugin.capitalize())
+if mode == "first-call":
+    import PluginRegistry
+
+    for plugin in plugins:
+        PluginRegistry.instance(PluginRegistry.get_plugin(plugin))
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def stage_rpc_dir(target: Path) -> None:
+    """Copy the common and plugin RPC modules of this checkout to ``target``."""
+    sources = [REPO_ROOT / "common"] + [
+        REPO_ROOT / ("openmediavault-%s" % plugin) for plugin in PLUGINS
+    ]
+    for source in sources:
+        rpc_dir = source / "src/usr/share/openmediavault/engined/rpc"
+        for path in rpc_dir.glob("*.py"):
+            shutil.copy2(path, target / path.name)
+
+
+def run_once(rpc_dir: Path, mode: str) -> Dict[str, float]:
+    path = os.pathsep.join(filter(None, [str(rpc_dir), os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PYTHONPATH=path, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, *PLUGINS],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=str(rpc_dir),
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(rpc_dir: Path, repeat: int) -> Dict[str, Dict[str, float]]:
+    report: Dict[str, Dict[str, float]] = {}
+    for mode in MODES:
+        runs: List[Dict[str, float]] = [run_once(rpc_dir, mode) for _ in range(repeat)]
+        report[mode] = {
+            "seconds_median": statistics.median(run["seconds"] for run in runs),
+            "seconds_max": max(run["seconds"] for run in runs),
+            "maxrss_kb_median": statistics.median(run["maxrss_kb"] for run in runs),
+            "modules": runs[-1]["modules"],
+        }
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--rpc-dir", type=Path)
+    parser.add_argument("--json", action="store_true", help="print raw JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="omv-rpc-") as tmp:
+        rpc_dir = args.rpc_dir
+        if rpc_dir is None:
+            rpc_dir = Path(tmp)
+            stage_rpc_dir(rpc_dir)
+        report = measure(rpc_dir, max(1, args.repeat))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    base = report["baseline"]
+    print("%-11s %10s %10s %12s %8s" % ("mode", "ms", "+ms", "+RSS KiB", "modules"))
+    for mode, row in report.items():
+        print(
+            "%-11s %10.1f %10.1f %12d %8d"
+            % (
+                mode,
+                row["seconds_median"] * 1000,
+                (row["seconds_median"] - base["seconds_median"]) * 1000,
+                row["maxrss_kb_median"] - base["maxrss_kb_median"],
+                row["modules"],
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
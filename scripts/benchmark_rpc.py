@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Benchmark the RPC services against fake ``docker`` and ``storcli`` tools.
+
+Fake executables placed first on ``PATH`` return large, realistic output
+(hundreds of compose projects, a 10k-line compose log, a 24-drive
+controller) after a simulated latency. Each case runs in a fresh interpreter
+so peak RSS is attributable to it, and reports throughput, p50/p99 latency
+and peak RSS.
+
+Save a run with ``--json baseline.json`` and compare a later one with
+``--compare baseline.json``; the script exits non-zero when p99 latency or
+throughput of a case regresses by more than ``--threshold``.
+
+Needs the ``openmediavault`` Python package, i.e. run it on an OMV host.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import resource
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RPC_DIRS = [
+    REPO_ROOT / "common/src/usr/share/openmediavault/engined/rpc",
+    REPO_ROOT / "openmediavault-storecli/src/usr/share/openmediavault/engined/rpc",
+]
+
+PROJECTS = 300
+SERVICES = ("gitea", "postgres", "redis", "runner")
+LOG_LINES = 10000
+DRIVES = 24
+
+CASES = (
+    "getStatus:cold",
+    "getStatus:cached",
+    "getLogs",
+    "getControllerDetails:cold",
+    "getControllerDetails:cached",
+    "runShowCommand",
+    "runShowCommand:structured",
+)
+
+FAKE_DOCKER = """#!/bin/sh
+sleep {latency}
+case "$1 $2" in
+        "compose ls")
+                cat "{data}/compose-ls.json"
+                ;;
+        "compose logs")
+                for arg; do
+                        case "$arg" in
+                                --tail=*)
+                                        exec tail -n $(( ${{arg#--tail=}} * {services} )) \\
+                                                "{data}/compose-logs.txt"
+                                        ;;
+                        esac
+                done
+                cat "{data}/compose-logs.txt"
+                ;;
+        *)
+                echo "fake docker: unsupported command: $*" >&2
+                exit 1
+                ;;
+esac
+"""
+
+FAKE_STORCLI = """#!/bin/sh
+sleep {latency}
+case "$*" in
+        -v)
+                cat "{data}/storcli-version.txt"
+                ;;
+        *" J"|*" j")
+                cat "{data}/storcli-show.json"
+                ;;
+        *show*)
+                cat "{data}/storcli-show.txt"
+                ;;
+        *)
+                echo "Invalid command"
+                exit 1
+                ;;
+esac
+"""
+
+
+def _drive(slot: int) -> Dict[str, Any]:
+    return {
+        "EID:Slt": "252:%d" % slot,
+        "DID": slot + 10,
+        "State": "Onln",
+        "DG": slot // 8,
+        "Size": "7.276 TB",
+        "Intf": "SAS",
+        "Med": "HDD",
+        "SED": "N",
+        "PI": "N",
+        "SeSz": "512B",
+        "Model": "ST8000NM0075",
+        "Sp": "U",
+        "Type": "-",
+    }
+
+
+def write_fixtures(directory: Path, latency: float) -> Path:
+    """Write fake tool output and executables; returns the ``bin`` directory."""
+    data = directory / "data"
+    bin_dir = directory / "bin"
+    data.mkdir()
+    bin_dir.mkdir()
+
+    projects = [{"Name": "gitea", "Status": "running(4)", "ConfigFiles": ""}]
+    projects += [
+        {
+            "Name": "project-%03d" % index,
+            "Status": "running(3)" if index % 7 else "exited(1), running(2)",
+            "ConfigFiles": "/srv/stacks/project-%03d/docker-compose.yml" % index,
+        }
+        for index in range(PROJECTS - 1)
+    ]
+    (data / "compose-ls.json").write_text(json.dumps(projects))
+
+    with open(data / "compose-logs.txt", "w", encoding="utf-8") as handle:
+        for index in range(LOG_LINES):
+            service = SERVICES[index % len(SERVICES)]
+            handle.write(
+                "%s-1  | 2026-01-01T00:%02d:%02d.%06dZ GET /api/v1/repos/%d 200 "
+                "in %.1fms\n"
+                % (service, index // 3600 % 60, index // 60 % 60, index, index, 3.2)
+            )
+
+    drives = [_drive(slot) for slot in range(DRIVES)]
+    document = {
+        "Controllers": [
+            {
+                "Command Status": {
+                    "CLI Version": "007.2707.0000.0000",
+                    "Controller": 0,
+                    "Status": "Success",
+                },
+                "Response Data": {
+                    "Basics": {"Controller": 0, "Model": "MegaRAID 9460-16i"},
+                    "Virtual Drives": 3,
+                    "VD LIST": [
+                        {"DG/VD": "%d/%d" % (dg, dg), "TYPE": "RAID6", "State": "Optl"}
+                        for dg in range(3)
+                    ],
+                    "Physical Drives": DRIVES,
+                    "PD LIST": drives,
+                },
+            }
+        ]
+    }
+    (data / "storcli-show.json").write_text(json.dumps(document, indent=2))
+    header = "EID:Slt DID State DG     Size Intf Med SED PI SeSz Model        Sp Type"
+    rows = [
+        "%(EID:Slt)s %(DID)s %(State)s %(DG)s %(Size)s %(Intf)s %(Med)s "
+        "%(SED)s %(PI)s %(SeSz)s %(Model)s %(Sp)s %(Type)s" % drive
+        for drive in drives
+    ]
+    text = ["Controller = 0", "Status = Success", "", "PD LIST :", "=" * 9, header]
+    (data / "storcli-show.txt").write_text("\n".join(text + rows * 20) + "\n")
+    (data / "storcli-version.txt").write_text(
+        "StorCli SAS Customization Utility Ver 007.2707.0000.0000 Aug 30, 2023\n"
+    )
+
+    for name, template in (("docker", FAKE_DOCKER), ("storcli64", FAKE_STORCLI)):
+        path = bin_dir / name
+        path.write_text(
+            template.format(latency=latency, data=data, services=len(SERVICES))
+        )
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir
+
+
+def _percentile(latencies: List[float], fraction: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _case(name: str, workdir: Path) -> Callable[[], Any]:
+    """Return a zero-argument call for benchmark case ``name``."""
+    for path in RPC_DIRS:
+        sys.path.insert(0, str(path))
+    # pylint: disable=import-error,import-outside-toplevel
+    import StoreCLICache
+    from BaseDockerService import BaseDockerService
+    from ComposeStatusCache import STATUS_CACHE
+    from StoreCLI import ServiceStoreCLI
+
+    StoreCLICache.INVENTORY_CACHE.path = str(workdir / "inventory.json")
+
+    class ServiceBenchmark(BaseDockerService):
+        name = "Gitea"
+        mkconf_script = "/bin/true"
+        compose_name = "gitea"
+
+        def _compose_dir(self) -> str:
+            return str(workdir)
+
+    docker = ServiceBenchmark()
+    storecli = ServiceStoreCLI()
+    details = {"controller": "0", "arguments": ["show", "all"]}
+
+    def cold_status() -> Any:
+        STATUS_CACHE.invalidate()
+        return docker.getStatus()
+
+    def cold_details() -> Any:
+        StoreCLICache.INVENTORY_CACHE.invalidate()
+        return storecli.getControllerDetails(details)
+
+    return {
+        "getStatus:cold": cold_status,
+        "getStatus:cached": docker.getStatus,
+        "getLogs": docker.getLogs,
+        "getControllerDetails:cold": cold_details,
+        "getControllerDetails:cached": lambda: storecli.getControllerDetails(details),
+        "runShowCommand": lambda: storecli.runShowCommand(details),
+        "runShowCommand:structured": lambda: storecli.runShowCommand(
+            dict(details, structured=True)
+        ),
+    }[name]
+
+
+def run_child(name: str, workdir: Path, iterations: int, concurrency: int) -> None:
+    call = _case(name, workdir)
+    for _ in range(min(5, iterations)):
+        call()
+
+    def timed_call(_: int) -> float:
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_call, range(iterations)))
+    elapsed = time.perf_counter() - started
+    print(
+        json.dumps(
+            {
+                "calls": iterations,
+                "throughput": iterations / elapsed,
+                "p50_ms": _percentile(latencies, 0.5) * 1000,
+                "p99_ms": _percentile(latencies, 0.99) * 1000,
+                "max_ms": max(latencies) * 1000,
+                "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+        )
+    )
+
+
+def run_case(
+    name: str, workdir: Path, bin_dir: Path, args: argparse.Namespace
+) -> Dict[str, float]:
+    env = dict(
+        os.environ,
+        PATH=os.pathsep.join([str(bin_dir), os.environ.get("PATH", "")]),
+        # Force the CLI code paths and keep background samplers quiet.
+        OMV_DOCKER_SOCKET=str(workdir / "no-docker.sock"),
+        OMV_STORECLI_HEALTH_INTERVAL="0",
+        OMV_RPC_PROFILE="",
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+    command = [
+        sys.executable,
+        __file__,
+        "--child",
+        name,
+        "--workdir",
+        str(workdir),
+        "--iterations",
+        str(args.iterations),
+        "--concurrency",
+        str(args.concurrency),
+    ]
+    result = subprocess.run(
+        command, check=False, capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError("%s failed:\n%s" % (name, result.stderr.strip()))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(
+    report: Dict[str, Dict[str, float]], baseline_path: Path, threshold: float
+) -> List[str]:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    regressions = []
+    for name, row in report.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if row["p99_ms"] > before["p99_ms"] * (1 + threshold):
+            regressions.append(
+                "%s: p99 %.1f ms -> %.1f ms" % (name, before["p99_ms"], row["p99_ms"])
+            )
+        if row["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append(
+                "%s: throughput %.1f/s -> %.1f/s"
+                % (name, before["throughput"], row["throughput"])
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*", help="one of: %s" % ", ".join(CASES))
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="fake tool latency in seconds"
+    )
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    parser.add_argument("--compare", type=Path, help="baseline report to compare")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.cases) - set(CASES))
+    if unknown:
+        parser.error("unknown case: %s" % ", ".join(unknown))
+    if args.child:
+        run_child(args.child, args.workdir, args.iterations, max(1, args.concurrency))
+        return 0
+
+    report: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="omv-rpc-bench-") as tmp:
+        bin_dir = write_fixtures(Path(tmp), args.latency)
+        print(
+            "%-28s %10s %9s %9s %11s"
+            % ("case", "calls/s", "p50 ms", "p99 ms", "peak RSS KiB")
+        )
+        for name in args.cases or CASES:
+            workdir = Path(tempfile.mkdtemp(dir=tmp))
+            row = report[name] = run_case(name, workdir, bin_dir, args)
+            print(
+                "%-28s %10.1f %9.2f %9.2f %11d"
+                % (
+                    name,
+                    row["throughput"],
+                    row["p50_ms"],
+                    row["p99_ms"],
+                    row["maxrss_kb"],
+                )
+            )
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Check the StoreCLI JSON parser against the sample outputs in the plugin.
+
+Every ``openmediavault-storecli/tests/fixtures/<name>.json`` holds the
+``J`` output of a StoreCLI command. It is parsed into the StoreCLIModels
+records and compared with ``<name>.expected.json``, the structure the RPC
+service returns. Pass ``--update`` to rewrite the expected files after a
+deliberate parser change, then review their diff.
+
+Needs no OMV packages; runs from any checkout.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PLUGIN_DIR = REPO_ROOT / "openmediavault-storecli"
+FIXTURES = PLUGIN_DIR / "tests" / "fixtures"
+RPC_DIR = PLUGIN_DIR / "src/usr/share/openmediavault/engined/rpc"
+
+sys.path.insert(0, str(RPC_DIR))
+
+from StoreCLIModels import parse_json_output  # noqa: E402
+
+
+def check(update: bool) -> List[str]:
+    """Return a message per fixture whose parsed form differs."""
+    failures = []
+    samples = sorted(
+        path for path in FIXTURES.glob("*.json") if ".expected" not in path.suffixes
+    )
+    if not samples:
+        return ["No fixtures found in %s" % FIXTURES]
+    for sample in samples:
+        parsed = parse_json_output(sample.read_text(encoding="utf-8")).to_dict()
+        expected_path = sample.with_suffix(".expected.json")
+        if update:
+            expected_path.write_text(
+                json.dumps(parsed, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+            )
+            print("updated %s" % expected_path.name)
+            continue
+        try:
+            expected = json.loads(expected_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            failures.append("%s: %s" % (expected_path.name, exc))
+            continue
+        if parsed != expected:
+            failures.append(
+                "%s: parsed output differs from %s:\n%s"
+                % (
+                    sample.name,
+                    expected_path.name,
+                    json.dumps(parsed, indent=2, sort_keys=True),
+                )
+            )
+        else:
+            print("ok %s" % sample.name)
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--update", action="store_true", help="rewrite the expected files"
+    )
+    args = parser.parse_args()
+    failures = check(args.update)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,8 @@ from typing import Iterable, Set
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 PLUGIN_PREFIX = "openmediavault-"
+# Packaged as openmediavault-docker-common.
+COMMON_DIR = "common"
 
 
 def _git_diff_files(base: str, head: str) -> Iterable[str]:
@@ -53,7 +55,7 @@ def _list_all_plugins() -> Set[str]:
         entry.name
         for entry in REPO_ROOT.iterdir()
         if entry.is_dir() and entry.name.startswith(PLUGIN_PREFIX)
-    }
+    } | {COMMON_DIR}
 
 
 def _resolve_plugin(path: Path) -> str | None:
@@ -62,7 +64,9 @@ def _resolve_plugin(path: Path) -> str | None:
         return None
     candidate = parts[0]
     plugin_dir = REPO_ROOT / candidate
-    if candidate.startswith(PLUGIN_PREFIX) and plugin_dir.is_dir():
+    if (
+        candidate.startswith(PLUGIN_PREFIX) or candidate == COMMON_DIR
+    ) and plugin_dir.is_dir():
         return candidate
     return None
 